@@ -0,0 +1,3 @@
+#!/bin/sh
+cd "$(dirname "$0")"
+g++ -shared -fPIC -o ../src/cpp_lib.so ../src/cpp_lib.cpp -O3 -march=native -fopenmp -lm
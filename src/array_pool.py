@@ -0,0 +1,53 @@
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from runner import Runner
+
+
+class ArrayPool:
+    """
+    Memory of state arrays shared by consecutive runners (e.g. iterations of an Iterator and the configs after it).
+    A finished runner gives its arrays back as raw buffers, the next runner takes them for its arrays of the same name
+    whatever their shape and dtype are, so the memory is not freed and faulted in again.
+    The largest number of reserved states and actions lists length are recorded, and new runners start with
+    as many lines as the kept buffers hold up to that mark, so they are not extended again.
+    """
+    def __init__(self) -> None:
+        self.buffers = {}
+        self.high_water_states = 0
+        self.high_water_actions_length = 0
+
+    def reserved_states(self, num_states: int, state_arrays_spec: dict) -> int:
+        capacity = self.high_water_states
+        for name, (state_shape, dtype) in state_arrays_spec.items():
+            state_bytes = int(np.prod(state_shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            capacity = min(capacity, self.buffers[name].nbytes // state_bytes if name in self.buffers else 0)
+        return max(num_states, capacity)
+
+    def take(self, name: str, shape: tuple, dtype: type) -> np.ndarray:
+        # a buffer is used by one runner at a time, a too small one is dropped
+        nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        buffer = self.buffers.pop(name, None)
+        if (buffer is None) or (buffer.nbytes < nbytes):
+            return np.empty(shape, dtype=dtype)
+        return buffer[:nbytes].view(dtype).reshape(shape)
+
+    @classmethod
+    def root_buffer(cls, array: np.ndarray) -> np.ndarray:
+        # the whole memory the array is a view of, as bytes
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        return array.reshape(-1).view(np.uint8)
+
+    def release(self, runner: 'Runner') -> None:
+        # the runner must not use its arrays after that
+        self.high_water_states = max(self.high_water_states, runner.num_states_reserved)
+        self.high_water_actions_length = max(self.high_water_actions_length, runner.actions_item_lists.shape[1])
+        for name in runner.state_arrays_spec():
+            buffer = self.root_buffer(getattr(runner, name))
+            if (name not in self.buffers) or (buffer.nbytes > self.buffers[name].nbytes):
+                self.buffers[name] = buffer
+
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self.buffers.values())
@@ -0,0 +1,340 @@
+from typing import Union
+from pathlib import Path
+import ctypes
+import os
+import warnings
+import numpy as np
+
+from utils import ArraysTypes, Constants
+
+
+class DominanceBuckets:
+    """
+    Groups states by a key that never decreases along dominance: binary exponents of amounts and bought amounts.
+    A state can only be dominated by states from buckets whose key is >= its own key in every column,
+    so bucketed kernels scan only these buckets instead of all earlier states.
+    Lines of a bucket are stored in sorted order, so scanning a bucket stops at the first line after the checked one.
+    """
+    def __init__(self, amounts: np.ndarray, bought_amounts: np.ndarray, sorted_indices: np.ndarray,
+                 num_objects: int, max_dims: int) -> None:
+        self.ranks = np.empty(num_objects, dtype=ArraysTypes.dominance_buckets)
+        self.ranks[sorted_indices[:num_objects]] = np.arange(num_objects, dtype=ArraysTypes.dominance_buckets)
+        keys = self.keys(amounts[:num_objects, :max_dims + 2], bought_amounts[:num_objects, :max_dims + 1])
+        
+        # coarser keys until the number of buckets is small enough
+        shift = 0
+        bucket_keys = self.group(keys)
+        while (self.buckets_num > Constants.dominance_max_buckets) and (shift < 31):
+            shift += 1
+            bucket_keys = self.group(keys >> shift)
+        
+        # can_be_dominated[b, c]: states from bucket c can dominate states from bucket b
+        can_be_dominated = (bucket_keys[:, None, :] <= bucket_keys[None, :, :]).all(axis=2)
+        dominated_buckets, dominator_buckets = np.nonzero(can_be_dominated)
+        self.dominator_buckets = dominator_buckets.astype(ArraysTypes.dominance_buckets)
+        self.dominator_offsets = np.zeros(self.buckets_num + 1, dtype=ArraysTypes.dominance_buckets)
+        self.dominator_offsets[1:] = np.cumsum(np.bincount(dominated_buckets, minlength=self.buckets_num))
+
+    @classmethod
+    def keys(cls, amounts: np.ndarray, bought_amounts: np.ndarray) -> np.ndarray:
+        exponents = np.frexp(amounts)[1].astype(np.int32)
+        exponents[amounts == 0] = np.iinfo(np.int32).min
+        exponents[amounts == np.inf] = np.iinfo(np.int32).max
+        return np.hstack((exponents, bought_amounts.astype(np.int32)))
+
+    def group(self, keys: np.ndarray) -> np.ndarray:
+        num_objects = len(keys)
+        lines = np.lexsort((self.ranks,) + tuple(keys.T))
+        sorted_keys = keys[lines]
+        is_first_in_bucket = np.ones(num_objects, dtype=bool)
+        is_first_in_bucket[1:] = (sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)
+        bucket_starts = np.flatnonzero(is_first_in_bucket)
+        self.buckets_num = len(bucket_starts)
+        
+        self.bucket_lines = lines.astype(ArraysTypes.dominance_buckets)
+        self.bucket_offsets = np.append(bucket_starts, num_objects).astype(ArraysTypes.dominance_buckets)
+        self.bucket_of = np.empty(num_objects, dtype=ArraysTypes.dominance_buckets)
+        self.bucket_of[lines] = np.cumsum(is_first_in_bucket) - 1
+        return sorted_keys[bucket_starts]
+
+
+class KernelBackend:
+    """
+    Base class for implementations of the three population kernels used by Runner.
+    All kernels take the full reserved arrays and work on the first num_objects lines.
+    """
+    name = 'base'
+
+    def find_dominated(self, amounts: np.ndarray, bought_amounts: np.ndarray, sorted_indices: np.ndarray,
+                       num_objects: int, max_dims: int, dominated_bools: np.ndarray) -> None:
+        raise NotImplementedError("KernelBackend must implement find_dominated")
+
+    def find_dominated_tiled(self, amounts: np.ndarray, bought_amounts: np.ndarray, sorted_indices: np.ndarray,
+                             num_objects: int, max_dims: int, dominated_bools: np.ndarray) -> None:
+        # same result as find_dominated
+        raise NotImplementedError("KernelBackend must implement find_dominated_tiled")
+
+    def find_dominated_buckets(self, amounts: np.ndarray, bought_amounts: np.ndarray, sorted_indices: np.ndarray,
+                               num_objects: int, max_dims: int, buckets: DominanceBuckets, dominated_bools: np.ndarray) -> None:
+        # same result as find_dominated
+        raise NotImplementedError("KernelBackend must implement find_dominated_buckets")
+
+    def find_dominated_states(self, amounts: np.ndarray, bought_amounts: np.ndarray, sorted_indices: np.ndarray,
+                              num_objects: int, max_dims: int, dominated_bools: np.ndarray) -> None:
+        # find_dominated with the kernel chosen by Constants.dominance_kernel
+        if (Constants.dominance_kernel == 'buckets') and (num_objects >= Constants.dominance_buckets_min_states):
+            buckets = DominanceBuckets(amounts, bought_amounts, sorted_indices, num_objects, max_dims)
+            self.find_dominated_buckets(amounts, bought_amounts, sorted_indices, num_objects, max_dims, buckets, dominated_bools)
+        elif Constants.dominance_kernel == 'tiled':
+            self.find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+        else:
+            self.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def can_buy_all(self, amounts: np.ndarray, costs: np.ndarray, allowed_purchases: np.ndarray,
+                    num_objects: int, max_dims: int, can_buy_bools: np.ndarray) -> bool:
+        raise NotImplementedError("KernelBackend must implement can_buy_all")
+
+    def can_sacrifice_all(self, amounts: np.ndarray, allowed_sacrifices: np.ndarray,
+                          num_objects: int, max_dims: int, sacrifices_length: int, sacrifice_boosts: np.ndarray) -> bool:
+        raise NotImplementedError("KernelBackend must implement can_sacrifice_all")
+
+
+class NativeBackend(KernelBackend):
+    """
+    C++ library (src/cpp_lib.cpp) built for the host with OpenMP.
+    Windows: scripts/build_dll.bat -> src/cpp_lib.dll
+    Linux/macOS: scripts/build_so.sh -> src/cpp_lib.so
+    """
+    name = 'native'
+
+    @classmethod
+    def library_path(cls) -> Path:
+        library_name = 'cpp_lib.dll' if os.name == 'nt' else 'cpp_lib.so'
+        return Path(__file__).resolve().parent / library_name
+
+    def __init__(self, library_path: Union[str, Path, None]=None) -> None:
+        if library_path is None:
+            library_path = self.library_path()
+        self.cpp_lib = ctypes.CDLL(str(library_path))
+
+        self.cpp_lib.find_dominated.argtypes = [
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.bought_amounts, flags='C_CONTIGUOUS'), # bought_amounts
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.sorted_indices, flags='C_CONTIGUOUS'), # sorted_indices
+            ctypes.c_int, # num_objects
+            ctypes.c_int, # max_dims
+            np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # dominated_bools
+        ]
+        self.cpp_lib.find_dominated.restype = None
+
+        # libraries built before tiled and bucketed dominance don't have them, find_dominated is used instead
+        missing_kernels = [kernel for kernel in ('find_dominated_tiled', 'find_dominated_buckets') if not hasattr(self.cpp_lib, kernel)]
+        if missing_kernels:
+            warnings.warn(f"{library_path} has no {', '.join(missing_kernels)}, find_dominated is used instead; "
+                          f"rebuild it with scripts/build_dll.bat or scripts/build_so.sh")
+        self.has_find_dominated_tiled = hasattr(self.cpp_lib, 'find_dominated_tiled')
+        if self.has_find_dominated_tiled:
+            self.cpp_lib.find_dominated_tiled.argtypes = [
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.bought_amounts, flags='C_CONTIGUOUS'), # bought_amounts
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.sorted_indices, flags='C_CONTIGUOUS'), # sorted_indices
+                ctypes.c_int, # num_objects
+                ctypes.c_int, # max_dims
+                ctypes.c_int, # chunk_size
+                ctypes.c_int, # tile_size
+                np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # dominated_bools
+            ]
+            self.cpp_lib.find_dominated_tiled.restype = None
+
+        self.has_find_dominated_buckets = hasattr(self.cpp_lib, 'find_dominated_buckets')
+        if self.has_find_dominated_buckets:
+            self.cpp_lib.find_dominated_buckets.argtypes = [
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.bought_amounts, flags='C_CONTIGUOUS'), # bought_amounts
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.sorted_indices, flags='C_CONTIGUOUS'), # sorted_indices
+                ctypes.c_int, # num_objects
+                ctypes.c_int, # max_dims
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # ranks
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # bucket_of
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # bucket_lines
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # bucket_offsets
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # dominator_buckets
+                np.ctypeslib.ndpointer(dtype=ArraysTypes.dominance_buckets, flags='C_CONTIGUOUS'), # dominator_offsets
+                np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # dominated_bools
+            ]
+            self.cpp_lib.find_dominated_buckets.restype = None
+
+        self.cpp_lib.can_buy_all.argtypes = [
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.costs, flags='C_CONTIGUOUS'), # costs
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.allowed_purchases, flags='C_CONTIGUOUS'), # allowed_purchases
+            ctypes.c_int, # num_objects
+            ctypes.c_int, # max_dims
+            np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # can_buy_bools
+        ]
+        self.cpp_lib.can_buy_all.restype = ctypes.c_bool
+
+        self.cpp_lib.can_sacrifice_all.argtypes = [
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.allowed_sacrifices, flags='C_CONTIGUOUS'), # allowed_sacrifices
+            ctypes.c_int, # num_objects
+            ctypes.c_int, # max_dims
+            ctypes.c_int, # sacrifices_length
+            np.ctypeslib.ndpointer(dtype=ArraysTypes.sacrifice_boosts, flags='C_CONTIGUOUS') # sacrifice_boosts
+        ]
+        self.cpp_lib.can_sacrifice_all.restype = ctypes.c_bool
+
+    def find_dominated(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        self.cpp_lib.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def find_dominated_tiled(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        if not self.has_find_dominated_tiled:
+            self.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+            return
+        self.cpp_lib.find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects, max_dims,
+                                          Constants.dominance_chunk_size, Constants.dominance_tile_size, dominated_bools)
+
+    def find_dominated_buckets(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, buckets, dominated_bools):
+        if not self.has_find_dominated_buckets:
+            self.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+            return
+        self.cpp_lib.find_dominated_buckets(amounts, bought_amounts, sorted_indices, num_objects, max_dims,
+                                            buckets.ranks, buckets.bucket_of, buckets.bucket_lines, buckets.bucket_offsets,
+                                            buckets.dominator_buckets, buckets.dominator_offsets, dominated_bools)
+
+    def can_buy_all(self, amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools):
+        return bool(self.cpp_lib.can_buy_all(amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools))
+
+    def can_sacrifice_all(self, amounts, allowed_sacrifices, num_objects, max_dims, sacrifices_length, sacrifice_boosts):
+        return bool(self.cpp_lib.can_sacrifice_all(amounts, allowed_sacrifices, num_objects, max_dims,
+                                                   sacrifices_length, sacrifice_boosts))
+
+
+class NumpyBackend(KernelBackend):
+    """
+    Pure NumPy reference implementation. Slowest, but has no dependencies besides NumPy.
+    """
+    name = 'numpy'
+
+    def find_dominated(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        # dominance is transitive, so a state is dominated by an earlier state if and only if
+        # it is dominated by an earlier survivor - comparing against survivors only is enough
+        sorted_amounts = amounts[sorted_indices[:num_objects]]
+        sorted_bought_amounts = bought_amounts[sorted_indices[:num_objects]]
+        survivors = np.empty(num_objects, dtype=np.intp)
+        survivors_num = 0
+        for j in range(num_objects):
+            if survivors_num > 0:
+                survivor_lines = survivors[:survivors_num]
+                dominating = ((sorted_amounts[survivor_lines] >= sorted_amounts[j]).all(axis=1) &
+                              (sorted_bought_amounts[survivor_lines] >= sorted_bought_amounts[j]).all(axis=1))
+                if dominating.any():
+                    dominated_bools[sorted_indices[j]] = True
+                    continue
+            survivors[survivors_num] = j
+            survivors_num += 1
+
+    def find_dominated_tiled(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        # find_dominated already compares against contiguous survivors in vectorized form
+        self.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def find_dominated_buckets(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, buckets, dominated_bools):
+        # as in find_dominated, only earlier survivors are compared, but only those from dominator buckets
+        bucket_survivors = [[] for _ in range(buckets.buckets_num)]
+        for position in range(num_objects):
+            j = sorted_indices[position]
+            bucket = buckets.bucket_of[j]
+            dominator_buckets = buckets.dominator_buckets[buckets.dominator_offsets[bucket]:buckets.dominator_offsets[bucket + 1]]
+            survivor_lines = [line for dominator_bucket in dominator_buckets for line in bucket_survivors[dominator_bucket]]
+            if survivor_lines:
+                dominating = ((amounts[survivor_lines] >= amounts[j]).all(axis=1) &
+                              (bought_amounts[survivor_lines] >= bought_amounts[j]).all(axis=1))
+                if dominating.any():
+                    dominated_bools[j] = True
+                    continue
+            bucket_survivors[bucket].append(j)
+
+    def can_buy_all(self, amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools):
+        lines = np.arange(num_objects)
+        can_buy = costs[lines, allowed_purchases[:num_objects, 0]] <= amounts[:num_objects, 0]
+        can_buy_bools[:num_objects] |= can_buy
+        return bool(can_buy.any())
+
+    def can_sacrifice_all(self, amounts, allowed_sacrifices, num_objects, max_dims, sacrifices_length, sacrifice_boosts):
+        old_sacrificed_amount = amounts[:num_objects, max_dims + 1]
+        new_sacrificed_amount = old_sacrificed_amount + amounts[:num_objects, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            old_sacrifice_multiplier = np.where(old_sacrificed_amount == 0, 1.0,
+                                                np.maximum(np.log10(old_sacrificed_amount) / 10, 1) ** 2)
+            new_sacrifice_multiplier = np.where(new_sacrificed_amount == 0, 1.0,
+                                                np.maximum(np.log10(new_sacrificed_amount) / 10, 1) ** 2)
+        sacrifice_boost = new_sacrifice_multiplier / old_sacrifice_multiplier
+        can_sacrifice = (amounts[:num_objects, 8] != 0) & (sacrifice_boost >= allowed_sacrifices[:num_objects, 0])
+        sacrifice_boosts[:num_objects][can_sacrifice] = sacrifice_boost[can_sacrifice]
+        return bool(can_sacrifice.any())
+
+
+class NumbaBackend(KernelBackend):
+    """
+    Numba JIT implementation. Compiled on first use and cached next to the sources.
+    """
+    name = 'numba'
+
+    def __init__(self) -> None:
+        # raises ImportError without numba
+        import numba_kernels
+        self.kernels = numba_kernels
+
+    def find_dominated(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        self.kernels.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, dominated_bools)
+
+    def find_dominated_tiled(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        self.kernels.find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects,
+                                          Constants.dominance_chunk_size, Constants.dominance_tile_size, dominated_bools)
+
+    def find_dominated_buckets(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, buckets, dominated_bools):
+        self.kernels.find_dominated_buckets(amounts, bought_amounts, sorted_indices, num_objects, buckets.ranks, buckets.bucket_of,
+                                            buckets.bucket_lines, buckets.bucket_offsets, buckets.dominator_buckets,
+                                            buckets.dominator_offsets, dominated_bools)
+
+    def can_buy_all(self, amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools):
+        self.kernels.can_buy_all(amounts, costs, allowed_purchases, num_objects, can_buy_bools)
+        return bool(can_buy_bools[:num_objects].any())
+
+    def can_sacrifice_all(self, amounts, allowed_sacrifices, num_objects, max_dims, sacrifices_length, sacrifice_boosts):
+        self.kernels.can_sacrifice_all(amounts, allowed_sacrifices, num_objects, max_dims, sacrifice_boosts)
+        return bool((sacrifice_boosts[:num_objects] > 0).any())
+
+
+backend_classes = {
+    NativeBackend.name: NativeBackend,
+    NumbaBackend.name: NumbaBackend,
+    NumpyBackend.name: NumpyBackend
+}
+
+
+def create_backend(name: Union[str, None]=None) -> KernelBackend:
+    """
+    Creates backend by name ('native', 'numba' or 'numpy').
+    Without a name, AD_BACKEND environment variable is used, and if it is not set,
+    the first backend that can be loaded in the order native -> numba -> numpy.
+    """
+    if name is None:
+        name = os.environ.get('AD_BACKEND')
+    if name is not None:
+        return backend_classes[name]()
+    for backend_class in backend_classes.values():
+        try:
+            return backend_class()
+        except (OSError, ImportError):
+            continue
+    raise RuntimeError("No kernel backend available")
+
+
+def default_backend() -> KernelBackend:
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_backend()
+    return _default_backend
+
+_default_backend = None
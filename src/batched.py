@@ -0,0 +1,140 @@
+from typing import Union, TYPE_CHECKING
+import time
+import numpy as np
+
+from utils import ArraysTypes, Constants, Helper
+from runner import Runner
+from live import live_display
+
+if TYPE_CHECKING:
+    from purchase_strategies import PurchaseStrategy
+    from sacrifice_strategies import SacrificeStrategy
+    from backends import KernelBackend
+
+
+class BatchedRunner(Runner):
+    """
+    One population for several configs (platform, galaxies_bought, dimboosts_bought) with the same max_dims.
+    Every state keeps the index of its config: tick, buy and clear passes are shared by all configs,
+    while dominance is checked only between states of the same config and every config stops at its own winner.
+    """
+    def __init__(self, configs: list,
+                 purchase_strategy: 'PurchaseStrategy',
+                 sacrifice_strategy: 'SacrificeStrategy',
+                 backend: Union['KernelBackend', None]=None,
+                 dominance_epsilon: float=0.0):
+        self.configs = [tuple(config) for config in configs]
+        if len({Helper.max_dims(dimboosts_bought) for _, _, dimboosts_bought in self.configs}) != 1:
+            raise ValueError("BatchedRunner configs must have the same max_dims")
+        for platform, galaxies_bought, dimboosts_bought in self.configs:
+            if not self.can_be_batched(galaxies_bought, dimboosts_bought):
+                raise ValueError(f"Config {platform} g{galaxies_bought} d{dimboosts_bought} can't be batched")
+            if sacrifice_strategy.is_real_sacrifice_strategy and (dimboosts_bought < 5):
+                raise ValueError(f"Config {platform} g{galaxies_bought} d{dimboosts_bought} has no sacrifice")
+
+        self.config_tick_durations = np.array([Constants.tick_duration[platform] for platform, _, _ in self.configs],
+                                              dtype=ArraysTypes.amounts)
+        self.config_winner_last_dim_bought = np.array([Helper.winner_last_dim_bought(galaxies_bought, dimboosts_bought)
+                                                       for _, galaxies_bought, dimboosts_bought in self.configs],
+                                                      dtype=ArraysTypes.bought_amounts)
+        self.config_states_alltime = [0] * len(self.configs)
+        self.config_winner_dicts = [None] * len(self.configs)
+        self.config_index = 0
+
+        platform, galaxies_bought, dimboosts_bought = self.configs[0]
+        super().__init__(platform, galaxies_bought, dimboosts_bought, purchase_strategy, sacrifice_strategy,
+                         backend=backend, dominance_epsilon=dominance_epsilon)
+        for config_index in range(1, len(self.configs)):
+            self.select_config(config_index)
+            line = self.num_states_current
+            self.add_start_state()
+            self.buy(line=line, item_int=1)
+
+    @classmethod
+    def can_be_batched(cls, galaxies_bought: int, dimboosts_bought: int) -> bool:
+        # winners found by antimatter overflow end the whole tick, so such configs are run alone
+        return Helper.winner_antimatter(galaxies_bought, dimboosts_bought) < 1.78e308
+
+    def select_config(self, config_index: int) -> None:
+        # scalar config attributes are used by per-state methods and by strategies,
+        # they are switched to the config of the state before it is changed
+        self.config_index = config_index
+        self.platform, self.galaxies_bought, self.dimboosts_bought = self.configs[config_index]
+        self.tick_duration = Constants.tick_duration[self.platform]
+
+    def state_arrays_spec(self, actions_lists_length: int=0) -> dict:
+        state_arrays_spec = super().state_arrays_spec(actions_lists_length)
+        state_arrays_spec['config_ids'] = ((), ArraysTypes.config_ids)
+        return state_arrays_spec
+
+    def add_start_state(self) -> None:
+        line = self.num_states_current
+        self.config_ids[line] = self.config_index
+        self.config_states_alltime[self.config_index] += 1
+        super().add_start_state()
+
+    def buy_item(self, line: int, item_int: int) -> None:
+        self.select_config(self.config_ids[line])
+        super().buy_item(line, item_int)
+
+    def sacrifice(self, line: int, sacrifice_boost: float) -> None:
+        self.select_config(self.config_ids[line])
+        super().sacrifice(line, sacrifice_boost)
+
+    def add_state_copy(self, orig_line: int) -> int:
+        new_line = super().add_state_copy(orig_line)
+        self.config_states_alltime[self.config_ids[orig_line]] += 1
+        return new_line
+
+    def tick_all(self) -> None:
+        start_time = time.perf_counter()
+        tick_durations = self.config_tick_durations[self.config_ids[:self.num_states_current]]
+        for tier in range(self.max_dims, 0, -1):
+            self.amounts[:self.num_states_current, tier - 1] += self.amounts[:self.num_states_current, tier] * self.multipliers[:self.num_states_current, tier] * self.multipliers[:self.num_states_current, 0] * tick_durations
+        self.ticks_passed += 1
+        end_time = time.perf_counter()
+        self.spent_for_tick += end_time - start_time
+
+    def find_dominated(self, amounts: np.ndarray, bought_amounts: np.ndarray, num_objects: int) -> np.ndarray:
+        dominated_bools = np.zeros(num_objects, dtype=bool)
+        config_ids = self.config_ids[:num_objects]
+        for config_index in np.unique(config_ids):
+            lines = np.flatnonzero(config_ids == config_index)
+            dominated_bools[lines] = super().find_dominated(amounts[lines], bought_amounts[lines], len(lines))
+        return dominated_bools
+
+    def lines_winner_last_dim_bought(self, lines: np.ndarray) -> Union[int, np.ndarray]:
+        return self.config_winner_last_dim_bought[self.config_ids[lines]][:, np.newaxis]
+
+    def winner_bools(self) -> np.ndarray:
+        winner_last_dim_bought = self.config_winner_last_dim_bought[self.config_ids[:self.num_states_current]]
+        return self.bought_amounts[:self.num_states_current, -1] >= winner_last_dim_bought
+
+    def finish_config(self, config_index: int, winner_bools: np.ndarray, elapsed_seconds: float) -> None:
+        self.select_config(config_index)
+        winner_lines = self.sorted_lines(winner_bools)
+        winner_dict = self.generate_winner_dict(int(winner_lines[0]), len(winner_lines), elapsed_seconds)
+        winner_dict['strategy_search_info']['states_analyzed'] = self.config_states_alltime[config_index]
+        winner_dict['strategy_search_info']['batched_configs'] = len(self.configs)
+        self.config_winner_dicts[config_index] = winner_dict
+
+    def run(self) -> list:
+        # returns winner dicts in the order of configs; states of a config are removed when it has a winner
+        start_time = time.perf_counter()
+        self.time_of_last_refresh = start_time
+
+        while self.num_states_current > 0:
+            self.cycle()
+            winner_bools = self.winner_bools()
+            if not winner_bools.any():
+                continue
+            config_ids = self.config_ids[:self.num_states_current]
+            finished_bools = np.zeros(self.num_states_current, dtype=bool)
+            for config_index in np.unique(config_ids[winner_bools]):
+                config_bools = (config_ids == config_index)
+                self.finish_config(int(config_index), winner_bools & config_bools, time.perf_counter() - start_time)
+                finished_bools |= config_bools
+            self.remove_states(finished_bools)
+
+        live_display.complete_progress_bar()
+        return self.config_winner_dicts
@@ -0,0 +1,134 @@
+import time
+import sys
+import subprocess
+import numpy as np
+
+from utils import ArraysTypes, Helper
+from backends import backend_classes, DominanceBuckets
+from runner import Runner
+from purchase_strategies import OptimizedPurchaseStrategy
+from sacrifice_strategies import NeverSacrificeStrategy
+from test import random_population
+
+
+def measure(function, repeats: int) -> float:
+    function() # warm-up (JIT compilation, page faults)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    end_time = time.perf_counter()
+    return (end_time - start_time) / repeats
+
+
+def benchmark_backends(num_objects: int=5000, repeats: int=3) -> None:
+    max_dims = 8
+    sacrifices_length = 3
+    population = random_population(num_objects, max_dims, sacrifices_length)
+    print(f"CPU: {Helper.cpu_info()}, states: {num_objects}")
+    for name, backend_class in backend_classes.items():
+        try:
+            backend = backend_class()
+        except (OSError, ImportError):
+            print(f"{name:>8}: not available")
+            continue
+
+        def find_dominated():
+            dominated_bools = np.zeros(num_objects, dtype=bool)
+            backend.find_dominated(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                   num_objects, max_dims, dominated_bools)
+
+        def can_buy_all():
+            can_buy_bools = np.zeros(num_objects, dtype=bool)
+            backend.can_buy_all(population['amounts'], population['costs'], population['allowed_purchases'],
+                                num_objects, max_dims, can_buy_bools)
+
+        def can_sacrifice_all():
+            sacrifice_boosts = np.zeros(num_objects, dtype=ArraysTypes.sacrifice_boosts)
+            backend.can_sacrifice_all(population['amounts'], population['allowed_sacrifices'],
+                                      num_objects, max_dims, sacrifices_length, sacrifice_boosts)
+
+        print(f"{name:>8}: "
+              f"find_dominated {measure(find_dominated, repeats) * 1000:9.3f} ms, "
+              f"can_buy_all {measure(can_buy_all, repeats) * 1000:7.3f} ms, "
+              f"can_sacrifice_all {measure(can_sacrifice_all, repeats) * 1000:7.3f} ms")
+
+
+def benchmark_dominance(num_objects_list: list=[1000, 4000, 16000], repeats: int=3) -> None:
+    max_dims = 8
+    sacrifices_length = 3
+    print(f"CPU: {Helper.cpu_info()}")
+    for num_objects in num_objects_list:
+        population = random_population(num_objects, max_dims, sacrifices_length)
+        for name, backend_class in backend_classes.items():
+            try:
+                backend = backend_class()
+            except (OSError, ImportError):
+                print(f"{name:>8}: not available")
+                continue
+
+            def find_dominated():
+                dominated_bools = np.zeros(num_objects, dtype=bool)
+                backend.find_dominated(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                       num_objects, max_dims, dominated_bools)
+
+            def find_dominated_tiled():
+                dominated_bools = np.zeros(num_objects, dtype=bool)
+                backend.find_dominated_tiled(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                             num_objects, max_dims, dominated_bools)
+
+            def find_dominated_buckets():
+                dominated_bools = np.zeros(num_objects, dtype=bool)
+                buckets = DominanceBuckets(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                           num_objects, max_dims)
+                backend.find_dominated_buckets(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                               num_objects, max_dims, buckets, dominated_bools)
+
+            print(f"{name:>8}, states: {num_objects:6}: "
+                  f"pairs {measure(find_dominated, repeats) * 1000:9.3f} ms, "
+                  f"tiled {measure(find_dominated_tiled, repeats) * 1000:9.3f} ms, "
+                  f"buckets {measure(find_dominated_buckets, repeats) * 1000:9.3f} ms")
+
+
+def benchmark_epsilon(epsilons: list=[0.001, 0.01, 0.05], dimboosts_bought_list: list=[1, 3, 5],
+                      platform: str='pc', galaxies_bought: int=0) -> None:
+    # effect of approximate dominance on the winner compared to the exact search
+    print(f"CPU: {Helper.cpu_info()}")
+    for dimboosts_bought in dimboosts_bought_list:
+        exact_ticks_passed = None
+        for dominance_epsilon in [0.0] + epsilons:
+            runner = Runner(platform=platform,
+                            galaxies_bought=galaxies_bought,
+                            dimboosts_bought=dimboosts_bought,
+                            purchase_strategy=OptimizedPurchaseStrategy(),
+                            sacrifice_strategy=NeverSacrificeStrategy(),
+                            dominance_epsilon=dominance_epsilon)
+            winner_dict = runner.run()
+            ticks_passed = winner_dict['game_info']['ticks_passed']
+            if exact_ticks_passed is None:
+                exact_ticks_passed = ticks_passed
+            print(f"{platform} galaxy {galaxies_bought} dimboost {dimboosts_bought}, epsilon {dominance_epsilon:<5}: "
+                  f"ticks {ticks_passed} ({ticks_passed - exact_ticks_passed:+}), "
+                  f"states analyzed {winner_dict['strategy_search_info']['states_analyzed']}, "
+                  f"time {winner_dict['strategy_search_info']['strategy_search_time']}")
+
+
+def benchmark_startup(repeats: int=3) -> None:
+    # wall time of fresh interpreters: importing the runner, the cached CPU info and a short job
+    snippets = {
+        'import runner': "import runner",
+        'cpu info': "from utils import Helper; Helper.cpu_info()",
+        'short job': "from runner import Runner; from purchase_strategies import OptimizedPurchaseStrategy; "
+                     "from sacrifice_strategies import NeverSacrificeStrategy; "
+                     "Runner('pc', 0, 0, OptimizedPurchaseStrategy(), NeverSacrificeStrategy()).run()"
+    }
+    print(f"CPU: {Helper.cpu_info()}")
+    for name, snippet in snippets.items():
+        run_snippet = lambda: subprocess.run([sys.executable, '-c', snippet], check=True, capture_output=True)
+        print(f"{name:<14}: {measure(run_snippet, repeats) * 1000:9.3f} ms")
+
+
+if __name__ == '__main__':
+    benchmark_startup()
+    benchmark_backends()
+    benchmark_dominance()
+    benchmark_epsilon()
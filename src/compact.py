@@ -0,0 +1,268 @@
+from typing import Union, TYPE_CHECKING
+from pathlib import Path
+import math
+import time
+import numpy as np
+
+from utils import ArraysTypes, Constants, Helper
+from runner import Runner
+from backends import KernelBackend, NativeBackend, NumbaBackend, NumpyBackend
+from live import live_display
+
+if TYPE_CHECKING:
+    from purchase_strategies import PurchaseStrategy
+    from sacrifice_strategies import SacrificeStrategy
+    from array_pool import ArrayPool
+
+
+class CompactArraysTypes(ArraysTypes):
+    # amounts, costs and multipliers are log10 of their values, log10(0) is -inf
+    amounts = np.float32
+    costs = np.float32
+    multipliers = np.float32
+    bought_amounts = np.uint16
+    allowed_purchases = np.int8
+    purchases_done = np.uint16
+    sacrifices_done = np.uint16
+
+
+def log_add(a: Union[float, np.ndarray], b: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    # log10(10^a + 10^b)
+    return np.logaddexp(a * math.log(10), b * math.log(10)) / math.log(10)
+
+
+def log_add_one(a: float) -> float:
+    # log10(10^a + 1), log_add for a single purchased dimension without NumPy overhead
+    return max(a, 0.0) + math.log10(1 + 10 ** -abs(a))
+
+
+def log_subtract(a: float, b: float) -> float:
+    # log10(10^a - 10^b) for a >= b
+    if a == b:
+        return -math.inf
+    return a + math.log10(-math.expm1((b - a) * math.log(10)))
+
+
+class StrategyArray:
+    """
+    State array as strategies read it: values are converted on access. Lines are converted once and kept
+    as lists until the view is cleared before the next strategy call, other keys are converted every time.
+    """
+    def __init__(self, runner: 'CompactRunner', name: str, convert) -> None:
+        self.runner = runner
+        self.name = name
+        self.convert = convert
+        self.lines = {}
+
+    def __getitem__(self, key):
+        try:
+            return self.lines[key]
+        except KeyError:
+            self.lines[key] = self.convert(getattr(self.runner, self.name)[key]).tolist()
+            return self.lines[key]
+        except TypeError:
+            # array keys of vectorized strategies are not hashable
+            return self.convert(getattr(self.runner, self.name)[key])
+
+
+class LinearView:
+    """
+    CompactRunner as seen by strategies: amounts and costs in linear scale and bought amounts as signed integers,
+    so strategies work unchanged. Every other attribute is the one of the runner.
+    """
+    def __init__(self, runner: 'CompactRunner') -> None:
+        self.runner = runner
+        self.amounts = StrategyArray(runner, 'amounts', self.to_linear)
+        self.costs = StrategyArray(runner, 'costs', self.to_linear)
+        self.bought_amounts = StrategyArray(runner, 'bought_amounts', self.to_signed)
+
+    def __getattr__(self, name: str):
+        return getattr(self.runner, name)
+
+    @classmethod
+    def to_linear(cls, values: np.ndarray) -> np.ndarray:
+        # values above the float64 range (costs of far tiers in late configs) are seen by strategies as inf,
+        # so they are never affordable
+        with np.errstate(over='ignore'):
+            return np.power(10.0, values, dtype=np.float64)
+
+    @classmethod
+    def to_signed(cls, values: np.ndarray) -> np.ndarray:
+        return values.astype(np.int32)
+
+    def clear(self) -> None:
+        # states change between strategy calls
+        for array in [self.amounts, self.costs, self.bought_amounts]:
+            array.lines = {}
+
+
+class LogDomainBackend(KernelBackend):
+    """
+    Kernels for CompactRunner: dominance and can_buy_all only compare values, so they are the ones of a dtype-generic
+    backend (numba or numpy). Bucketed dominance is replaced by the tiled one, its keys need non-negative amounts.
+    """
+    name = 'log'
+
+    def __init__(self, backend: Union[KernelBackend, None]=None) -> None:
+        if backend is None:
+            try:
+                backend = NumbaBackend()
+            except ImportError:
+                backend = NumpyBackend()
+        if isinstance(backend, (NativeBackend, LogDomainBackend)):
+            raise ValueError(f"Backend {backend.name} can't be used for compact states")
+        self.backend = backend
+
+    def find_dominated(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        self.backend.find_dominated(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def find_dominated_tiled(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        self.backend.find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def find_dominated_states(self, amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools):
+        if Constants.dominance_kernel == 'buckets':
+            self.find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+        else:
+            super().find_dominated_states(amounts, bought_amounts, sorted_indices, num_objects, max_dims, dominated_bools)
+
+    def can_buy_all(self, amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools):
+        return self.backend.can_buy_all(amounts, costs, allowed_purchases, num_objects, max_dims, can_buy_bools)
+
+    def can_sacrifice_all(self, amounts, allowed_sacrifices, num_objects, max_dims, sacrifices_length, sacrifice_boosts):
+        # as NumpyBackend.can_sacrifice_all, log10 of sacrificed amounts is already stored
+        old_sacrificed_amount = amounts[:num_objects, max_dims + 1].astype(np.float64)
+        new_sacrificed_amount = log_add(old_sacrificed_amount, amounts[:num_objects, 1].astype(np.float64))
+        old_sacrifice_multiplier = np.where(old_sacrificed_amount == -np.inf, 1.0, np.maximum(old_sacrificed_amount / 10, 1) ** 2)
+        new_sacrifice_multiplier = np.where(new_sacrificed_amount == -np.inf, 1.0, np.maximum(new_sacrificed_amount / 10, 1) ** 2)
+        sacrifice_boost = new_sacrifice_multiplier / old_sacrifice_multiplier
+        can_sacrifice = (amounts[:num_objects, 8] != -np.inf) & (sacrifice_boost >= allowed_sacrifices[:num_objects, 0])
+        sacrifice_boosts[:num_objects][can_sacrifice] = sacrifice_boost[can_sacrifice]
+        return bool(can_sacrifice.any())
+
+
+class CompactRunner(Runner):
+    """
+    Runner with compact states: log10 of amounts, costs and multipliers in float32 and narrow integer counters,
+    a state takes less than half the bytes of Runner's. Nothing overflows in log scale: states that would overflow
+    in Runner.tick_all are winners right after the tick, as overflow winners of Runner are.
+    Strategies see linear values through LinearView. Saved actions have linear costs and can be replayed by ReplayRunner.
+
+    float32 logs keep about 7 significant digits, so small additions are rounded and states with almost equal
+    amounts can dominate each other: winners are found at the same tick as by Runner or a tick away (see test_compact).
+    """
+    arrays_types = CompactArraysTypes
+    log_overflow_amount = math.log10(np.finfo(np.float64).max)
+
+    def __init__(self, platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 purchase_strategy: 'PurchaseStrategy',
+                 sacrifice_strategy: 'SacrificeStrategy',
+                 backend: Union[KernelBackend, None]=None,
+                 dominance_epsilon: float=0.0,
+                 pipelined_clear: bool=False,
+                 telemetry_path: Union[str, Path, None]=None,
+                 array_pool: Union['ArrayPool', None]=None):
+        self.linear_view = LinearView(self)
+        self.can_overflow = Helper.winner_antimatter(galaxies_bought, dimboosts_bought) >= 1.78e308
+        self.log_tick_duration = CompactArraysTypes.amounts(math.log10(Constants.tick_duration[platform]))
+        super().__init__(platform, galaxies_bought, dimboosts_bought, purchase_strategy, sacrifice_strategy,
+                         backend=LogDomainBackend(backend), dominance_epsilon=dominance_epsilon,
+                         pipelined_clear=pipelined_clear, telemetry_path=telemetry_path, array_pool=array_pool)
+        live_display.init_progress_bar(
+            current_am=10 ** float(self.max_am),
+            total_am=Helper.winner_antimatter(self.galaxies_bought, self.dimboosts_bought))
+
+    def strategy_view(self) -> LinearView:
+        self.linear_view.clear()
+        return self.linear_view
+
+    def set_start_values(self, line: int) -> None:
+        self.amounts[line] = -np.inf
+        self.amounts[line][0] = math.log10(Constants.start_antimatter)
+        self.costs[line][0] = math.log10(Constants.tickspeed_base_cost)
+        for tier in range(1, self.max_dims + 1):
+            self.costs[line][tier] = math.log10(Constants.dims_base_costs[tier])
+        self.multipliers[line][0] = math.log10(Constants.tickspeed_base_multiplier)
+        for tier in range(1, self.max_dims + 1):
+            self.multipliers[line][tier] = math.log10(Constants.dims_base_multipliers[tier])
+            if self.platform == 'mobile':
+                self.multiply_multiplier(line, tier, Constants.mobile_dim_multiplier)
+
+    def multiply_multiplier(self, line: int, tier: int, multiplier: float) -> None:
+        self.multipliers[line][tier] += math.log10(multiplier)
+
+    def buy_item(self, line: int, item_int: int) -> None:
+        cost = self.costs[line][item_int]
+        if cost > self.amounts[line][0]:
+            raise Exception("Negative antimatter")
+        self.amounts[line][0] = log_subtract(float(self.amounts[line][0]), float(cost))
+        self.bought_amounts[line][item_int] += 1
+        self.purchases_done[line] += 1
+        if item_int == 0:
+            self.costs[line][item_int] += math.log10(Constants.tickspeed_base_cost_multiplier)
+            self.multiply_multiplier(line, item_int, Constants.tickspeed_multiplier_multipliers[self.galaxies_bought])
+        else:
+            self.amounts[line][item_int] = log_add_one(float(self.amounts[line][item_int]))
+            if self.bought_amounts[line][item_int] % 10 == 0:
+                self.costs[line][item_int] += math.log10(Constants.dims_base_cost_multipliers[item_int])
+                self.multiply_multiplier(line, item_int, Constants.buy_ten_multiplier)
+            elif self.bought_amounts[line][item_int] == 1:
+                self.add_ach_for_new_dim(line, item_int)
+
+        self.add_action(line, item_int, 10 ** float(cost))
+
+    def sacrifice(self, line: int, sacrifice_boost: float) -> None:
+        self.amounts[line][self.max_dims + 1] = log_add(self.amounts[line][self.max_dims + 1], self.amounts[line][1])
+        self.multiply_multiplier(line, 8, sacrifice_boost)
+        self.amounts[line][1:self.max_dims] = -np.inf
+        self.sacrifices_done[line] += 1
+        self.real_total_sacrifice_boosts[line] *= sacrifice_boost
+
+        self.add_action(line, Constants.sacrifice_action_const, sacrifice_boost)
+        self.allowed_sacrifices[line] = self.sacrifice_strategy.next_sacrifices(self.strategy_view(), line)
+
+    def tick_all(self) -> None:
+        start_time = time.perf_counter()
+        for tier in range(self.max_dims, 0, -1):
+            produced = self.amounts[:self.num_states_current, tier] + self.multipliers[:self.num_states_current, tier] + self.multipliers[:self.num_states_current, 0] + self.log_tick_duration
+            self.amounts[:self.num_states_current, tier - 1] = log_add(self.amounts[:self.num_states_current, tier - 1], produced)
+        self.ticks_passed += 1
+        end_time = time.perf_counter()
+        self.spent_for_tick += end_time - start_time
+
+    def dominance_amounts(self, amounts: np.ndarray, num_objects: int) -> np.ndarray:
+        if self.dominance_epsilon == 0:
+            return amounts
+        # as in Runner.dominance_amounts, logs are rounded down to the grid directly
+        grid_step = -math.log10(1 - self.dominance_epsilon)
+        return (np.floor(amounts[:num_objects] / grid_step) * grid_step).astype(amounts.dtype)
+
+    def overflow_bools(self) -> np.ndarray:
+        # Runner.tick_all overflows when amount * multiplier * tickspeed multiplier of a tier (before the tick duration)
+        # or a new amount is too large, and then every lower tier and antimatter of the state is infinite.
+        # Only winners found by antimatter overflow get that far
+        if not self.can_overflow:
+            return np.zeros(self.num_states_current, dtype=bool)
+        amounts = self.amounts[:self.num_states_current, :self.max_dims + 1]
+        multipliers = self.multipliers[:self.num_states_current]
+        productions = amounts[:, 1:] + multipliers[:, 1:] + multipliers[:, 0:1]
+        return (productions >= self.log_overflow_amount).any(axis=1) | (amounts >= self.log_overflow_amount).any(axis=1)
+
+    def winner_bools(self) -> np.ndarray:
+        return super().winner_bools() | self.overflow_bools()
+
+    def cycle(self) -> None:
+        # overflow winners are taken right after the tick, before they buy anything
+        self.tick_all()
+        if not self.overflow_bools().any():
+            self.act_all()
+
+    def check_progress_update(self):
+        current_max_am = np.max(self.amounts[:self.num_states_current, 0])
+        if current_max_am > self.max_am:
+            self.max_am = current_max_am
+            live_display.update_progress_bar(10 ** min(float(self.max_am), math.floor(self.log_overflow_amount)))
+
+    def generate_winner_dict(self, winner_line: int, number_of_winners: int, elapsed_seconds: float, aborted: bool=False) -> dict:
+        winner_dict = super().generate_winner_dict(winner_line, number_of_winners, elapsed_seconds, aborted)
+        winner_dict['strategy_search_info']['compact_states'] = True
+        return winner_dict
@@ -1,5 +1,7 @@
 #include <stdint.h>
 #include <math.h>
+#include <vector>
+#include <algorithm>
 extern "C" {
     bool can_buy(const double* amounts, const double* costs, const int32_t* allowed_purchases, int max_dims, int line) {
         int amounts_features = max_dims + 2;
@@ -95,4 +97,86 @@ extern "C" {
             }
         }
     }
-}
\ No newline at end of file
+
+    // same result as find_dominated, but j is compared only against survivors of the chunks before its chunk
+    // (stored in column-major order, a tile of them at once, vectorized) and against earlier lines of its chunk
+    void find_dominated_tiled(const double* amounts, const int32_t* bought_amounts, const int32_t* sorted_indices, int num_objects, int max_dims,
+                              int chunk_size, int tile_size, bool* marked) {
+        int amounts_features = max_dims + 2;
+        int bought_amounts_features = max_dims + 1;
+        std::vector<double> survivor_amounts((size_t)amounts_features * num_objects);
+        std::vector<int32_t> survivor_bought_amounts((size_t)bought_amounts_features * num_objects);
+        int survivors_num = 0;
+        #pragma omp parallel
+        {
+            // one buffer per thread, reused for all lines and chunks
+            std::vector<unsigned char> dominating(tile_size);
+            for (int chunk_start = 0; chunk_start < num_objects; chunk_start += chunk_size) {
+                int chunk_end = std::min(chunk_start + chunk_size, num_objects);
+                #pragma omp for schedule(dynamic, 8)
+                for (int position = chunk_start; position < chunk_end; ++position) {
+                    int j = sorted_indices[position];
+                    const double* amounts_j = &amounts[(size_t)j * amounts_features];
+                    const int32_t* bought_amounts_j = &bought_amounts[(size_t)j * bought_amounts_features];
+                    bool dominated = false;
+                    for (int tile_start = 0; (tile_start < survivors_num) and (not dominated); tile_start += tile_size) {
+                        int tile_length = std::min(tile_size, survivors_num - tile_start);
+                        for (int t = 0; t < tile_length; ++t) dominating[t] = 1;
+                        for (int k = 0; k < amounts_features; ++k) {
+                            const double* column = &survivor_amounts[(size_t)k * num_objects + tile_start];
+                            double value = amounts_j[k];
+                            for (int t = 0; t < tile_length; ++t) dominating[t] &= (column[t] >= value);
+                        }
+                        for (int k = 0; k < bought_amounts_features; ++k) {
+                            const int32_t* column = &survivor_bought_amounts[(size_t)k * num_objects + tile_start];
+                            int32_t value = bought_amounts_j[k];
+                            for (int t = 0; t < tile_length; ++t) dominating[t] &= (column[t] >= value);
+                        }
+                        unsigned char any_dominating = 0;
+                        for (int t = 0; t < tile_length; ++t) any_dominating |= dominating[t];
+                        dominated = any_dominating;
+                    }
+                    for (int earlier = chunk_start; (earlier < position) and (not dominated); ++earlier) {
+                        int i = sorted_indices[earlier];
+                        dominated = (not marked[i]) and dominates(amounts, bought_amounts, max_dims, i, j);
+                    }
+                    if (dominated) marked[j] = true;
+                }
+                // the implicit barrier of omp single publishes the new survivors before the next chunk
+                #pragma omp single
+                for (int position = chunk_start; position < chunk_end; ++position) {
+                    int j = sorted_indices[position];
+                    if (marked[j]) continue;
+                    for (int k = 0; k < amounts_features; ++k) {
+                        survivor_amounts[(size_t)k * num_objects + survivors_num] = amounts[(size_t)j * amounts_features + k];
+                    }
+                    for (int k = 0; k < bought_amounts_features; ++k) {
+                        survivor_bought_amounts[(size_t)k * num_objects + survivors_num] = bought_amounts[(size_t)j * bought_amounts_features + k];
+                    }
+                    ++survivors_num;
+                }
+            }
+        }
+    }
+
+    void find_dominated_buckets(const double* amounts, const int32_t* bought_amounts, const int32_t* sorted_indices, int num_objects, int max_dims,
+                                const int32_t* ranks, const int32_t* bucket_of, const int32_t* bucket_lines, const int32_t* bucket_offsets,
+                                const int32_t* dominator_buckets, const int32_t* dominator_offsets, bool* marked) {
+        #pragma omp parallel for
+        for (int position = 1; position < num_objects; ++position) {
+            int j = sorted_indices[position];
+            int bucket = bucket_of[j];
+            for (int k = dominator_offsets[bucket]; (k < dominator_offsets[bucket + 1]) and (not marked[j]); ++k) {
+                int dominator_bucket = dominator_buckets[k];
+                for (int m = bucket_offsets[dominator_bucket]; m < bucket_offsets[dominator_bucket + 1]; ++m) {
+                    int i = bucket_lines[m];
+                    if (ranks[i] >= position) break;
+                    if ((not marked[i]) and (dominates(amounts, bought_amounts, max_dims, i, j))) {
+                        marked[j] = true;
+                        break;
+                    }
+                }
+            }
+        }
+    }
+}
@@ -1,10 +1,14 @@
-from typing import TYPE_CHECKING
-import copy
+from typing import Union, TYPE_CHECKING
+import time
 
-from utils import Helper
+from utils import Constants, Helper
 from runner import Runner
-from purchase_strategies import OptimizedPurchaseStrategy, PurchaseStrategyFromActionList
-from sacrifice_strategies import NeverSacrificeStrategy, IncrementalSacrificeStrategy, SacrificeStrategyFromActionList
+from array_pool import ArrayPool
+from purchase_strategies import OptimizedPurchaseStrategy, PurchaseStrategyWithList
+from sacrifice_strategies import NeverSacrificeStrategy, IncrementalSacrificeStrategy, WindowedSacrificeStrategy, SacrificeStrategyWithList
+from replay import ReplayRunner, local_search
+from warm_start import warm_start_incumbent
+from results import Results
 from live import live_display
 
 if TYPE_CHECKING:
@@ -12,8 +16,11 @@ if TYPE_CHECKING:
 
 
 class Iterator():
-    def __init__(self, purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int) -> None:
+    def __init__(self, purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 array_pool: Union[ArrayPool, None]=None) -> None:
         self.purchase_strategy = purchase_strategy
+        # state arrays are reused by all runners of the iterator (and of other iterators sharing the pool)
+        self.array_pool = ArrayPool() if array_pool is None else array_pool
         self.platform = platform
         self.galaxies_bought = galaxies_bought
         self.dimboosts_bought = dimboosts_bought
@@ -26,6 +33,7 @@ class Iterator():
             'number_of_iterations': 0
             }
         self.iterative_optimization_info['iterations'] = []
+        self.winner_iteration_index = 0
     
     def add_iteration(self, iteration_info: dict) -> None:
         self.iterative_optimization_info['total_strategy_search_time'] = Helper.sum_times_str(self.iterative_optimization_info['total_strategy_search_time'], iteration_info['strategy_search_info']['strategy_search_time'])
@@ -40,79 +48,181 @@ class Iterator():
             winner_dict = self.iterative_optimization_info['iterations'][0]
             iterative_optimization_info_short = None
         else:
-            if len(self.iterative_optimization_info['iterations']) == 2:
-                winner_dict = self.iterative_optimization_info['iterations'][-1]
-            else:
-                winner_dict = self.iterative_optimization_info['iterations'][-3]
+            winner_dict = self.iterative_optimization_info['iterations'][self.winner_iteration_index]
         
-            iterative_optimization_info_short = copy.deepcopy(self.iterative_optimization_info)
-            for iteration in iterative_optimization_info_short['iterations']:
-                del iteration['actions_readable_list']
+            # shallow copies without action lists: only the winner's actions are saved
+            iterative_optimization_info_short = dict(self.iterative_optimization_info)
+            iterative_optimization_info_short['iterations'] = [
+                {key: value for key, value in iteration.items() if key not in ('actions_readable_list', 'actions')}
+                for iteration in self.iterative_optimization_info['iterations']
+            ]
         
         filename = Helper.get_filename(self.purchase_strategy,
                                        winner_dict['game_info']['platform'],
                                        winner_dict['game_info']['galaxies_bought'],
                                        winner_dict['game_info']['dimboosts_bought'],
                                        winner_dict['game_info']['has_sacrifice'])
-        Helper.save_winner_dict(winner_dict, iterative_optimization_info_short, filename)
+        Results.save_winner_dict(winner_dict, iterative_optimization_info_short, filename)
     
-    def get_last_actions_readable_list(self) -> str:
-        return self.iterative_optimization_info['iterations'][-1]['actions_readable_list']
+    def get_last_iteration(self) -> dict:
+        return self.iterative_optimization_info['iterations'][-1]
     
     def get_iteration_number(self) -> int:
         return len(self.iterative_optimization_info['iterations'])+1
     
-    def search_and_save(self) -> None:
-        runner = Runner(platform=self.platform,
-            galaxies_bought=self.galaxies_bought,
-            dimboosts_bought=self.dimboosts_bought,
-            purchase_strategy=self.purchase_strategy,
-            sacrifice_strategy=NeverSacrificeStrategy()
-            )
-        live_display.update_iteration(current=self.get_iteration_number(),
-                                      description="Initial run without sacrifice")
-        self.add_iteration(runner.run())
-        self.save_iterative_optimization_info()
-        if self.dimboosts_bought < 5:
-            return
+    def search_sacrifices(self, purchase_list: list, description: str, ticks_limit: Union[int, None]=None) -> None:
+        # coarse-to-fine: the first search covers all sacrifice boosts with a coarse step,
+        # each next one uses a finer step only around sacrifice boosts of the previous winner.
+        # ticks_limit applies only to the final search, coarser ones are needed to find the windows
+        purchase_strategy = PurchaseStrategyWithList(purchase_list)
+        previous_sacrifice_step = None
+        for sacrifice_step in Constants.sacrifice_steps:
+            if previous_sacrifice_step is None:
+                sacrifice_strategy = IncrementalSacrificeStrategy(sacrifice_step)
+            else:
+                sacrifice_strategy = WindowedSacrificeStrategy(
+                    sacrifice_step,
+                    sacrifice_centers=Results.get_sacrifice_list(self.get_last_iteration()),
+                    window=previous_sacrifice_step * Constants.sacrifice_refinement_window)
+            runner = Runner(platform=self.platform,
+                galaxies_bought=self.galaxies_bought,
+                dimboosts_bought=self.dimboosts_bought,
+                purchase_strategy=purchase_strategy,
+                sacrifice_strategy=sacrifice_strategy,
+                array_pool=self.array_pool
+                )
+            live_display.update_iteration(current=self.get_iteration_number(),
+                                          description=f"{description} (sacrifice step {sacrifice_step})")
+            if sacrifice_step == Constants.sacrifice_steps[-1]:
+                self.add_iteration(runner.run(ticks_limit=ticks_limit))
+            else:
+                self.add_iteration(runner.run())
+            previous_sacrifice_step = sacrifice_step
+    
+    def get_warm_start_incumbent(self, has_sacrifice: bool) -> Union[dict, None]:
+        # best trajectory of the config from cheaper saved runs (see warm_start.py), searches are aborted when they reach
+        # its ticks without a winner. Fixed strategies are cheap themselves and are not warm-started
+        if (not Constants.warm_start) or self.purchase_strategy.is_fixed_purchase_strategy:
+            return None
+        live_display.update_iteration(current=self.get_iteration_number(), description="Warm start from saved runs")
+        return warm_start_incumbent(self.purchase_strategy, self.platform, self.galaxies_bought, self.dimboosts_bought, has_sacrifice)
+    
+    def add_warm_start_winner(self, incumbent_dict: Union[dict, None]) -> None:
+        # the last search was aborted at the ticks of the incumbent, so it found nothing faster
+        if (incumbent_dict is not None) and self.iterative_optimization_info['iterations'][-1]['strategy_search_info']['aborted']:
+            self.add_iteration(incumbent_dict)
+            self.winner_iteration_index = len(self.iterative_optimization_info['iterations']) - 1
+    
+    def polish(self, description: str) -> None:
+        # local search around the current winner: neighbouring action orders are simulated together
+        # with BatchReplayRunner, the result is replayed to get a regular winner dict
+        winner_dict = self.iterative_optimization_info['iterations'][self.winner_iteration_index]
+        has_sacrifice = winner_dict['game_info']['has_sacrifice']
+        live_display.update_iteration(current=self.get_iteration_number(), description=description)
         
-        sacrifice_step = 0.001
-        last_actions_readable_list = self.get_last_actions_readable_list()
-        runner = Runner(platform=self.platform,
-            galaxies_bought=self.galaxies_bought,
-            dimboosts_bought=self.dimboosts_bought,
-            purchase_strategy=PurchaseStrategyFromActionList(last_actions_readable_list),
-            sacrifice_strategy=IncrementalSacrificeStrategy(sacrifice_step)
-            )
-        live_display.update_iteration(current=self.get_iteration_number(),
-                                      description="Initial run with incremental sacrifice")
-        self.add_iteration(runner.run())
+        start_time = time.perf_counter()
+        purchase_list = Results.get_purchase_list(winner_dict)
+        sacrifice_list = Results.get_sacrifice_list(winner_dict) if has_sacrifice else None
+        purchase_list, sacrifice_list, candidates_num = local_search(self.platform, self.galaxies_bought, self.dimboosts_bought,
+                                                                     purchase_list, sacrifice_list)
+        polished_dict = ReplayRunner(self.platform, self.galaxies_bought, self.dimboosts_bought,
+                                     purchase_list, sacrifice_list).run()
+        del polished_dict['antimatter_curve']
+        end_time = time.perf_counter()
+        polished_dict['strategy_search_info']['strategy_search_time'] = Helper.time_float_to_str(end_time - start_time)
+        polished_dict['strategy_search_info']['states_analyzed'] = candidates_num
+        
+        self.add_iteration(polished_dict)
+        if polished_dict['game_info']['ticks_passed'] < winner_dict['game_info']['ticks_passed']:
+            self.winner_iteration_index = len(self.iterative_optimization_info['iterations']) - 1
+    
+    @classmethod
+    def from_saved_run(cls, purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int,
+                       array_pool: Union[ArrayPool, None]=None) -> 'Iterator':
+        # Iterator after search_without_sacrifice, restored from its saved result: iterations are saved without
+        # action lists, so only the winner gets its actions back (from the actions of the result)
+        iterator = cls(purchase_strategy, platform, galaxies_bought, dimboosts_bought, array_pool)
+        filename = Helper.get_filename(purchase_strategy, platform, galaxies_bought, dimboosts_bought, False)
+        result = Results.load(filename)
+        if 'iterative_optimization_info' in result:
+            iterator.iterative_optimization_info = result['iterative_optimization_info']
+            iterations = iterator.iterative_optimization_info['iterations']
+            iterator.winner_iteration_index = next(index for index, iteration in enumerate(iterations)
+                                                   if (iteration['game_info'] == result['game_info']) and
+                                                   not iteration['strategy_search_info'].get('aborted', False))
+        else:
+            iterator.add_iteration({'game_info': result['game_info'], 'strategy_search_info': result['strategy_search_info']})
+        actions = result['actions']
+        winner_dict = iterator.iterative_optimization_info['iterations'][iterator.winner_iteration_index]
+        winner_dict['actions_readable_list'] = Helper.get_actions_readable_list(actions['item'], actions['amount'], actions['info'],
+                                                                                actions['tick'], result['game_info']['tick_duration'])
+        winner_dict['actions'] = actions
+        return iterator
+    
+    def search_without_sacrifice(self, initial_winner_dict: Union[dict, None]=None) -> None:
+        # initial_winner_dict is the result of the initial run without sacrifice if it was already done
+        # (e.g. by BatchedRunner together with other configs)
+        incumbent_dict = None
+        if initial_winner_dict is None:
+            incumbent_dict = self.get_warm_start_incumbent(has_sacrifice=False)
+            runner = Runner(platform=self.platform,
+                galaxies_bought=self.galaxies_bought,
+                dimboosts_bought=self.dimboosts_bought,
+                purchase_strategy=self.purchase_strategy,
+                sacrifice_strategy=NeverSacrificeStrategy(),
+                array_pool=self.array_pool
+                )
+            live_display.update_iteration(current=self.get_iteration_number(),
+                                          description="Initial run without sacrifice")
+            initial_winner_dict = runner.run(ticks_limit=None if incumbent_dict is None else incumbent_dict['game_info']['ticks_passed'])
+        self.add_iteration(initial_winner_dict)
+        self.add_warm_start_winner(incumbent_dict)
+        if not self.purchase_strategy.is_fixed_purchase_strategy:
+            self.polish(description="Local search without sacrifice")
+        self.save_iterative_optimization_info()
+    
+    def search_with_sacrifice(self) -> None:
+        # continues search_without_sacrifice (of this Iterator or restored by from_saved_run)
+        winner_dict = self.iterative_optimization_info['iterations'][self.winner_iteration_index]
+        incumbent_dict = self.get_warm_start_incumbent(has_sacrifice=True)
+        self.search_sacrifices(Results.get_purchase_list(winner_dict), description="Initial run with incremental sacrifice",
+                               ticks_limit=None if incumbent_dict is None else incumbent_dict['game_info']['ticks_passed'])
+        self.winner_iteration_index = len(self.iterative_optimization_info['iterations']) - 1
+        self.add_warm_start_winner(incumbent_dict)
         
         if not self.purchase_strategy.is_fixed_purchase_strategy:
             while True:
-                last_actions_readable_list = self.get_last_actions_readable_list()
+                winner_ticks_passed = self.iterative_optimization_info['iterations'][self.winner_iteration_index]['game_info']['ticks_passed']
+                
                 runner = Runner(platform=self.platform,
                     galaxies_bought=self.galaxies_bought,
                     dimboosts_bought=self.dimboosts_bought,
                     purchase_strategy=self.purchase_strategy,
-                    sacrifice_strategy=SacrificeStrategyFromActionList(last_actions_readable_list)
+                    sacrifice_strategy=SacrificeStrategyWithList(Results.get_sacrifice_list(self.get_last_iteration())),
+                    array_pool=self.array_pool
                     )
                 live_display.update_iteration(current=self.get_iteration_number(),
                                               description="Attempt to improve - fixed sacrifices")
-                self.add_iteration(runner.run())
+                self.add_iteration(runner.run(ticks_limit=winner_ticks_passed))
+                if self.get_last_iteration()['strategy_search_info']['aborted']:
+                    break
+                # the search with fixed purchases below is not sure to find these sacrifices again
+                if self.get_last_iteration()['game_info']['ticks_passed'] < winner_ticks_passed:
+                    self.winner_iteration_index = len(self.iterative_optimization_info['iterations']) - 1
+                    winner_ticks_passed = self.get_last_iteration()['game_info']['ticks_passed']
                 
-                last_actions_readable_list = self.get_last_actions_readable_list()
-                runner = Runner(platform=self.platform,
-                    galaxies_bought=self.galaxies_bought,
-                    dimboosts_bought=self.dimboosts_bought,
-                    purchase_strategy=PurchaseStrategyFromActionList(last_actions_readable_list),
-                    sacrifice_strategy=IncrementalSacrificeStrategy(sacrifice_step)
-                    )
-                live_display.update_iteration(current=self.get_iteration_number(),
-                                              description="Attempt to improve - fixed purchases")
-                self.add_iteration(runner.run())
+                self.search_sacrifices(Results.get_purchase_list(self.get_last_iteration()), description="Attempt to improve - fixed purchases",
+                                       ticks_limit=winner_ticks_passed)
                 
-                if self.iterative_optimization_info['iterations'][-1]['game_info']['ticks_passed'] >= self.iterative_optimization_info['iterations'][-3]['game_info']['ticks_passed']:
+                if self.get_last_iteration()['game_info']['ticks_passed'] >= winner_ticks_passed:
                     break
+                self.winner_iteration_index = len(self.iterative_optimization_info['iterations']) - 1
+            
+            self.polish(description="Local search with sacrifice")
         
         self.save_iterative_optimization_info()
+    
+    def search_and_save(self, initial_winner_dict: Union[dict, None]=None) -> None:
+        self.search_without_sacrifice(initial_winner_dict)
+        if self.dimboosts_bought >= 5:
+            self.search_with_sacrifice()
@@ -1,16 +1,26 @@
 import math
 
-from rich.live import Live
-from rich.console import Console, Group
-from rich.text import Text
-from rich.panel import Panel
-from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn
-
 
 class LiveDisplayManager:
+    # rich is imported and the console is built only when the display is started:
+    # runs without the display (benchmarks, worker processes) don't pay for them
     def __init__(self):
         self.live = None
         self._live_running = False
+        self.console = None
+        self.progress = None
+        
+        self.config_data = {}
+        self.iteration_data = {}
+        self.runner_data = {}
+        
+        self.progress_task_am_log = None
+        # (completed, total) of the progress bar, kept while the display is not started
+        self.am_log_values = None
+    
+    def _init_rich(self):
+        from rich.console import Console
+        from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn
         
         self.console = Console()
         # === flickering fix (partially working) ===
@@ -46,11 +56,6 @@ class LiveDisplayManager:
             self.console = Console()
         # === flickering fix end ===
         
-        
-        self.config_data = {}
-        self.iteration_data = {}
-        self.runner_data = {}
-        
         self.progress = Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
@@ -61,9 +66,15 @@ class LiveDisplayManager:
             TimeElapsedColumn(),
             expand=False
         )
-        self.progress_task_am_log = None
+        if self.am_log_values is not None:
+            completed, total = self.am_log_values
+            self.progress_task_am_log = self.progress.add_task("AM", total=total, completed=completed)
     
     def start(self):
+        from rich.live import Live
+        
+        if self.console is None:
+            self._init_rich()
         self._live_running = True
         self.live = Live(self._generate_display(), refresh_per_second=4)
         self.live.__enter__()
@@ -111,6 +122,9 @@ class LiveDisplayManager:
             current_am = 1.78e308
         current_am_log = int(math.log10(current_am))
         total_am_log = int(math.log10(total_am))
+        self.am_log_values = (current_am_log, total_am_log)
+        if self.progress is None:
+            return
         if self.progress_task_am_log is None:
             self.progress_task_am_log = self.progress.add_task(
                 "AM",
@@ -125,11 +139,15 @@ class LiveDisplayManager:
         if current_am == float('inf'):
             current_am = 1.78e308
         current_am_log = int(math.log10(current_am))
+        if self.am_log_values is not None:
+            self.am_log_values = (current_am_log, self.am_log_values[1])
         if self.progress_task_am_log is not None:
             self.progress.update(self.progress_task_am_log, completed=current_am_log)
         self._refresh()
     
     def complete_progress_bar(self):
+        if self.am_log_values is not None:
+            self.am_log_values = (self.am_log_values[1], self.am_log_values[1])
         if self.progress_task_am_log is not None:
             current = self.progress.tasks[self.progress_task_am_log].completed
             total = self.progress.tasks[self.progress_task_am_log].total
@@ -138,6 +156,10 @@ class LiveDisplayManager:
             self._refresh()
     
     def _generate_display(self):
+        from rich.console import Group
+        from rich.text import Text
+        from rich.panel import Panel
+        
         config_text = Text(overflow="ellipsis", no_wrap=True)
         config_text.append(f"Platform: {self.config_data.get('platform', 'N/A')}\n")
         config_text.append(f"Galaxies: {self.config_data.get('galaxies_bought', 'N/A')}\n")
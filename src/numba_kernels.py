@@ -0,0 +1,116 @@
+# kernels of NumbaBackend: importing numba takes a large part of the startup time,
+# so this module is imported only when NumbaBackend is created
+import numpy as np
+import numba
+
+
+@numba.njit(cache=True, inline='always')
+def dominates(amounts, bought_amounts, i, j):
+    for k in range(amounts.shape[1]):
+        if amounts[i, k] < amounts[j, k]:
+            return False
+    for k in range(bought_amounts.shape[1]):
+        if bought_amounts[i, k] < bought_amounts[j, k]:
+            return False
+    return True
+
+@numba.njit(cache=True, parallel=True, nogil=True)
+def find_dominated(amounts, bought_amounts, sorted_indices, num_objects, marked):
+    for j in numba.prange(1, num_objects):
+        for i in range(j):
+            if (not marked[sorted_indices[i]]) and dominates(amounts, bought_amounts, sorted_indices[i], sorted_indices[j]):
+                marked[sorted_indices[j]] = True
+                break
+
+@numba.njit(cache=True, parallel=True, nogil=True)
+def find_dominated_chunk(amounts, bought_amounts, sorted_indices, chunk_start, chunk_end,
+                         survivor_amounts, survivor_bought_amounts, survivors_num, tile_size, marked):
+    for position in numba.prange(chunk_start, chunk_end):
+        j = sorted_indices[position]
+        dominated = False
+        dominating = np.empty(tile_size, dtype=np.uint8)
+        for tile_start in range(0, survivors_num, tile_size):
+            tile_length = min(tile_size, survivors_num - tile_start)
+            for t in range(tile_length):
+                dominating[t] = 1
+            for k in range(survivor_amounts.shape[0]):
+                value = amounts[j, k]
+                column = survivor_amounts[k, tile_start:tile_start + tile_length]
+                for t in range(tile_length):
+                    dominating[t] &= column[t] >= value
+            for k in range(survivor_bought_amounts.shape[0]):
+                value = bought_amounts[j, k]
+                column = survivor_bought_amounts[k, tile_start:tile_start + tile_length]
+                for t in range(tile_length):
+                    dominating[t] &= column[t] >= value
+            any_dominating = 0
+            for t in range(tile_length):
+                any_dominating |= dominating[t]
+            if any_dominating:
+                dominated = True
+                break
+        if not dominated:
+            for earlier in range(chunk_start, position):
+                i = sorted_indices[earlier]
+                if (not marked[i]) and dominates(amounts, bought_amounts, i, j):
+                    dominated = True
+                    break
+        if dominated:
+            marked[j] = True
+
+@numba.njit(cache=True, nogil=True)
+def find_dominated_tiled(amounts, bought_amounts, sorted_indices, num_objects, chunk_size, tile_size, marked):
+    survivor_amounts = np.empty((amounts.shape[1], num_objects), dtype=amounts.dtype)
+    survivor_bought_amounts = np.empty((bought_amounts.shape[1], num_objects), dtype=bought_amounts.dtype)
+    survivors_num = 0
+    for chunk_start in range(0, num_objects, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, num_objects)
+        find_dominated_chunk(amounts, bought_amounts, sorted_indices, chunk_start, chunk_end,
+                             survivor_amounts, survivor_bought_amounts, survivors_num, tile_size, marked)
+        for position in range(chunk_start, chunk_end):
+            j = sorted_indices[position]
+            if not marked[j]:
+                survivor_amounts[:, survivors_num] = amounts[j]
+                survivor_bought_amounts[:, survivors_num] = bought_amounts[j]
+                survivors_num += 1
+
+@numba.njit(cache=True, parallel=True, nogil=True)
+def find_dominated_buckets(amounts, bought_amounts, sorted_indices, num_objects, ranks, bucket_of, bucket_lines,
+                           bucket_offsets, dominator_buckets, dominator_offsets, marked):
+    for position in numba.prange(1, num_objects):
+        j = sorted_indices[position]
+        bucket = bucket_of[j]
+        for k in range(dominator_offsets[bucket], dominator_offsets[bucket + 1]):
+            dominator_bucket = dominator_buckets[k]
+            for m in range(bucket_offsets[dominator_bucket], bucket_offsets[dominator_bucket + 1]):
+                i = bucket_lines[m]
+                if ranks[i] >= position:
+                    break
+                if (not marked[i]) and dominates(amounts, bought_amounts, i, j):
+                    marked[j] = True
+                    break
+            if marked[j]:
+                break
+
+@numba.njit(cache=True, parallel=True)
+def can_buy_all(amounts, costs, allowed_purchases, num_objects, marked):
+    for line in numba.prange(num_objects):
+        if costs[line, allowed_purchases[line, 0]] <= amounts[line, 0]:
+            marked[line] = True
+
+@numba.njit(cache=True, inline='always')
+def sacrifice_multiplier(sacrificed_amount):
+    if sacrificed_amount == 0:
+        return 1.0
+    return max(np.log10(sacrificed_amount) / 10, 1.0) ** 2
+
+@numba.njit(cache=True, parallel=True)
+def can_sacrifice_all(amounts, allowed_sacrifices, num_objects, max_dims, sacrifice_boosts):
+    for line in numba.prange(num_objects):
+        if amounts[line, 8] == 0:
+            continue
+        old_sacrificed_amount = amounts[line, max_dims + 1]
+        new_sacrificed_amount = old_sacrificed_amount + amounts[line, 1]
+        sacrifice_boost = sacrifice_multiplier(new_sacrificed_amount) / sacrifice_multiplier(old_sacrificed_amount)
+        if sacrifice_boost >= allowed_sacrifices[line, 0]:
+            sacrifice_boosts[line] = sacrifice_boost
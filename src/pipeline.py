@@ -0,0 +1,132 @@
+from typing import Union, Callable
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import json
+import os
+import time
+
+from utils import Helper
+
+
+class Pipeline:
+    """
+    Jobs with dependencies (a DAG): every job starts as soon as all jobs it depends on are done.
+    A job is a picklable function that returns the list of files it saved (or None).
+
+    Finished jobs are recorded in a JSON journal, so a pipeline that was interrupted (or had failed jobs)
+    runs only unfinished jobs when it is started again; the journal is removed when all jobs are done.
+    With max_workers > 1 jobs run in worker processes, local jobs always run in this process;
+    on_job_done(name, outputs) is called in this process for every finished job.
+    """
+    def __init__(self, journal_path: Path, max_workers: int=1,
+                 worker_initializer: Union[Callable, None]=None,
+                 on_job_done: Union[Callable, None]=None) -> None:
+        self.journal_path = Path(journal_path)
+        self.max_workers = max_workers
+        self.worker_initializer = worker_initializer
+        self.on_job_done = on_job_done
+        self.jobs = {}
+        self.journal = self.load_journal()
+        self.failed = set()
+
+    def add_job(self, name: str, function: Callable, args: tuple=(), dependencies: list=[], local: bool=False) -> None:
+        # dependencies must be added before the job, so jobs can't form a cycle
+        if name in self.jobs:
+            raise ValueError(f"Duplicate pipeline job: {name}")
+        for dependency in dependencies:
+            if dependency not in self.jobs:
+                raise ValueError(f"Pipeline job {name} depends on unknown job {dependency}")
+        self.jobs[name] = {
+            'function': function,
+            'args': tuple(args),
+            'dependencies': list(dependencies),
+            'local': local
+        }
+
+    def load_journal(self) -> dict:
+        if self.journal_path.exists():
+            return json.loads(self.journal_path.read_text(encoding='utf-8'))
+        return {}
+
+    def save_journal(self) -> None:
+        # written to a temporary file first, an interruption never leaves a broken journal
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.journal_path.with_suffix('.tmp')
+        temporary_path.write_text(json.dumps(self.journal, indent=4) + '\n', encoding='utf-8')
+        os.replace(temporary_path, self.journal_path)
+
+    def is_done(self, name: str) -> bool:
+        return self.journal.get(name, {}).get('status') == 'done'
+
+    def is_ready(self, name: str) -> bool:
+        return all(self.is_done(dependency) or (dependency in self.failed) for dependency in self.jobs[name]['dependencies'])
+
+    def finish_job(self, name: str, start_time: float, outputs: Union[list, None], error: Union[BaseException, None]) -> None:
+        entry = {'time': Helper.time_float_to_str(time.perf_counter() - start_time)}
+        if error is None:
+            entry['status'] = 'done'
+            entry['outputs'] = list(outputs or [])
+        else:
+            entry['status'] = 'failed'
+            entry['error'] = repr(error)
+            self.failed.add(name)
+        self.journal[name] = entry
+        self.save_journal()
+        if (error is None) and (self.on_job_done is not None):
+            self.on_job_done(name, entry['outputs'])
+
+    def run_local_job(self, name: str) -> None:
+        job = self.jobs[name]
+        start_time = time.perf_counter()
+        try:
+            outputs = job['function'](*job['args'])
+        except Exception as e:
+            self.finish_job(name, start_time, None, e)
+        else:
+            self.finish_job(name, start_time, outputs, None)
+
+    def run(self) -> None:
+        pending = [name for name in self.jobs if not self.is_done(name)]
+        running = {}
+        executor = None
+        if self.max_workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                           mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=self.worker_initializer)
+        try:
+            while pending or running:
+                ready = [name for name in pending if self.is_ready(name)]
+                for name in ready:
+                    if any(dependency in self.failed for dependency in self.jobs[name]['dependencies']):
+                        # jobs after a failed job are not started, they are retried with it in the next run
+                        self.failed.add(name)
+                        pending.remove(name)
+                ready = [name for name in ready if name not in self.failed]
+
+                local_ready = [name for name in ready if (executor is None) or self.jobs[name]['local']]
+                for name in ready:
+                    if (name in local_ready) or (len(running) >= self.max_workers):
+                        continue
+                    job = self.jobs[name]
+                    running[executor.submit(job['function'], *job['args'])] = (name, time.perf_counter())
+                    pending.remove(name)
+                if local_ready:
+                    pending.remove(local_ready[0])
+                    self.run_local_job(local_ready[0])
+                    continue
+                if not running:
+                    break
+
+                done_futures, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done_futures:
+                    name, start_time = running.pop(future)
+                    error = future.exception()
+                    self.finish_job(name, start_time, None if error else future.result(), error)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if self.failed:
+            raise RuntimeError(f"Pipeline jobs failed or were not started: {', '.join(sorted(self.failed))}")
+        self.journal_path.unlink(missing_ok=True)
@@ -2,6 +2,7 @@ from typing import Union, TYPE_CHECKING
 import numpy as np
 
 from utils import Constants, Helper
+from results import Results
 
 if TYPE_CHECKING:
     from ad_dimboost_optimizer import Runner
@@ -11,6 +12,9 @@ class PurchaseStrategy:
     """
     Base class for all purchase strategies.
     """
+    # vectorized strategies find next purchases of many states at once with next_purchases_all
+    is_vectorized_purchase_strategy = False
+    
     def __init__(self) -> None:
         self.is_fixed_purchase_strategy = False
     
@@ -36,6 +40,9 @@ class PurchaseStrategy:
         simple_list.extend([Constants.no_action_const] * (1 + runner.max_dims - len(simple_list)))
         return np.array(simple_list, dtype=runner.allowed_purchases.dtype)
     
+    def next_purchases_all(self, runner: 'Runner', lines: np.ndarray) -> np.ndarray:
+        return np.array([self.next_purchases(runner, line) for line in lines], dtype=runner.allowed_purchases.dtype)
+    
     def next_purchases_short_list(self, runner: 'Runner', line: int) -> list:
         raise NotImplementedError("PurchaseStrategy must implement next_purchases_short_list")
 
@@ -120,24 +127,17 @@ class PurchaseStrategyWithList(OptimizedPurchaseStrategy):
         self.purchase_list = purchase_list
     
     def next_purchases_short_list(self, runner: 'Runner', line: int) -> list:
-        valid_purchases_num = runner.bought_amounts[line].sum()
-        if valid_purchases_num < len(self.purchase_list):
-            return [self.purchase_list[valid_purchases_num]]
+        purchases_done = runner.purchases_done[line]
+        if purchases_done < len(self.purchase_list):
+            return [self.purchase_list[purchases_done]]
         return super().next_purchases_short_list(runner, line)
 
-class PurchaseStrategyFromActionList(PurchaseStrategyWithList):
-    """
-    Strategy that follows a predefined purchase list from a readable action list string.
-    """
-    def __init__(self, actions_readable_list: str):
-        super().__init__(Helper.parse_action_list_for_purchases(actions_readable_list))
-
-class PurchaseStrategyFromFile(PurchaseStrategyFromActionList):
+class PurchaseStrategyFromFile(PurchaseStrategyWithList):
     """
     Strategy that follows a predefined purchase list from a file with results of some previously calculated run.
     """
     def __init__(self, filename: str):
-        super().__init__(Helper.parse_file_for_action_list(filename))
+        super().__init__(Results.load_purchase_list(filename))
 
 
 class FixedPurchaseStrategy(PurchaseStrategy):
@@ -0,0 +1,380 @@
+from typing import Union, Callable
+import time
+import numpy as np
+
+from utils import ArraysTypes, Constants, Helper
+from runner import Runner
+from results import Results
+from purchase_strategies import PurchaseStrategyWithList
+from sacrifice_strategies import NeverSacrificeStrategy, SacrificeStrategyWithList
+
+
+# Closed-form ticking, shared by ReplayRunner (one line) and BatchReplayRunner (one line per trajectory).
+# One tick is x' = (I - R)^-1 x, where R[k-1][k] is production rate of dim k (lower tiers use amounts
+# already updated in this tick), so n ticks are x(n) = sum_j C(n+j-1, j) R^j x.
+
+def tick_coefficients(ticks: np.ndarray, max_dims: int) -> np.ndarray:
+    # C(ticks+j-1, j) for j = 0..max_dims, along a new last axis
+    coefficients = np.empty(ticks.shape + (max_dims + 1,), dtype=ticks.dtype)
+    coefficients[..., 0] = 1
+    for j in range(1, max_dims + 1):
+        coefficients[..., j] = coefficients[..., j - 1] * (ticks + j - 1) / j
+    return coefficients
+
+def ticked_amounts_basis(amounts: np.ndarray, multipliers: np.ndarray, max_dims: int, tick_duration: float) -> np.ndarray:
+    # basis[line][j] is R^j x of the line
+    rates = multipliers[:, 1:] * multipliers[:, :1] * tick_duration
+    basis = np.zeros((len(amounts), max_dims + 1, max_dims + 1), dtype=ArraysTypes.amounts)
+    basis[:, 0] = amounts[:, :max_dims + 1]
+    with np.errstate(over='ignore', invalid='ignore'):
+        for j in range(1, max_dims + 1):
+            basis[:, j, :-1] = basis[:, j - 1, 1:] * rates
+    return basis
+
+def ticked_amounts(basis: np.ndarray, ticks: np.ndarray) -> np.ndarray:
+    coefficients = tick_coefficients(ticks.astype(basis.dtype), basis.shape[1] - 1)
+    with np.errstate(over='ignore', invalid='ignore'):
+        result = coefficients[:, :1] * basis[:, 0]
+        for j in range(1, basis.shape[1]):
+            result += coefficients[:, j:j + 1] * basis[:, j]
+    return result
+
+def overflows(amounts: np.ndarray, multipliers: np.ndarray) -> np.ndarray:
+    # Runner.tick_all raises on overflow of any intermediate product of the tick
+    max_dims = multipliers.shape[1] - 1
+    with np.errstate(over='ignore', invalid='ignore'):
+        products = amounts[:, 1:max_dims + 1] * multipliers[:, 1:]
+        products_with_tickspeed = products * multipliers[:, :1]
+    return ~(np.isfinite(amounts[:, :max_dims + 1]).all(axis=1) &
+             np.isfinite(products).all(axis=1) &
+             np.isfinite(products_with_tickspeed).all(axis=1))
+
+def predict_sacrifice_boosts(sacrificed_amounts: np.ndarray, dim_1_amounts: np.ndarray) -> np.ndarray:
+    # same formula as NumpyBackend.can_sacrifice_all
+    new_sacrificed_amounts = sacrificed_amounts + dim_1_amounts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        old_sacrifice_multipliers = np.where(sacrificed_amounts == 0, 1.0,
+                                             np.maximum(np.log10(sacrificed_amounts) / 10, 1) ** 2)
+        new_sacrifice_multipliers = np.where(new_sacrificed_amounts == 0, 1.0,
+                                             np.maximum(np.log10(new_sacrificed_amounts) / 10, 1) ** 2)
+    return new_sacrifice_multipliers / old_sacrifice_multipliers
+
+def ticks_to_next_events(basis: np.ndarray, is_event: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> np.ndarray:
+    # smallest number of ticks after which is_event(lines, ticked amounts) holds: something can be bought,
+    # sacrificed or amounts overflow. All of these are monotone in the number of ticks, so exponential
+    # + binary search, for all lines at once. -1 if there is no event within replay_max_ticks_to_event
+    lines = np.arange(len(basis))
+    low = np.zeros(len(basis), dtype=np.int64)
+    high = np.ones(len(basis), dtype=np.int64)
+    searching = lines
+    while len(searching) > 0:
+        found = is_event(searching, ticked_amounts(basis[searching], high[searching]))
+        searching = searching[~found]
+        low[searching] = high[searching]
+        high[searching] *= 2
+        searching = searching[high[searching] <= Constants.replay_max_ticks_to_event]
+    never = (high > Constants.replay_max_ticks_to_event)
+    searching = lines[(high - low > 1) & ~never]
+    while len(searching) > 0:
+        middle = (low[searching] + high[searching]) // 2
+        found = is_event(searching, ticked_amounts(basis[searching], middle))
+        high[searching[found]] = middle[found]
+        low[searching[~found]] = middle[~found]
+        searching = searching[high[searching] - low[searching] > 1]
+    high[never] = -1
+    return high
+
+
+class ReplayRunner(Runner):
+    """
+    Simulates a single trajectory given by a purchase list (and optionally a sacrifice list).
+    Makes the same decisions as Runner with PurchaseStrategyWithList / SacrificeStrategyWithList,
+    but without population arrays: ticks between two actions are skipped in closed form.
+    After the purchase list is exhausted, the cheapest purchase allowed by OptimizedPurchaseStrategy is made.
+    """
+    initial_states_reserved = 1
+
+    def __init__(self, platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 purchase_list: list, sacrifice_list: Union[list, None]=None):
+        if sacrifice_list is None:
+            sacrifice_strategy = NeverSacrificeStrategy()
+        else:
+            sacrifice_strategy = SacrificeStrategyWithList(sacrifice_list)
+        super().__init__(platform, galaxies_bought, dimboosts_bought, PurchaseStrategyWithList(purchase_list), sacrifice_strategy,
+                         display=False)
+        self.has_sacrifices = (self.dimboosts_bought >= 5) and self.sacrifice_strategy.is_real_sacrifice_strategy
+        self.antimatter_curve = []
+
+    @classmethod
+    def from_result(cls, result: dict) -> 'ReplayRunner':
+        # result is a winner dict or a loaded result, its config is taken from game_info
+        game_info = result['game_info']
+        sacrifice_list = Results.get_sacrifice_list(result) if game_info['has_sacrifice'] else None
+        return cls(game_info['platform'], game_info['galaxies_bought'], game_info['dimboosts_bought'],
+                   Results.get_purchase_list(result), sacrifice_list)
+
+    def predict_sacrifice_boosts(self, amounts: np.ndarray) -> np.ndarray:
+        line = 0
+        sacrificed_amounts = np.full(len(amounts), self.amounts[line][self.max_dims + 1])
+        return predict_sacrifice_boosts(sacrificed_amounts, amounts[:, 1])
+
+    def can_sacrifice(self, amounts: np.ndarray) -> np.ndarray:
+        line = 0
+        if not self.has_sacrifices:
+            return np.zeros(len(amounts), dtype=bool)
+        return (amounts[:, 8] != 0) & (self.predict_sacrifice_boosts(amounts) >= float(self.allowed_sacrifices[line][0]))
+
+    def is_event(self, lines: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        line = 0
+        return (overflows(amounts, self.multipliers[lines]) |
+                (self.costs[line][self.allowed_purchases[line][0]] <= amounts[:, 0]) |
+                self.can_sacrifice(amounts))
+
+    def add_curve_point(self) -> None:
+        line = 0
+        self.antimatter_curve.append([round(self.ticks_passed * self.tick_duration * 1000), float(self.amounts[line][0])])
+
+    def run(self) -> dict:
+        start_time = time.perf_counter()
+        line = 0
+        winner_last_dim_bought = Helper.winner_last_dim_bought(self.galaxies_bought, self.dimboosts_bought)
+        self.add_curve_point()
+
+        while self.bought_amounts[line][-1] < winner_last_dim_bought:
+            basis = ticked_amounts_basis(self.amounts, self.multipliers, self.max_dims, self.tick_duration)
+            ticks = ticks_to_next_events(basis, self.is_event)
+            if ticks[line] < 0:
+                raise Exception("Nothing can be bought or sacrificed")
+            amounts = ticked_amounts(basis, ticks)
+            self.ticks_passed += int(ticks[line])
+            if overflows(amounts, self.multipliers)[line]:
+                amounts[~np.isfinite(amounts)] = np.inf
+                self.amounts[line][:self.max_dims + 1] = amounts[line]
+                self.add_curve_point()
+                break
+            self.amounts[line][:self.max_dims + 1] = amounts[line]
+
+            while self.costs[line][self.allowed_purchases[line][0]] <= self.amounts[line][0]:
+                self.buy(line, self.allowed_purchases[line][0])
+            if self.can_sacrifice(self.amounts)[line]:
+                self.sacrifice(line, self.predict_sacrifice_boosts(self.amounts)[line])
+            self.add_curve_point()
+
+        end_time = time.perf_counter()
+        self.num_states_alltime = 1
+        winner_dict = self.generate_winner_dict(line, 1, end_time - start_time)
+        winner_dict['antimatter_curve'] = self.antimatter_curve
+        return winner_dict
+
+
+class BatchReplayRunner():
+    """
+    Simulates many trajectories at once, one line of NumPy arrays per purchase list (and sacrifice list),
+    with the same decisions as ReplayRunner. Lines advance in lockstep by events rather than by ticks:
+    each step skips every line to its own next purchase / sacrifice in closed form.
+    Only ticks_passed is computed. A line stops buying when its purchase list is exhausted,
+    so the lists are meant to be complete trajectories (e.g. mutations of a winner).
+    """
+    def __init__(self, platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 purchase_lists: list, sacrifice_lists: Union[list, None]=None):
+        self.galaxies_bought = galaxies_bought
+        self.dimboosts_bought = dimboosts_bought
+        self.tick_duration = Constants.tick_duration[platform]
+        self.max_dims = Helper.max_dims(dimboosts_bought)
+        self.num_lines = len(purchase_lists)
+
+        # start state (after the first purchase of dim 1) and game rules are taken from a single replay
+        self.template = ReplayRunner(platform, galaxies_bought, dimboosts_bought, [1],
+                                     None if sacrifice_lists is None else [])
+        self.has_sacrifices = self.template.has_sacrifices
+        self.amounts = np.repeat(self.template.amounts, self.num_lines, axis=0)
+        self.bought_amounts = np.repeat(self.template.bought_amounts, self.num_lines, axis=0)
+        self.costs = np.repeat(self.template.costs, self.num_lines, axis=0)
+        self.multipliers = np.repeat(self.template.multipliers, self.num_lines, axis=0)
+        self.cost_multipliers = np.array([Constants.tickspeed_base_cost_multiplier] +
+                                         [Constants.dims_base_cost_multipliers[tier] for tier in range(1, self.max_dims + 1)],
+                                         dtype=ArraysTypes.costs)
+        self.ticks_passed = np.zeros(self.num_lines, dtype=np.int64)
+
+        max_purchases_num = max(len(purchase_list) for purchase_list in purchase_lists)
+        self.purchase_lists = np.full((self.num_lines, max_purchases_num + 1), Constants.no_action_const,
+                                      dtype=ArraysTypes.allowed_purchases)
+        for line, purchase_list in enumerate(purchase_lists):
+            self.purchase_lists[line][:len(purchase_list)] = purchase_list
+        self.purchases_done = np.ones(self.num_lines, dtype=np.int64) # the first purchase is made at start
+
+        if sacrifice_lists is None:
+            sacrifice_lists = [[] for _ in range(self.num_lines)]
+        max_sacrifices_num = max(len(sacrifice_list) for sacrifice_list in sacrifice_lists)
+        # calibrated thresholds as in SacrificeStrategyWithList: next * predicted_total / real_total
+        self.sacrifice_lists = np.full((self.num_lines, max_sacrifices_num + 1), Constants.sacrifice_infinity,
+                                       dtype=ArraysTypes.sacrifice_boosts)
+        self.predicted_total_sacrifice_boosts = np.ones((self.num_lines, max_sacrifices_num + 1),
+                                                        dtype=ArraysTypes.sacrifice_boosts)
+        self.sacrifice_lists_lengths = np.zeros(self.num_lines, dtype=np.int64)
+        for line, sacrifice_list in enumerate(sacrifice_lists):
+            self.sacrifice_lists[line][:len(sacrifice_list)] = sacrifice_list
+            self.sacrifice_lists_lengths[line] = len(sacrifice_list)
+            predicted_total_sacrifice_boost = 1
+            for sacrifice_num, sacrifice_boost in enumerate(sacrifice_list):
+                predicted_total_sacrifice_boost *= sacrifice_boost
+                self.predicted_total_sacrifice_boosts[line][sacrifice_num + 1] = predicted_total_sacrifice_boost
+        self.sacrifices_done = np.zeros(self.num_lines, dtype=np.int64)
+        self.real_total_sacrifice_boosts = np.ones(self.num_lines, dtype=ArraysTypes.sacrifice_boosts)
+
+    def next_purchase_costs(self, lines: np.ndarray) -> np.ndarray:
+        items = self.purchase_lists[lines, self.purchases_done[lines]]
+        costs = self.costs[lines, np.maximum(items, 0)]
+        costs[items == Constants.no_action_const] = np.inf
+        return costs
+
+    def allowed_sacrifices(self, lines: np.ndarray) -> np.ndarray:
+        sacrifices_done = self.sacrifices_done[lines]
+        allowed_sacrifices = (self.sacrifice_lists[lines, sacrifices_done] *
+                              self.predicted_total_sacrifice_boosts[lines, sacrifices_done] /
+                              self.real_total_sacrifice_boosts[lines])
+        allowed_sacrifices[sacrifices_done >= self.sacrifice_lists_lengths[lines]] = Constants.sacrifice_infinity
+        return allowed_sacrifices.astype(ArraysTypes.allowed_sacrifices).astype(ArraysTypes.sacrifice_boosts)
+
+    def predict_sacrifice_boosts(self, lines: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        return predict_sacrifice_boosts(self.amounts[lines, self.max_dims + 1], amounts[:, 1])
+
+    def can_sacrifice(self, lines: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        if not self.has_sacrifices:
+            return np.zeros(len(lines), dtype=bool)
+        return (amounts[:, 8] != 0) & (self.predict_sacrifice_boosts(lines, amounts) >= self.allowed_sacrifices(lines))
+
+    def is_event(self, lines: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        return (overflows(amounts, self.multipliers[lines]) |
+                (self.next_purchase_costs(lines) <= amounts[:, 0]) |
+                self.can_sacrifice(lines, amounts))
+
+    def buy(self, lines: np.ndarray) -> None:
+        # same as Runner.buy for the next item of each line
+        items = self.purchase_lists[lines, self.purchases_done[lines]]
+        self.amounts[lines, 0] -= self.costs[lines, items]
+        self.bought_amounts[lines, items] += 1
+        self.purchases_done[lines] += 1
+
+        tickspeed_lines = lines[items == 0]
+        self.costs[tickspeed_lines, 0] *= self.cost_multipliers[0]
+        self.multipliers[tickspeed_lines, 0] *= Constants.tickspeed_multiplier_multipliers[self.galaxies_bought]
+
+        dim_lines = lines[items != 0]
+        dim_items = items[items != 0]
+        self.amounts[dim_lines, dim_items] += 1
+        dim_bought_amounts = self.bought_amounts[dim_lines, dim_items]
+        ten_bought = (dim_bought_amounts % 10 == 0)
+        self.costs[dim_lines[ten_bought], dim_items[ten_bought]] *= self.cost_multipliers[dim_items[ten_bought]]
+        self.multipliers[dim_lines[ten_bought], dim_items[ten_bought]] *= Constants.buy_ten_multiplier
+        template_line = 0
+        for line, item_int in zip(dim_lines[dim_bought_amounts == 1], dim_items[dim_bought_amounts == 1]):
+            self.template.multipliers[template_line] = self.multipliers[line]
+            self.template.add_ach_for_new_dim(template_line, item_int)
+            self.multipliers[line] = self.template.multipliers[template_line]
+
+    def sacrifice(self, lines: np.ndarray) -> None:
+        # same as Runner.sacrifice
+        sacrifice_boosts = self.predict_sacrifice_boosts(lines, self.amounts[lines])
+        self.amounts[lines, self.max_dims + 1] += self.amounts[lines, 1]
+        self.multipliers[lines, 8] *= sacrifice_boosts
+        self.amounts[lines, 1:self.max_dims] = 0
+        self.real_total_sacrifice_boosts[lines] *= sacrifice_boosts
+        self.sacrifices_done[lines] += 1
+
+    def run(self) -> np.ndarray:
+        # returns ticks_passed of each line, -1 for lines that never win
+        winner_last_dim_bought = Helper.winner_last_dim_bought(self.galaxies_bought, self.dimboosts_bought)
+        results = np.full(self.num_lines, -1, dtype=np.int64)
+        active = np.arange(self.num_lines)
+        while len(active) > 0:
+            basis = ticked_amounts_basis(self.amounts[active], self.multipliers[active], self.max_dims, self.tick_duration)
+            ticks = ticks_to_next_events(basis, lambda lines, amounts: self.is_event(active[lines], amounts))
+            moving = (ticks >= 0)
+            active = active[moving]
+            amounts = ticked_amounts(basis[moving], ticks[moving])
+            self.ticks_passed[active] += ticks[moving]
+
+            overflowed = overflows(amounts, self.multipliers[active])
+            results[active[overflowed]] = self.ticks_passed[active[overflowed]]
+            active = active[~overflowed]
+            self.amounts[active, :self.max_dims + 1] = amounts[~overflowed]
+
+            buying = active[self.next_purchase_costs(active) <= self.amounts[active, 0]]
+            while len(buying) > 0:
+                self.buy(buying)
+                buying = buying[self.next_purchase_costs(buying) <= self.amounts[buying, 0]]
+            if self.has_sacrifices:
+                self.sacrifice(active[self.can_sacrifice(active, self.amounts[active])])
+
+            won = (self.bought_amounts[active, -1] >= winner_last_dim_bought)
+            results[active[won]] = self.ticks_passed[active[won]]
+            active = active[~won]
+        return results
+
+
+def mutations(purchase_list: list, sacrifice_list: Union[list, None]=None) -> list:
+    """
+    Neighbours of a trajectory: swaps of adjacent different purchases, tickspeed purchases moved
+    by a few positions and shifted sacrifice boosts. Returns list of (purchase_list, sacrifice_list).
+    The first purchase (dim 1 at start) never moves.
+    """
+    result = []
+    for pos in range(1, len(purchase_list) - 1):
+        if purchase_list[pos] != purchase_list[pos + 1]:
+            new_purchase_list = purchase_list.copy()
+            new_purchase_list[pos], new_purchase_list[pos + 1] = new_purchase_list[pos + 1], new_purchase_list[pos]
+            result.append((new_purchase_list, sacrifice_list))
+    for pos in range(1, len(purchase_list)):
+        if purchase_list[pos] != 0:
+            continue
+        for shift in Constants.local_search_tickspeed_shifts:
+            for new_pos in [pos - shift, pos + shift]:
+                if (new_pos < 1) or (new_pos >= len(purchase_list)):
+                    continue
+                new_purchase_list = purchase_list.copy()
+                new_purchase_list.insert(new_pos, new_purchase_list.pop(pos))
+                result.append((new_purchase_list, sacrifice_list))
+    if sacrifice_list is not None:
+        for sacrifice_num in range(len(sacrifice_list)):
+            for shift in Constants.local_search_sacrifice_shifts:
+                for new_sacrifice_boost in [sacrifice_list[sacrifice_num] - shift, sacrifice_list[sacrifice_num] + shift]:
+                    if new_sacrifice_boost <= 1:
+                        continue
+                    new_sacrifice_list = sacrifice_list.copy()
+                    new_sacrifice_list[sacrifice_num] = round(new_sacrifice_boost, 6)
+                    result.append((purchase_list, new_sacrifice_list))
+
+    unique_result = []
+    seen = {(tuple(purchase_list), None if sacrifice_list is None else tuple(sacrifice_list))}
+    for new_purchase_list, new_sacrifice_list in result:
+        key = (tuple(new_purchase_list), None if new_sacrifice_list is None else tuple(new_sacrifice_list))
+        if key not in seen:
+            seen.add(key)
+            unique_result.append((new_purchase_list, new_sacrifice_list))
+    return unique_result
+
+
+def local_search(platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 purchase_list: list, sacrifice_list: Union[list, None]=None) -> tuple:
+    """
+    Hill climbing over mutations() evaluated with BatchReplayRunner: each round moves to the best
+    neighbour if it is faster. Returns (purchase_list, sacrifice_list, number of evaluated trajectories).
+    """
+    candidates_num = 0
+    for _ in range(Constants.local_search_max_rounds):
+        candidates = [(purchase_list, sacrifice_list)] + mutations(purchase_list, sacrifice_list)
+        ticks_passed = np.empty(len(candidates), dtype=np.int64)
+        for start in range(0, len(candidates), Constants.local_search_batch_size):
+            batch = candidates[start : start + Constants.local_search_batch_size]
+            batch_runner = BatchReplayRunner(platform, galaxies_bought, dimboosts_bought,
+                                             [candidate[0] for candidate in batch],
+                                             None if sacrifice_list is None else [candidate[1] for candidate in batch])
+            ticks_passed[start : start + len(batch)] = batch_runner.run()
+        candidates_num += len(candidates)
+        ticks_passed[ticks_passed < 0] = np.iinfo(ticks_passed.dtype).max
+        best = int(np.argmin(ticks_passed))
+        if ticks_passed[best] >= ticks_passed[0]:
+            break
+        purchase_list, sacrifice_list = candidates[best]
+    return purchase_list, sacrifice_list, candidates_num
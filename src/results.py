@@ -0,0 +1,206 @@
+from typing import Union
+from pathlib import Path
+import re
+import json
+import atexit
+import numpy as np
+
+from utils import ArraysTypes, Constants, Helper
+
+
+class Results:
+    """
+    Structured storage of winner dicts.
+
+    Every result is an .npz file with columnar actions (item, amount, info, tick) and a JSON header
+    with game_info and strategy_search_info (or iterative_optimization_info). The .txt file next to it
+    is generated from the same data for humans and the viewer and is never read back.
+    Saved_Runs/manifest.json indexes game_info of all results by their path, so summaries
+    don't need to open result files at all. Saved results update the manifest in memory, it is written
+    by flush_manifest (after every job of the update pipeline and at exit).
+    """
+    actions_columns = {
+        'item': ArraysTypes.actions_item_lists,
+        'amount': ArraysTypes.actions_amount_lists,
+        'info': ArraysTypes.actions_info_lists, # cost of one item or sacrifice boost
+        'tick': ArraysTypes.actions_tick_lists
+    }
+    _manifest = None
+    _manifest_changed = False
+    # worker processes of the update pipeline leave the manifest to the main process
+    manifest_updates = True
+
+    @classmethod
+    def get_data_filename(cls, filename: str) -> Path:
+        return Path(filename).with_suffix('.npz')
+
+    @classmethod
+    def get_manifest_path(cls) -> Path:
+        return Helper.get_saved_runs_path() / 'manifest.json'
+
+    @classmethod
+    def get_manifest_key(cls, filename: str) -> Union[str, None]:
+        # e.g. 'Optimized/pc/galaxy0/pc_galaxy0_dimboost5_sac'
+        try:
+            relative_path = Path(filename).resolve().relative_to(Helper.get_saved_runs_path().resolve())
+        except ValueError:
+            return None
+        return relative_path.with_suffix('').as_posix()
+
+    @classmethod
+    def load_manifest(cls) -> dict:
+        if cls._manifest is None:
+            manifest_path = cls.get_manifest_path()
+            if manifest_path.exists():
+                cls._manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            else:
+                cls._manifest = {}
+        return cls._manifest
+
+    @classmethod
+    def save_manifest(cls) -> None:
+        manifest = cls.load_manifest()
+        manifest = {key: manifest[key] for key in sorted(manifest)}
+        cls.get_manifest_path().write_text(json.dumps(manifest, indent=4) + '\n', encoding='utf-8')
+        cls._manifest_changed = False
+
+    @classmethod
+    def flush_manifest(cls) -> None:
+        if cls._manifest_changed:
+            cls.save_manifest()
+
+    @classmethod
+    def update_manifest(cls, filename: str, result: dict) -> None:
+        manifest_key = cls.get_manifest_key(filename)
+        if manifest_key is None:
+            return
+        cls.load_manifest()[manifest_key] = {
+            'game_info': result['game_info'],
+            'actions_num': len(result['actions']['item'])
+        }
+        cls._manifest_changed = True
+
+    @classmethod
+    def get_game_info(cls, filename: str) -> dict:
+        return cls.load_manifest()[cls.get_manifest_key(filename)]['game_info']
+
+    @classmethod
+    def get_header(cls, result: dict) -> dict:
+        return {key: value for key, value in result.items() if key != 'actions'}
+
+    @classmethod
+    def get_purchase_list(cls, result: dict) -> list:
+        actions = result['actions']
+        is_purchase = (actions['item'] != Constants.sacrifice_action_const)
+        return np.repeat(actions['item'][is_purchase], actions['amount'][is_purchase]).tolist()
+
+    @classmethod
+    def get_sacrifice_list(cls, result: dict) -> list:
+        actions = result['actions']
+        return actions['info'][actions['item'] == Constants.sacrifice_action_const].tolist()
+
+    @classmethod
+    def generate_result(cls, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None) -> dict:
+        result = {'game_info': winner_dict['game_info']}
+        if iterative_optimization_info is None:
+            result['strategy_search_info'] = winner_dict['strategy_search_info']
+        else:
+            result['iterative_optimization_info'] = iterative_optimization_info
+        result['actions'] = winner_dict['actions']
+        return result
+
+    @classmethod
+    def generate_winner_str(cls, result: dict) -> str:
+        return Helper.generate_winner_str(result, result.get('iterative_optimization_info'))
+
+    @classmethod
+    def save(cls, result: dict, filename: str) -> None:
+        data_filename = cls.get_data_filename(filename)
+        data_filename.parent.mkdir(parents=True, exist_ok=True)
+        header = json.dumps(cls.get_header(result)).encode('utf-8')
+        arrays = {name: np.asarray(result['actions'][name], dtype=dtype) for name, dtype in cls.actions_columns.items()}
+        with open(data_filename, 'wb') as file:
+            if Constants.results_compressed:
+                np.savez_compressed(file, header=np.frombuffer(header, dtype=np.uint8), **arrays)
+            else:
+                np.savez(file, header=np.frombuffer(header, dtype=np.uint8), **arrays)
+        Helper.save_winner_dict(result, result.get('iterative_optimization_info'), filename)
+        if cls.manifest_updates:
+            cls.update_manifest(filename, result)
+
+    @classmethod
+    def save_winner_dict(cls, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None, filename: str='') -> None:
+        if not filename:
+            Helper.save_winner_dict(winner_dict, iterative_optimization_info)
+            return
+        cls.save(cls.generate_result(winner_dict, iterative_optimization_info), filename)
+
+    @classmethod
+    def load(cls, filename: str) -> dict:
+        data_filename = cls.get_data_filename(filename)
+        if not data_filename.exists():
+            return cls.parse_text_file(filename)
+        with np.load(data_filename, allow_pickle=False) as data:
+            result = json.loads(data['header'].tobytes().decode('utf-8'))
+            result['actions'] = {name: data[name] for name in cls.actions_columns}
+        return result
+
+    @classmethod
+    def load_purchase_list(cls, filename: str) -> list:
+        return cls.get_purchase_list(cls.load(filename))
+
+    @classmethod
+    def load_sacrifice_list(cls, filename: str) -> list:
+        return cls.get_sacrifice_list(cls.load(filename))
+
+    @classmethod
+    def parse_text_file(cls, filename: str) -> dict:
+        # for results saved before the structured format; inverse of Helper.generate_winner_str
+        content = Path(filename).read_text(encoding='utf-8')
+        result = {}
+        for section_name, key in [('GAME INFO', 'game_info'),
+                                  ('STRATEGY SEARCH INFO', 'strategy_search_info'),
+                                  ('ITERATIVE OPTIMIZATION INFO', 'iterative_optimization_info')]:
+            section_match = re.search(rf'=== {section_name} ===\n(.*?)\n=== END {section_name} ===', content, re.DOTALL)
+            if section_match:
+                result[key] = json.loads(section_match.group(1))
+
+        tick_duration = result['game_info']['tick_duration']
+        actions = {name: [] for name in cls.actions_columns}
+        actions_match = re.search(r'=== ACTIONS ===\n(.*?)\n=== END ACTIONS ===', content, re.DOTALL)
+        for line in (actions_match.group(1) if actions_match else '').split('\n'):
+            time_match = re.search(r'time:\s*([\d:.]+)', line)
+            if time_match is None:
+                continue
+            tick = round(Helper.time_str_to_float(time_match.group(1)) / tick_duration)
+            sacrifice_match = re.search(r'sacrifice:\s*([\d.]+)', line)
+            if sacrifice_match:
+                item_int = Constants.sacrifice_action_const
+                amount = 1
+                info = float(sacrifice_match.group(1))
+            else:
+                dim_match = re.search(r'dimension\s+(\d+)', line)
+                item_int = int(dim_match.group(1)) if dim_match else 0
+                amount = int(re.search(r'amount:\s*(\d+)', line).group(1))
+                info = float(re.search(r'cost_one:\s*([\de+\-.]+)', line).group(1))
+            actions['item'].append(item_int)
+            actions['amount'].append(amount)
+            actions['info'].append(info)
+            actions['tick'].append(tick)
+        result['actions'] = {name: np.array(actions[name], dtype=dtype) for name, dtype in cls.actions_columns.items()}
+        return result
+
+    @classmethod
+    def convert_text_files(cls) -> None:
+        # one-time migration: .npz and manifest entries for all .txt results
+        for filename in sorted(Helper.get_saved_runs_path().glob('*/*/galaxy*/*.txt')):
+            result = cls.parse_text_file(str(filename))
+            cls.save(result, str(filename))
+        cls.flush_manifest()
+
+
+atexit.register(Results.flush_manifest)
+
+
+if __name__ == '__main__':
+    Results.convert_text_files()
@@ -0,0 +1,166 @@
+from typing import TYPE_CHECKING
+import numpy as np
+
+from utils import ArraysTypes, Constants
+from purchase_strategies import PurchaseStrategy
+
+if TYPE_CHECKING:
+    from runner import Runner
+
+
+optimized_purchase_rules = [
+    ('pick', 'first', '(item == 1) & (bought == 0)'),
+    ('pick', 'first', 'cost * always_buy_multiplier <= antimatter'),
+    ('pick', 'first', '(item >= 1) & (bought > 10) & (bought % 10 != 0)'),
+    ('let', 'min_cost_stack', 'min(cost_stack, item < last_tier)'),
+    ('let', 'last_cost_stack', 'min(cost * 10, item == last_tier)'),
+    ('pick', 'first', '(item == last_tier) & (last_cost_stack < min_cost_stack * last_tier_low_multiplier)'),
+    ('pick', 'by_cost', '((item < last_tier) & (cost_stack <= min_cost_stack * accuracy_multiplier)) | '
+                        '((item == last_tier) & (last_cost_stack < min_cost_stack * last_tier_high_multiplier))'),
+]
+
+# rules 1-5 of FixedPurchaseStrategy, the last one (priority) is added by each fixed strategy
+fixed_purchase_rules = [
+    ('pick', 'first', '(item == 1) & (bought == 0)'),
+    ('pick', 'first', '(item >= 1) & (bought % 10 != 0)'),
+    ('let', 'considered', 'item <= last_tier'),
+    ('let', 'min_cost_stack', 'min(cost_stack, considered)'),
+    ('let', 'candidates', 'considered & (cost_stack <= min_cost_stack * accuracy_multiplier)'),
+    ('let', 'last_candidate', 'max(item, candidates)'),
+    ('pick', 'first', '(item == last_candidate) & (bought == 0)'),
+    ('pick', 'first', '(item == last_candidate) & (item == max_dims) & (bought + 10 >= winner_last_dim_bought)'),
+]
+
+purchase_rules = {
+    'OptimizedPurchaseStrategy': optimized_purchase_rules,
+    'FixedT12345678PurchaseStrategy': fixed_purchase_rules + [
+        ('pick', 'first', 'candidates'),
+    ],
+    'Fixed12T345678PurchaseStrategy': fixed_purchase_rules + [
+        ('pick', 'first', 'candidates & (item == 1)'),
+        ('pick', 'first', 'candidates & (item == 2)'),
+        ('pick', 'first', 'candidates'),
+    ],
+    'FixedT87654321PurchaseStrategy': fixed_purchase_rules + [
+        ('pick', 'first', 'candidates & (item == 0)'),
+        ('pick', 'last', 'candidates'),
+    ],
+    'Fixed87654321TPurchaseStrategy': fixed_purchase_rules + [
+        ('pick', 'last', 'candidates'),
+    ],
+    'Fixed12345678TPurchaseStrategy': fixed_purchase_rules + [
+        ('pick', 'first', 'candidates & (item >= 1)'),
+        ('pick', 'first', 'candidates'),
+    ],
+}
+
+
+class PurchaseRuleTable:
+    """
+    Purchase strategy as an ordered table of steps evaluated for many states at once.
+    ('let', name, expression) defines a value for the next steps.
+    ('pick', mode, expression) decides for states that are not decided yet and have items where expression is True:
+    the first or the last of these items, or all of them sorted by cost ('by_cost').
+    Expressions are NumPy expressions over per-item values (item, cost, cost_stack, bought, amount) and per-state
+    values (antimatter, last_tier, winner_last_dim_bought), min(values, mask) and max(values, mask) reduce over items.
+    """
+    pick_modes = ('first', 'last', 'by_cost')
+
+    def __init__(self, steps: list) -> None:
+        self.steps = []
+        for kind, name, expression in steps:
+            if (kind not in ('let', 'pick')) or ((kind == 'pick') and (name not in self.pick_modes)):
+                raise ValueError(f"Unknown purchase rule step: {kind} {name}")
+            self.steps.append((kind, name, compile(expression, f"<purchase rule: {expression}>", 'eval')))
+
+    @classmethod
+    def masked_min(cls, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.where(mask, values, np.inf).min(axis=1, keepdims=True)
+
+    @classmethod
+    def masked_max(cls, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.where(mask, values, -1).max(axis=1, keepdims=True)
+
+    @classmethod
+    def namespace(cls, runner: 'Runner', lines: np.ndarray) -> dict:
+        max_dims = runner.max_dims
+        item = np.arange(max_dims + 1)[np.newaxis, :]
+        cost = runner.costs[lines]
+        bought = runner.bought_amounts[lines]
+        amount = runner.amounts[lines, :max_dims + 1].copy()
+        amount[:, 0] = 0
+        # last_tier is the highest bought dimension, or the next one if it is bought at least 10 times
+        last_tier = np.where((item >= 1) & (bought > 0), item, 0).max(axis=1, keepdims=True)
+        last_bought = np.take_along_axis(bought, last_tier, axis=1)
+        last_tier = last_tier + ((last_bought >= 10) & (last_tier < max_dims))
+        return {
+            'min': cls.masked_min,
+            'max': cls.masked_max,
+            'item': item,
+            'cost': cost,
+            'cost_stack': np.where(item == 0, cost, cost * 10),
+            'bought': bought,
+            'amount': amount,
+            'antimatter': runner.amounts[lines, 0:1],
+            'last_tier': last_tier,
+            'max_dims': max_dims,
+            'winner_last_dim_bought': runner.lines_winner_last_dim_bought(lines),
+            'accuracy_multiplier': Constants.purchase_strategy_accuracy_multiplier,
+            'last_tier_low_multiplier': Constants.purchase_strategy_last_tier_low_multiplier,
+            'last_tier_high_multiplier': Constants.purchase_strategy_last_tier_high_multiplier,
+            'always_buy_multiplier': Constants.purchase_strategy_always_buy_multiplier
+        }
+
+    def next_purchases(self, runner: 'Runner', lines: np.ndarray) -> np.ndarray:
+        namespace = self.namespace(runner, lines)
+        items_num = runner.max_dims + 1
+        result = np.full((len(lines), items_num), Constants.no_action_const, dtype=ArraysTypes.allowed_purchases)
+        undecided = np.ones(len(lines), dtype=bool)
+        for kind, name, code in self.steps:
+            if not undecided.any():
+                break
+            value = eval(code, {'__builtins__': {}}, namespace)
+            if kind == 'let':
+                namespace[name] = value
+                continue
+            mask = np.broadcast_to(value, (len(lines), items_num)) & undecided[:, np.newaxis]
+            decided = np.flatnonzero(mask.any(axis=1))
+            if name == 'first':
+                result[decided, 0] = np.argmax(mask[decided], axis=1)
+            elif name == 'last':
+                result[decided, 0] = items_num - 1 - np.argmax(mask[decided, ::-1], axis=1)
+            else:
+                costs = np.where(mask[decided], namespace['cost'][decided], np.inf)
+                items = np.argsort(costs, axis=1, kind='stable')
+                counts = np.count_nonzero(mask[decided], axis=1)
+                result[decided] = np.where(np.arange(items_num) < counts[:, np.newaxis], items, Constants.no_action_const)
+            undecided[decided] = False
+        if undecided.any():
+            raise ValueError("Purchase rules give no purchase for some states")
+        return result
+
+
+class RulePurchaseStrategy(PurchaseStrategy):
+    """
+    Purchase strategy given by a PurchaseRuleTable, next purchases of all states that bought something in a round
+    of buy_all are found at once. Description and saved runs are the ones of the strategy it is based on.
+    """
+    is_vectorized_purchase_strategy = True
+
+    def __init__(self, steps: list, based_on: PurchaseStrategy) -> None:
+        self.rule_table = PurchaseRuleTable(steps)
+        self.based_on = based_on
+        self.is_fixed_purchase_strategy = based_on.is_fixed_purchase_strategy
+
+    @classmethod
+    def from_strategy(cls, purchase_strategy: PurchaseStrategy) -> 'RulePurchaseStrategy':
+        return cls(purchase_rules[type(purchase_strategy).__name__], based_on=purchase_strategy)
+
+    def get_description_lines(self) -> list:
+        return self.based_on.get_description_lines()
+
+    def next_purchases(self, runner: 'Runner', line: int) -> np.ndarray:
+        return self.rule_table.next_purchases(runner, np.array([line]))[0]
+
+    def next_purchases_all(self, runner: 'Runner', lines: np.ndarray) -> np.ndarray:
+        return self.rule_table.next_purchases(runner, lines)
@@ -1,53 +1,36 @@
 from typing import Union, TYPE_CHECKING
-import ctypes
+from pathlib import Path
 import time
+import math
 import os
-import psutil
 import numpy as np
 
 from utils import ArraysTypes, Constants, Helper
 from live import live_display
+from backends import default_backend
+from results import Results
+from telemetry import Telemetry
 
 if TYPE_CHECKING:
     from purchase_strategies import PurchaseStrategy
     from sacrifice_strategies import SacrificeStrategy
-
-
-cpp_lib = ctypes.CDLL('./cpp_lib.dll')
-cpp_lib.find_dominated.argtypes = [
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.bought_amounts, flags='C_CONTIGUOUS'), # bought_amounts
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.sorted_indices, flags='C_CONTIGUOUS'), # sorted_indices
-    ctypes.c_int, # num_objects
-    ctypes.c_int, # max_dims
-    np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # dominated_bools
-]
-
-cpp_lib.can_buy_all.argtypes = [
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.costs, flags='C_CONTIGUOUS'), # costs
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.allowed_purchases, flags='C_CONTIGUOUS'), # allowed_purchases
-    ctypes.c_int, # num_objects
-    ctypes.c_int, # max_dims
-    np.ctypeslib.ndpointer(dtype=bool, flags='C_CONTIGUOUS') # can_buy_bools
-]
-cpp_lib.can_buy_all.restype = ctypes.c_bool
-
-cpp_lib.can_sacrifice_all.argtypes = [
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.amounts, flags='C_CONTIGUOUS'), # amounts
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.allowed_sacrifices, flags='C_CONTIGUOUS'), # allowed_sacrifices
-    ctypes.c_int, # num_objects
-    ctypes.c_int, # max_dims
-    ctypes.c_int, # sacrifices_length
-    np.ctypeslib.ndpointer(dtype=ArraysTypes.sacrifice_boosts, flags='C_CONTIGUOUS') # sacrifice_boosts
-]
-cpp_lib.can_buy_all.restype = ctypes.c_bool
+    from backends import KernelBackend
+    from array_pool import ArrayPool
 
 
 class Runner():
+    arrays_types = ArraysTypes
+    initial_states_reserved = Constants.numpy_reserve_step
+
     def __init__(self, platform: str, galaxies_bought: int, dimboosts_bought: int,
                  purchase_strategy: 'PurchaseStrategy',
-                 sacrifice_strategy: 'SacrificeStrategy'):
+                 sacrifice_strategy: 'SacrificeStrategy',
+                 backend: Union['KernelBackend', None]=None,
+                 dominance_epsilon: float=0.0,
+                 pipelined_clear: bool=False,
+                 telemetry_path: Union[str, Path, None]=None,
+                 array_pool: Union['ArrayPool', None]=None,
+                 display: bool=True):
         self.ticks_passed = 0
         self.addition_cycles_without_clear = 0
         self.states_num_after_clear = 0
@@ -57,6 +40,20 @@ class Runner():
         self.dimboosts_bought = dimboosts_bought
         self.purchase_strategy = purchase_strategy
         self.sacrifice_strategy = sacrifice_strategy
+        if backend is None:
+            backend = default_backend()
+        self.backend = backend
+        # with dominance_epsilon > 0 a state is also dropped when an earlier state has at least
+        # (1 - dominance_epsilon) of each its amount: smaller populations, possibly a few ticks slower winner
+        self.dominance_epsilon = dominance_epsilon
+        # with pipelined_clear dominance is found in a worker thread (kernels release the GIL)
+        self.clear_executor = None
+        if pipelined_clear:
+            from concurrent.futures import ThreadPoolExecutor
+            self.clear_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_clear = None
+        self.addition_cycles_without_clear_limit = Constants.addition_cycles_without_clear_limit
+        self.state_growth_without_clear_limit = Constants.state_growth_without_clear_limit
         
         self.tick_duration = Constants.tick_duration[platform]
         self.sacrifices_length = sacrifice_strategy.sacrifices_length
@@ -65,27 +62,12 @@ class Runner():
         self.num_states_reserved = 0
         self.num_states_alltime = 0
         self.num_states_current = 0
+        # statistics of every clear are written to telemetry_path, nothing is recorded without it
+        self.telemetry = None if telemetry_path is None else Telemetry(telemetry_path, self)
+        # with array_pool state arrays are taken from it and given back to it when run returns
+        self.array_pool = array_pool
 
-        self.actions_item_lists = np.empty((Constants.numpy_reserve_step, Constants.numpy_actions_reserve_step), dtype=ArraysTypes.actions_item_lists)
-        self.actions_amount_lists = np.empty((Constants.numpy_reserve_step, Constants.numpy_actions_reserve_step), dtype=ArraysTypes.actions_amount_lists)
-        self.actions_info_lists = np.empty((Constants.numpy_reserve_step, Constants.numpy_actions_reserve_step), dtype=ArraysTypes.actions_info_lists)
-        self.actions_tick_lists = np.empty((Constants.numpy_reserve_step, Constants.numpy_actions_reserve_step), dtype=ArraysTypes.actions_tick_lists)
-        self.allowed_purchases = np.empty((Constants.numpy_reserve_step, 1 + self.max_dims), dtype=ArraysTypes.allowed_purchases)
-        self.allowed_sacrifices = np.empty((Constants.numpy_reserve_step, self.sacrifices_length), dtype=ArraysTypes.allowed_sacrifices)
-        self.amounts = np.empty((Constants.numpy_reserve_step, 2 + self.max_dims), dtype=ArraysTypes.amounts)
-            # amounts[0] is antimatter
-            # amounts[1, ..., max_dims] are dims amounts
-            # amounts[max_dims+1] is amount of dim 1 sacrificed
-        self.bought_amounts = np.empty((Constants.numpy_reserve_step, 1 + self.max_dims), dtype=ArraysTypes.bought_amounts)
-            # bought_amounts[0] is bought tickspeed
-            # bought_amounts[1-8] are bought dims
-        self.costs = np.empty((Constants.numpy_reserve_step, 1 + self.max_dims), dtype=ArraysTypes.costs)
-            # costs[0] is tickspeed cost
-            # costs[1-8] are dims costs
-        self.multipliers = np.empty((Constants.numpy_reserve_step, 1 + self.max_dims), dtype=ArraysTypes.multipliers)
-            # multipliers[0] is tickspeed multiplier
-            # multipliers[1-8] are dims multipliers
-        self.num_states_reserved = Constants.numpy_reserve_step
+        self.allocate_arrays(self.initial_states_reserved)
 
         self.add_start_state()
         line = 0
@@ -110,6 +92,13 @@ class Runner():
         self.ticks_of_last_refresh = 0
         
         self.used_memory_mb = 0
+        # without display the runner is not shown and its memory is not measured (e.g. single-trajectory replays)
+        self.process = None
+        if not display:
+            return
+        # psutil is imported here and not with the module to keep imports fast
+        import psutil
+        self.process = psutil.Process(os.getpid())
         
         live_display.update_config(
             platform=self.platform,
@@ -122,12 +111,57 @@ class Runner():
             current_am=self.max_am,
             total_am=Helper.winner_antimatter(self.galaxies_bought, self.dimboosts_bought))
 
-    def add_start_state(self) -> None:
-        line = 0
+    def state_arrays_spec(self, actions_lists_length: int=0) -> dict:
+        # per-state arrays: name -> (shape of the array without the states axis, dtype)
+        return {
+            'actions_item_lists': ((actions_lists_length,), self.arrays_types.actions_item_lists),
+            'actions_amount_lists': ((actions_lists_length,), self.arrays_types.actions_amount_lists),
+            'actions_info_lists': ((actions_lists_length,), self.arrays_types.actions_info_lists),
+            'actions_tick_lists': ((actions_lists_length,), self.arrays_types.actions_tick_lists),
+            'allowed_purchases': ((1 + self.max_dims,), self.arrays_types.allowed_purchases),
+            'allowed_sacrifices': ((self.sacrifices_length,), self.arrays_types.allowed_sacrifices),
+            'amounts': ((2 + self.max_dims,), self.arrays_types.amounts),
+                # amounts[0] is antimatter
+                # amounts[1, ..., max_dims] are dims amounts
+                # amounts[max_dims+1] is amount of dim 1 sacrificed
+            'bought_amounts': ((1 + self.max_dims,), self.arrays_types.bought_amounts),
+                # bought_amounts[0] is bought tickspeed
+                # bought_amounts[1-8] are bought dims
+            'costs': ((1 + self.max_dims,), self.arrays_types.costs),
+                # costs[0] is tickspeed cost
+                # costs[1-8] are dims costs
+            'multipliers': ((1 + self.max_dims,), self.arrays_types.multipliers),
+                # multipliers[0] is tickspeed multiplier
+                # multipliers[1-8] are dims multipliers
+            'purchases_done': ((), self.arrays_types.purchases_done),
+            'sacrifices_done': ((), self.arrays_types.sacrifices_done),
+            'real_total_sacrifice_boosts': ((), self.arrays_types.real_total_sacrifice_boosts)
+                # per-state counters for list strategies: purchases and sacrifices made, product of sacrifice boosts
+        }
+
+    def allocate_arrays(self, num_states: int) -> None:
+        actions_lists_length = Constants.numpy_actions_reserve_step
+        if self.array_pool is not None:
+            actions_lists_length = max(actions_lists_length, self.array_pool.high_water_actions_length)
+        state_arrays_spec = self.state_arrays_spec(actions_lists_length)
+        if self.array_pool is not None:
+            num_states = self.array_pool.reserved_states(num_states, state_arrays_spec)
+        for name, (state_shape, dtype) in state_arrays_spec.items():
+            if self.array_pool is None:
+                array = np.empty((num_states,) + state_shape, dtype=dtype)
+            else:
+                array = self.array_pool.take(name, (num_states,) + state_shape, dtype)
+            setattr(self, name, array)
+        self.state_arrays_names = list(state_arrays_spec)
+        # arrays with the actions lists axis, they are the ones that change with its length
+        longer_spec = self.state_arrays_spec(actions_lists_length + 1)
+        self.actions_lists_names = [name for name in state_arrays_spec if longer_spec[name][0] != state_arrays_spec[name][0]]
+        self.num_states_reserved = num_states
+
+    def set_start_values(self, line: int) -> None:
         self.amounts[line] = np.zeros(self.amounts.shape[1])
         self.amounts[line][0] = Constants.start_antimatter
         self.amounts[line][self.max_dims + 1] = 0
-        self.bought_amounts[line] = np.zeros(self.bought_amounts.shape[1])
         self.costs[line][0] = Constants.tickspeed_base_cost
         for tier in range(1, self.max_dims + 1):
             self.costs[line][tier] = Constants.dims_base_costs[tier]
@@ -137,33 +171,47 @@ class Runner():
             if self.platform == 'mobile':
                 self.multipliers[line][tier] *= Constants.mobile_dim_multiplier
 
+    def add_start_state(self) -> None:
+        line = self.num_states_current
+        self.set_start_values(line)
+        self.bought_amounts[line] = np.zeros(self.bought_amounts.shape[1])
         self.add_ach_bonuses(line)
         self.add_dimboost_multiplier(line)
+        self.purchases_done[line] = 0
+        self.sacrifices_done[line] = 0
+        self.real_total_sacrifice_boosts[line] = 1
         
         self.actions_item_lists[line][0] = 0
         self.actions_amount_lists[line][0] = 0
         self.actions_info_lists[line][0] = 0
         self.actions_tick_lists[line][0] = 0
-        self.allowed_purchases[line] = self.purchase_strategy.next_purchases(self, line)
-        self.allowed_sacrifices[line] = self.sacrifice_strategy.next_sacrifices(self, line)
+        self.allowed_purchases[line] = self.purchase_strategy.next_purchases(self.strategy_view(), line)
+        self.allowed_sacrifices[line] = self.sacrifice_strategy.next_sacrifices(self.strategy_view(), line)
         
         self.num_states_alltime += 1
         self.num_states_current += 1
 
+    def strategy_view(self) -> 'Runner':
+        # the object strategies read the states from
+        return self
+
+    def multiply_multiplier(self, line: int, tier: int, multiplier: float) -> None:
+        self.multipliers[line][tier] *= multiplier
+
     def add_achs(self, line: int, amount: int) -> None:
         new_ach_multiplier = pow(Constants.ach_multiplier, amount)
         for tier in range(1, self.max_dims + 1):
-            self.multipliers[line][tier] *= new_ach_multiplier
+            self.multiply_multiplier(line, tier, new_ach_multiplier)
 
     def add_row_ach_mult(self, line: int) -> None:
         for tier in range(1, self.max_dims + 1):
-            self.multipliers[line][tier] *= Constants.ach_row_multiplier
+            self.multiply_multiplier(line, tier, Constants.ach_row_multiplier)
 
     def add_dimboost_multiplier(self, line: int) -> None:
         for tier in range(1, self.max_dims + 1):
             dimboost_count_for_tier = max(0, self.dimboosts_bought - tier + 1)
             if dimboost_count_for_tier > 0:
-                self.multipliers[line][tier] *= pow(Constants.dimboost_multiplier, dimboost_count_for_tier)
+                self.multiply_multiplier(line, tier, pow(Constants.dimboost_multiplier, dimboost_count_for_tier))
 
     def add_ach_bonuses(self, line: int) -> None:
         self.add_achs(line, Helper.start_ach_amount(self.galaxies_bought, self.dimboosts_bought))
@@ -172,13 +220,13 @@ class Runner():
         if ((self.galaxies_bought == 1) and (self.dimboosts_bought >= 10)) or (self.galaxies_bought >= 2):
             tier = 8
             if self.max_dims >= tier:
-                self.multipliers[line][tier] *= Constants.ach23_multiplier # r23
+                self.multiply_multiplier(line, tier, Constants.ach23_multiplier) # r23
         if ((self.galaxies_bought == 1) and (self.dimboosts_bought >= 12)) or (self.galaxies_bought >= 2):
             tier = 1
-            self.multipliers[line][tier] *= Constants.ach28_multiplier # r28
+            self.multiply_multiplier(line, tier, Constants.ach28_multiplier) # r28
         if (self.galaxies_bought == 2) and (self.dimboosts_bought >= 15):
             tier = 1
-            self.multipliers[line][tier] *= Constants.ach31_multiplier # r31
+            self.multiply_multiplier(line, tier, Constants.ach31_multiplier) # r31
 
     def add_ach_for_new_dim(self, line: int, tier: int) -> None:
         if self.galaxies_bought == 0:
@@ -196,23 +244,12 @@ class Runner():
 
     def extend_actions_lists(self) -> None:
         actions_lists_length = self.actions_item_lists.shape[1]
-        new_actions_lists_shape = (self.num_states_reserved, actions_lists_length + Constants.numpy_actions_reserve_step)
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_item_lists.dtype)
-        new_array[:, :actions_lists_length] = self.actions_item_lists
-        self.actions_item_lists = new_array
-
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_amount_lists.dtype)
-        new_array[:, :actions_lists_length] = self.actions_amount_lists
-        self.actions_amount_lists = new_array
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_info_lists.dtype)
-        new_array[:, :actions_lists_length] = self.actions_info_lists
-        self.actions_info_lists = new_array
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_tick_lists.dtype)
-        new_array[:, :actions_lists_length] = self.actions_tick_lists
-        self.actions_tick_lists = new_array
+        for name in self.actions_lists_names:
+            array = getattr(self, name)
+            new_array = np.empty((self.num_states_reserved, actions_lists_length + Constants.numpy_actions_reserve_step),
+                                 dtype=array.dtype)
+            new_array[:, :actions_lists_length] = array
+            setattr(self, name, new_array)
 
     def add_action(self, line: int, item_int: int, cost: float) -> None:
         prev_action_pos = self.actions_item_lists[line][0]
@@ -235,11 +272,16 @@ class Runner():
         self.actions_tick_lists[line][action_pos] = self.ticks_passed
 
     def buy(self, line: int, item_int: int) -> None:
+        self.buy_item(line, item_int)
+        self.allowed_purchases[line] = self.purchase_strategy.next_purchases(self.strategy_view(), line)
+
+    def buy_item(self, line: int, item_int: int) -> None:
         cost = self.costs[line][item_int]
         self.amounts[line][0] -= cost
         if self.amounts[line][0] < 0:
             raise Exception("Negative antimatter")
         self.bought_amounts[line][item_int] += 1
+        self.purchases_done[line] += 1
         if item_int == 0:
             self.costs[line][item_int] *= Constants.tickspeed_base_cost_multiplier
             self.multipliers[line][item_int] *= Constants.tickspeed_multiplier_multipliers[self.galaxies_bought]
@@ -252,83 +294,33 @@ class Runner():
                 self.add_ach_for_new_dim(line, item_int)
 
         self.add_action(line, item_int, cost)
-        
-        self.allowed_purchases[line] = self.purchase_strategy.next_purchases(self, line)
 
     def sacrifice(self, line: int, sacrifice_boost: float) -> None:
         self.amounts[line][self.max_dims + 1] += self.amounts[line][1]
         self.multipliers[line][8] *= sacrifice_boost
         for tier in range(1, self.max_dims):
             self.amounts[line][tier] = 0
+        self.sacrifices_done[line] += 1
+        self.real_total_sacrifice_boosts[line] *= sacrifice_boost
 
         self.add_action(line, Constants.sacrifice_action_const, sacrifice_boost)
-        self.allowed_sacrifices[line] = self.sacrifice_strategy.next_sacrifices(self, line)
+        self.allowed_sacrifices[line] = self.sacrifice_strategy.next_sacrifices(self.strategy_view(), line)
     
     def extend_arrays(self) -> None:
-        new_actions_lists_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.actions_item_lists.shape[1])
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_item_lists.dtype)
-        new_array[:self.num_states_reserved] = self.actions_item_lists
-        self.actions_item_lists = new_array
-
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_amount_lists.dtype)
-        new_array[:self.num_states_reserved] = self.actions_amount_lists
-        self.actions_amount_lists = new_array
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_info_lists.dtype)
-        new_array[:self.num_states_reserved] = self.actions_info_lists
-        self.actions_info_lists = new_array
-        
-        new_array = np.empty(new_actions_lists_shape, dtype=self.actions_tick_lists.dtype)
-        new_array[:self.num_states_reserved] = self.actions_tick_lists
-        self.actions_tick_lists = new_array
-        
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.allowed_purchases.shape[1])
-        new_array = np.empty(new_shape, dtype=self.allowed_purchases.dtype)
-        new_array[:self.num_states_reserved] = self.allowed_purchases
-        self.allowed_purchases = new_array
-        
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.allowed_sacrifices.shape[1])
-        new_array = np.empty(new_shape, dtype=self.allowed_sacrifices.dtype)
-        new_array[:self.num_states_reserved] = self.allowed_sacrifices
-        self.allowed_sacrifices = new_array
-
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.amounts.shape[1])
-        new_array = np.empty(new_shape, dtype=self.amounts.dtype)
-        new_array[:self.num_states_reserved] = self.amounts
-        self.amounts = new_array
-
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.bought_amounts.shape[1])
-        new_array = np.empty(new_shape, dtype=self.bought_amounts.dtype)
-        new_array[:self.num_states_reserved] = self.bought_amounts
-        self.bought_amounts = new_array
-
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.costs.shape[1])
-        new_array = np.empty(new_shape, dtype=self.costs.dtype)
-        new_array[:self.num_states_reserved] = self.costs
-        self.costs = new_array
-
-        new_shape = (self.num_states_reserved + Constants.numpy_reserve_step, self.multipliers.shape[1])
-        new_array = np.empty(new_shape, dtype=self.multipliers.dtype)
-        new_array[:self.num_states_reserved] = self.multipliers
-        self.multipliers = new_array
-        
+        for name in self.state_arrays_names:
+            array = getattr(self, name)
+            new_array = np.empty((self.num_states_reserved + Constants.numpy_reserve_step,) + array.shape[1:], dtype=array.dtype)
+            new_array[:self.num_states_reserved] = array
+            setattr(self, name, new_array)
         self.num_states_reserved += Constants.numpy_reserve_step
     
     def add_state_copy(self, orig_line: int) -> int:
         if self.num_states_current == self.num_states_reserved:
             self.extend_arrays()
         new_line = self.num_states_current
-        self.actions_item_lists[new_line] = self.actions_item_lists[orig_line]
-        self.actions_amount_lists[new_line] = self.actions_amount_lists[orig_line]
-        self.actions_info_lists[new_line] = self.actions_info_lists[orig_line]
-        self.actions_tick_lists[new_line] = self.actions_tick_lists[orig_line]
-        self.allowed_purchases[new_line] = self.allowed_purchases[orig_line]
-        self.allowed_sacrifices[new_line] = self.allowed_sacrifices[orig_line]
-        self.amounts[new_line] = self.amounts[orig_line]
-        self.bought_amounts[new_line] = self.bought_amounts[orig_line]
-        self.costs[new_line] = self.costs[orig_line]
-        self.multipliers[new_line] = self.multipliers[orig_line]
+        for name in self.state_arrays_names:
+            array = getattr(self, name)
+            array[new_line] = array[orig_line]
         
         self.num_states_alltime += 1
         self.num_states_current += 1
@@ -351,68 +343,94 @@ class Runner():
     def sorted_indices(self, item_int: int) -> np.ndarray:
         return np.argsort(self.amounts[:self.num_states_current, item_int])[::-1].astype(ArraysTypes.sorted_indices)
     
-    def sort_states(self, item_int: int) -> None:
-        sorted_indices = self.sorted_indices(item_int)
-        self.actions_item_lists[:self.num_states_current] = self.actions_item_lists[sorted_indices]
-        self.actions_amount_lists[:self.num_states_current] = self.actions_amount_lists[sorted_indices]
-        self.actions_info_lists[:self.num_states_current] = self.actions_info_lists[sorted_indices]
-        self.actions_tick_lists[:self.num_states_current] = self.actions_tick_lists[sorted_indices]
-        self.allowed_purchases[:self.num_states_current] = self.allowed_purchases[sorted_indices]
-        self.allowed_sacrifices[:self.num_states_current] = self.allowed_sacrifices[sorted_indices]
-        self.amounts[:self.num_states_current] = self.amounts[sorted_indices]
-        self.bought_amounts[:self.num_states_current] = self.bought_amounts[sorted_indices]
-        self.costs[:self.num_states_current] = self.costs[sorted_indices]
-        self.multipliers[:self.num_states_current] = self.multipliers[sorted_indices]
+    def sorted_lines(self, bools: np.ndarray) -> np.ndarray:
+        # lines where bools is True, by decreasing amount of 1st dim; the state arrays are not reordered
+        sorted_indices = self.sorted_indices(1)
+        return sorted_indices[bools[sorted_indices]]
     
-    def move_second_state_to_first(self, i: int, j: int) -> None:
-        self.actions_item_lists[i] = self.actions_item_lists[j]
-        self.actions_amount_lists[i] = self.actions_amount_lists[j]
-        self.actions_info_lists[i] = self.actions_info_lists[j]
-        self.actions_tick_lists[i] = self.actions_tick_lists[j]
-        self.allowed_purchases[i] = self.allowed_purchases[j]
-        self.allowed_sacrifices[i] = self.allowed_sacrifices[j]
-        self.amounts[i] = self.amounts[j]
-        self.bought_amounts[i] = self.bought_amounts[j]
-        self.costs[i] = self.costs[j]
-        self.multipliers[i] = self.multipliers[j]
+    def move_second_state_to_first(self, i: Union[int, np.ndarray], j: Union[int, np.ndarray]) -> None:
+        for name in self.state_arrays_names:
+            array = getattr(self, name)
+            array[i] = array[j]
     
-    def clear_all(self) -> None:
-        old_num_states = self.num_states_current
-        start_time = time.perf_counter()
-
-        sorted_indices = self.sorted_indices(1)
-        
-        num_objects = self.num_states_current
+    def dominance_amounts(self, amounts: np.ndarray, num_objects: int) -> np.ndarray:
+        if self.dominance_epsilon == 0:
+            return amounts
+        # amounts rounded down to powers of 1/(1 - epsilon): exact dominance of rounded amounts means
+        # at least (1 - epsilon) of every amount, and stays transitive, so all kernels can be used
+        grid_step = -np.log(1 - self.dominance_epsilon)
+        with np.errstate(divide='ignore'):
+            return np.exp(np.floor(np.log(amounts[:num_objects]) / grid_step) * grid_step)
+
+    def find_dominated(self, amounts: np.ndarray, bought_amounts: np.ndarray, num_objects: int) -> np.ndarray:
+        # works on given arrays only, so it can also run in the background on a snapshot of the states
+        sorted_indices = np.argsort(amounts[:num_objects, 1])[::-1].astype(ArraysTypes.sorted_indices)
         dominated_bools = np.zeros(num_objects, dtype=bool)
-        cpp_lib.find_dominated(self.amounts, self.bought_amounts, sorted_indices,
-                               num_objects, self.max_dims, dominated_bools)
+        dominance_amounts = self.dominance_amounts(amounts, num_objects)
+        self.backend.find_dominated_states(dominance_amounts, bought_amounts, sorted_indices,
+                                           num_objects, self.max_dims, dominated_bools)
+        return dominated_bools
 
-        i = 0
-        j = num_objects - 1
-        while True:
-            while (i < j) and (not dominated_bools[i]):
-                i += 1
-            while (i < j) and (dominated_bools[j]):
-                j -= 1
-            if i >= j:
-                if not dominated_bools[i]:
-                    self.num_states_current = i + 1
-                else:
-                    self.num_states_current = i
-                break
-            self.move_second_state_to_first(i, j)
-            dominated_bools[i] = False
-            dominated_bools[j] = True
-            i += 1
-            j -= 1
+    def remove_states(self, dominated_bools: np.ndarray) -> None:
+        old_num_states = self.num_states_current
         
-        end_time = time.perf_counter()
-        self.spent_for_clear += end_time - start_time
-        new_num_states = self.num_states_current
+        # holes left by dominated states among the first num_survivors lines are filled
+        # by survivors from the tail, the last survivor goes to the first hole
+        num_survivors = old_num_states - int(np.count_nonzero(dominated_bools))
+        holes = np.flatnonzero(dominated_bools[:num_survivors])
+        tail_survivors = num_survivors + np.flatnonzero(~dominated_bools[num_survivors:])[::-1]
+        self.move_second_state_to_first(holes, tail_survivors)
+        self.num_states_current = num_survivors
         
+        new_num_states = self.num_states_current
         self.deleted_after_refresh += old_num_states - new_num_states
-    
+
+    def clear_all(self) -> bool:
+        # returns False if nothing was removed yet (pipelined clear still running)
+        start_time = time.perf_counter()
+        if self.clear_executor is None:
+            dominated_bools = self.find_dominated(self.amounts, self.bought_amounts, self.num_states_current)
+            if self.telemetry is not None:
+                self.telemetry.record_clear(self, dominated_bools, self.num_states_current)
+            self.remove_states(dominated_bools)
+            cleared = True
+        else:
+            cleared = self.clear_all_pipelined()
+        end_time = time.perf_counter()
+        self.spent_for_clear += end_time - start_time
+        return cleared
+
+    def clear_all_pipelined(self) -> bool:
+        # dominance is found in the background for a snapshot of the states while the live states keep
+        # ticking and buying. Lines of the snapshot stay in place until the result is applied (new states
+        # are only appended), so the result is applied to them and all newer lines are kept
+        cleared = False
+        if (self.pending_clear is not None) and self.pending_clear.done():
+            snapshot_dominated_bools = self.pending_clear.result()
+            self.pending_clear = None
+            dominated_bools = np.zeros(self.num_states_current, dtype=bool)
+            dominated_bools[:len(snapshot_dominated_bools)] = snapshot_dominated_bools
+            if self.telemetry is not None:
+                self.telemetry.record_clear(self, dominated_bools, len(snapshot_dominated_bools))
+            self.remove_states(dominated_bools)
+            cleared = True
+        if self.pending_clear is None:
+            num_objects = self.num_states_current
+            self.pending_clear = self.clear_executor.submit(self.find_dominated, self.amounts[:num_objects].copy(),
+                                                            self.bought_amounts[:num_objects].copy(), num_objects)
+        return cleared
+
+    def stop_pipelined_clear(self) -> None:
+        if self.clear_executor is None:
+            return
+        self.clear_executor.shutdown(wait=True, cancel_futures=True)
+        self.clear_executor = None
+        self.pending_clear = None
+
     def buy_all(self, can_buy_bools: np.ndarray) -> None:
+        if self.purchase_strategy.is_vectorized_purchase_strategy:
+            self.buy_all_vectorized(can_buy_bools)
+            return
         old_num_states = self.num_states_current
         lines_to_check = self.num_states_current
         line = 0
@@ -436,6 +454,29 @@ class Runner():
         new_num_states = self.num_states_current
         self.added_after_refresh += new_num_states - old_num_states
 
+    def buy_all_vectorized(self, can_buy_bools: np.ndarray) -> None:
+        # purchases of this tick are made in rounds, one purchase of every buying state per round,
+        # so next purchases of all states that bought in a round are found by one call of the strategy.
+        # Every state makes the same purchases as in buy_all, only new states get other lines
+        old_num_states = self.num_states_current
+        lines = np.flatnonzero(can_buy_bools)
+        while len(lines) > 0:
+            first_new_line = self.num_states_current
+            for line in lines:
+                item_int = self.allowed_purchases[line][0]
+                if self.allowed_purchases[line][1] != Constants.no_action_const:
+                    new_line = self.add_state_copy(line)
+                    self.allowed_purchases[new_line][:-1] = self.allowed_purchases[new_line][1:]
+                    self.allowed_purchases[new_line][-1] = Constants.no_action_const
+                self.buy_item(line, item_int)
+            self.allowed_purchases[lines] = self.purchase_strategy.next_purchases_all(self.strategy_view(), lines)
+            
+            lines = np.concatenate([lines, np.arange(first_new_line, self.num_states_current)])
+            items = self.allowed_purchases[lines, 0]
+            lines = lines[self.costs[lines, items] <= self.amounts[lines, 0]]
+        new_num_states = self.num_states_current
+        self.added_after_refresh += new_num_states - old_num_states
+
     def sacrifice_all(self, sacrifice_boosts: np.ndarray) -> None:
         old_num_states = self.num_states_current
         for line in range(self.num_states_current):
@@ -458,32 +499,29 @@ class Runner():
         new_num_states = self.num_states_current
         self.added_after_refresh += new_num_states - old_num_states
     
-    def get_winner_line(self) -> Union[int, None]:
+    def lines_winner_last_dim_bought(self, lines: np.ndarray) -> Union[int, np.ndarray]:
+        return Helper.winner_last_dim_bought(self.galaxies_bought, self.dimboosts_bought)
+
+    def winner_bools(self) -> np.ndarray:
         winner_last_dim_bought = Helper.winner_last_dim_bought(self.galaxies_bought, self.dimboosts_bought)
-        for line in range(self.num_states_current):
-            if self.bought_amounts[line][-1] >= winner_last_dim_bought:
-                return line
-        return None
+        return self.bought_amounts[:self.num_states_current, -1] >= winner_last_dim_bought
+
+    def get_winner_line(self) -> Union[int, None]:
+        winner_lines = np.flatnonzero(self.winner_bools())
+        if len(winner_lines) == 0:
+            return None
+        return int(winner_lines[0])
 
     def number_of_winners(self) -> int:
-        result = 0
-        winner_last_dim_bought = Helper.winner_last_dim_bought(self.galaxies_bought, self.dimboosts_bought)
-        for line in range(self.num_states_current):
-            if self.bought_amounts[line][-1] >= winner_last_dim_bought:
-                result += 1
-        return result
+        return int(np.count_nonzero(self.winner_bools()))
     
     def overflow_winners(self) -> list:
         start_time = time.perf_counter()
         self.ticks_passed += 1
-        results = []
-        for line in range(self.num_states_current):
+        with np.errstate(over='ignore', invalid='ignore'):
             for tier in range(self.max_dims, 0, -1):
-                self.amounts[line][tier - 1] += self.amounts[line][tier] * self.multipliers[line][tier] * self.multipliers[line][0] * self.tick_duration
-        self.sort_states(1)
-        for line in range(self.num_states_current):
-            if self.amounts[line][0] == np.inf:
-                results.append(line)
+                self.amounts[:self.num_states_current, tier - 1] += self.amounts[:self.num_states_current, tier] * self.multipliers[:self.num_states_current, tier] * self.multipliers[:self.num_states_current, 0] * self.tick_duration
+        results = self.sorted_lines(self.amounts[:self.num_states_current, 0] == np.inf).tolist()
         end_time = time.perf_counter()
         self.spent_for_tick += end_time - start_time
         return results
@@ -519,48 +557,71 @@ class Runner():
         self.time_of_last_refresh = real_time
         self.ticks_of_last_refresh = self.ticks_passed
 
+    def update_used_memory(self) -> None:
+        if self.process is None:
+            return
+        self.used_memory_mb = max(self.process.memory_info().rss / 1024 ** 2, self.used_memory_mb)
+
     def cycle(self) -> None:
-        self.used_memory_mb = max(psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2, self.used_memory_mb)
-        
         try:
             with np.errstate(over='raise'):
                 self.tick_all()
         except FloatingPointError as e:
             raise ValueError from e
+        self.act_all()
+
+    def act_all(self) -> None:
+        # buying, sacrifice and clear of the cycle, after its tick
         state_num_before_buy_and_sacrifice = self.num_states_current
         start_time = time.perf_counter()
         can_buy_bools = np.zeros(self.num_states_current, dtype=bool)
-        if cpp_lib.can_buy_all(self.amounts, self.costs, self.allowed_purchases,
-                               self.num_states_current, self.max_dims, can_buy_bools):
+        if self.backend.can_buy_all(self.amounts, self.costs, self.allowed_purchases,
+                                    self.num_states_current, self.max_dims, can_buy_bools):
             self.buy_all(can_buy_bools)
         end_time = time.perf_counter()
         self.spent_for_buy += end_time - start_time
+        state_num_after_buy = self.num_states_current
 
         if (self.dimboosts_bought >= 5) and self.sacrifice_strategy.is_real_sacrifice_strategy:
             start_time = time.perf_counter()
             sacrifice_boosts = np.zeros(self.num_states_current, dtype=ArraysTypes.sacrifice_boosts)
-            if cpp_lib.can_sacrifice_all(self.amounts, self.allowed_sacrifices,
-                                         self.num_states_current, self.max_dims,
-                                         self.sacrifices_length, sacrifice_boosts):
+            if self.backend.can_sacrifice_all(self.amounts, self.allowed_sacrifices,
+                                              self.num_states_current, self.max_dims,
+                                              self.sacrifices_length, sacrifice_boosts):
                 self.sacrifice_all(sacrifice_boosts)
             end_time = time.perf_counter()
             self.spent_for_sacrifice += end_time - start_time
+        if self.telemetry is not None:
+            self.telemetry.add_created(state_num_after_buy - state_num_before_buy_and_sacrifice,
+                                       self.num_states_current - state_num_after_buy)
             
         if self.num_states_current > state_num_before_buy_and_sacrifice:
-            if (self.addition_cycles_without_clear >= Constants.addition_cycles_without_clear_limit) or (
-                    self.num_states_current > self.states_num_after_clear * Constants.state_growth_without_clear_limit):
-                self.clear_all()
-                self.states_num_after_clear = self.num_states_current
-                self.addition_cycles_without_clear = 0
-                cleared = True
+            if (self.addition_cycles_without_clear >= self.addition_cycles_without_clear_limit) or (
+                    self.num_states_current > self.states_num_after_clear * self.state_growth_without_clear_limit):
+                # memory is measured at its peak, right before a clear, and not every cycle
+                self.update_used_memory()
+                cleared = self.clear_all()
             else:
-                self.addition_cycles_without_clear += 1
                 cleared = False
             
             if cleared:
+                self.states_num_after_clear = self.num_states_current
+                self.addition_cycles_without_clear = 0
                 self.refresh_status()
+            else:
+                self.addition_cycles_without_clear += 1
     
-    def generate_winner_dict(self, winner_line: int, number_of_winners: int, elapsed_seconds: float) -> dict:
+    def get_actions(self, line: int) -> dict:
+        actions_num = self.actions_item_lists[line][0]
+        return {
+            'item': self.actions_item_lists[line][1 : actions_num + 1].copy(),
+            'amount': self.actions_amount_lists[line][1 : actions_num + 1].copy(),
+            'info': self.actions_info_lists[line][1 : actions_num + 1].copy(),
+            'tick': self.actions_tick_lists[line][1 : actions_num + 1].copy()
+        }
+
+    def generate_winner_dict(self, winner_line: int, number_of_winners: int, elapsed_seconds: float, aborted: bool=False) -> dict:
+        self.update_used_memory()
         game_info = {
             "platform": self.platform,
             "galaxies_bought": self.galaxies_bought,
@@ -582,6 +643,7 @@ class Runner():
             "used_memory_mb": round(self.used_memory_mb, 3),
             "states_analyzed": self.num_states_alltime,
             "number_of_winners": number_of_winners,
+            "aborted": aborted,
             "time_breakdown": {
                 "tick": Helper.time_str_percent(self.spent_for_tick, elapsed_seconds),
                 "buy": Helper.time_str_percent(self.spent_for_buy, elapsed_seconds),
@@ -590,45 +652,118 @@ class Runner():
                 "other": Helper.time_str_percent(spent_other, elapsed_seconds)
             }
         }
-        actions_num = self.actions_item_lists[winner_line][0]
+        if self.dominance_epsilon:
+            strategy_search_info["dominance_epsilon"] = self.dominance_epsilon
+        actions = self.get_actions(winner_line)
         actions_readable_list = Helper.get_actions_readable_list(
-            self.actions_item_lists[winner_line][1 : actions_num + 1],
-            self.actions_amount_lists[winner_line][1 : actions_num + 1],
-            self.actions_info_lists[winner_line][1 : actions_num + 1],
-            self.actions_tick_lists[winner_line][1 : actions_num + 1],
-            self.tick_duration
-        )
+            actions['item'], actions['amount'], actions['info'], actions['tick'], self.tick_duration)
         return {
             'game_info': game_info,
             'actions_readable_list': actions_readable_list,
+            'actions': actions,
             'strategy_search_info': strategy_search_info
             }
     
-    def run(self) -> dict:
+    def best_line(self) -> int:
+        return int(np.argmax(self.amounts[:self.num_states_current, 0]))
+
+    def snapshot(self, elapsed_seconds: float) -> dict:
+        # the search so far, with the trajectory of the state with the most antimatter
+        line = self.best_line()
+        return {
+            'ticks_passed': self.ticks_passed,
+            'game_time': Helper.time_float_to_str(self.tick_duration * self.ticks_passed),
+            'elapsed_seconds': elapsed_seconds,
+            'states': self.num_states_current,
+            'states_analyzed': self.num_states_alltime,
+            'best_antimatter': float(self.strategy_view().amounts[line][0]),
+            'actions': self.get_actions(line)
+        }
+
+    def complete_by_replay(self, winner_dict: dict) -> dict:
+        # the trajectory of an unfinished search is replayed and continued with the cheapest purchases,
+        # so it is a valid trajectory but not an optimal one. game_info has 'optimal' only in this case,
+        # results without it are complete searches
+        from replay import ReplayRunner
+        sacrifice_list = Results.get_sacrifice_list(winner_dict) if winner_dict['game_info']['has_sacrifice'] else None
+        replay_dict = ReplayRunner(self.platform, self.galaxies_bought, self.dimboosts_bought,
+                                   Results.get_purchase_list(winner_dict), sacrifice_list).run()
+        winner_dict['game_info']['game_time'] = replay_dict['game_info']['game_time']
+        winner_dict['game_info']['ticks_passed'] = replay_dict['game_info']['ticks_passed']
+        winner_dict['game_info']['optimal'] = False
+        winner_dict['actions_readable_list'] = replay_dict['actions_readable_list']
+        winner_dict['actions'] = replay_dict['actions']
+        return winner_dict
+
+    def iter_run(self, ticks_limit: Union[int, None]=None, deadline_seconds: Union[float, None]=None,
+                 snapshot_seconds: Union[float, None]=None):
+        # yields a snapshot of the search every snapshot_seconds (Constants.snapshot_seconds with None),
+        # the winner dict is the return value of the generator (StopIteration.value or the value of yield from).
+        # With ticks_limit the run is aborted as soon as ticks_passed reaches it without a winner
+        # (e.g. when there is already a known trajectory that is at least as fast).
+        # With deadline_seconds the search stops after that time without a winner, and the trajectory
+        # of the state with the most antimatter is completed by complete_by_replay
+        if snapshot_seconds is None:
+            snapshot_seconds = Constants.snapshot_seconds
         start_time = time.perf_counter()
         self.time_of_last_refresh = start_time
+        time_of_last_snapshot = start_time
+        aborted = False
+        deadline_reached = False
         
+        try:
+            while True:
+                try:
+                    self.cycle()
+                    winner_line = self.get_winner_line()
+                    if winner_line is not None:
+                        winner_lines = self.sorted_lines(self.winner_bools())
+                        number_of_winners = len(winner_lines)
+                        winner_line = int(winner_lines[0])
+                except ValueError:
+                    winners = self.overflow_winners()
+                    number_of_winners = len(winners)
+                    winner_line = winners[0]
+                real_time = time.perf_counter()
+                if (winner_line is None) and (ticks_limit is not None) and (self.ticks_passed >= ticks_limit):
+                    number_of_winners = 0
+                    winner_line = self.best_line()
+                    aborted = True
+                elif (winner_line is None) and (deadline_seconds is not None) and (real_time - start_time >= deadline_seconds):
+                    number_of_winners = 0
+                    winner_line = self.best_line()
+                    deadline_reached = True
+                if winner_line is not None:
+                    elapsed_seconds = real_time - start_time
+                    break
+                if real_time - time_of_last_snapshot >= snapshot_seconds:
+                    time_of_last_snapshot = real_time
+                    yield self.snapshot(real_time - start_time)
+            
+            self.stop_pipelined_clear()
+            self.refresh_status()
+            live_display.complete_progress_bar()
+            winner_dict = self.generate_winner_dict(winner_line, number_of_winners, elapsed_seconds, aborted)
+            if deadline_reached:
+                winner_dict['strategy_search_info']['deadline_seconds'] = deadline_seconds
+                winner_dict['strategy_search_info']['deadline_ticks_passed'] = self.ticks_passed
+                winner_dict = self.complete_by_replay(winner_dict)
+            return winner_dict
+        finally:
+            # also when the generator is closed before the end or a cycle raises
+            self.stop_pipelined_clear()
+            if self.array_pool is not None:
+                self.array_pool.release(self)
+
+    def run(self, ticks_limit: Union[int, None]=None, deadline_seconds: Union[float, None]=None) -> dict:
+        # iter_run without snapshots
+        run_generator = self.iter_run(ticks_limit, deadline_seconds, snapshot_seconds=math.inf)
         while True:
             try:
-                self.cycle()
-                winner_line = self.get_winner_line()
-                if winner_line is not None:
-                    number_of_winners = self.number_of_winners()
-                    self.sort_states(1)
-                    winner_line = self.get_winner_line()
-            except ValueError:
-                winners = self.overflow_winners()
-                number_of_winners = len(winners)
-                winner_line = winners[0]
-            if winner_line is not None:
-                end_time = time.perf_counter()
-                elapsed_seconds = end_time - start_time
-                break
-        
-        self.refresh_status()
-        live_display.complete_progress_bar()
-        return self.generate_winner_dict(winner_line, number_of_winners, elapsed_seconds)
+                next(run_generator)
+            except StopIteration as stop:
+                return stop.value
     
     def run_and_save(self, filename: str='') -> None:
         winner_dict = self.run()
-        Helper.save_winner_dict(winner_dict, filename=filename)
+        Results.save_winner_dict(winner_dict, filename=filename)
@@ -1,7 +1,9 @@
 from typing import Union, TYPE_CHECKING
+import math
 import numpy as np
 
-from utils import Constants, Helper
+from utils import Constants
+from results import Results
 
 if TYPE_CHECKING:
     from ad_dimboost_optimizer import Runner
@@ -48,6 +50,32 @@ class IncrementalSacrificeStrategy(SacrificeStrategy):
         next_sacrifices_list.append(Constants.sacrifice_infinity)
         return next_sacrifices_list
 
+class WindowedSacrificeStrategy(IncrementalSacrificeStrategy):
+    """
+    Incremental sacrifice thresholds limited to windows around known sacrifice boosts
+    (e.g. the ones used by the winner of a search with a coarser step).
+    """
+    def __init__(self, sacrifice_step, sacrifice_centers: list, window: float):
+        self.is_real_sacrifice_strategy = True
+        self.is_constant_sacrifice_strategy = True
+        self.sacrifice_step = sacrifice_step
+        self.sacrifice_centers = sacrifice_centers
+        self.window = window
+        
+        max_step_num = int((Constants.sacrifice_max - 1) / sacrifice_step)
+        step_nums = set()
+        for center in sacrifice_centers:
+            first_step_num = max(1, math.ceil((center - window - 1) / sacrifice_step))
+            last_step_num = min(max_step_num, math.floor((center + window - 1) / sacrifice_step))
+            step_nums.update(range(first_step_num, last_step_num + 1))
+        self.windowed_sacrifices_list = [1 + step_num * sacrifice_step for step_num in sorted(step_nums)]
+        self.sacrifices_length = len(self.windowed_sacrifices_list) + 1
+    
+    def next_sacrifices_short_list(self, runner: 'Runner', line: int) -> list:
+        next_sacrifices_list = list(self.windowed_sacrifices_list)
+        next_sacrifices_list.append(Constants.sacrifice_infinity)
+        return next_sacrifices_list
+
 class SacrificeStrategyWithList(NeverSacrificeStrategy):
     def __init__(self, sacrifice_list: Union[list, None]=None):
         self.is_real_sacrifice_strategy = True
@@ -57,33 +85,22 @@ class SacrificeStrategyWithList(NeverSacrificeStrategy):
         if sacrifice_list is None:
             sacrifice_list = []
         self.sacrifice_list = sacrifice_list
+        # predicted_total_sacrifice_boosts[n] is the product of the first n sacrifice boosts
+        self.predicted_total_sacrifice_boosts = [1]
+        for sacrifice_boost in sacrifice_list:
+            self.predicted_total_sacrifice_boosts.append(self.predicted_total_sacrifice_boosts[-1] * sacrifice_boost)
     
     def next_sacrifices_short_list(self, runner: 'Runner', line: int) -> list:
-        actions_num = runner.actions_item_lists[line][0]
-        sacrifices_num = 0
-        real_total_sacrifice_boost = 1
-        for action_pos in range(1, actions_num + 1):
-            if runner.actions_item_lists[line][action_pos] != Constants.sacrifice_action_const:
-                continue
-            sacrifices_num += 1
-            real_total_sacrifice_boost *= runner.actions_info_lists[line][action_pos]
-        
-        if sacrifices_num >= len(self.sacrifice_list):
+        sacrifices_done = runner.sacrifices_done[line]
+        if sacrifices_done >= len(self.sacrifice_list):
             return [Constants.sacrifice_infinity]
         
-        predicted_total_sacrifice_boost = 1
-        for sacrifice_boost in self.sacrifice_list[:sacrifices_num]:
-            predicted_total_sacrifice_boost *= sacrifice_boost
-        
-        predicted_next_sacrifice_boost = self.sacrifice_list[sacrifices_num]
-        calibrated_next_sacrifice_boost = predicted_next_sacrifice_boost * predicted_total_sacrifice_boost / real_total_sacrifice_boost
+        predicted_next_sacrifice_boost = self.sacrifice_list[sacrifices_done]
+        calibrated_next_sacrifice_boost = (predicted_next_sacrifice_boost * self.predicted_total_sacrifice_boosts[sacrifices_done] /
+                                           runner.real_total_sacrifice_boosts[line])
         
         return [calibrated_next_sacrifice_boost]
 
-class SacrificeStrategyFromActionList(SacrificeStrategyWithList):
-    def __init__(self, actions_readable_list: str):
-        super().__init__(Helper.parse_action_list_for_sacrifices(actions_readable_list))
-
-class SacrificeStrategyFromFile(SacrificeStrategyFromActionList):
+class SacrificeStrategyFromFile(SacrificeStrategyWithList):
     def __init__(self, filename: str):
-        super().__init__(Helper.parse_file_for_action_list(filename))
+        super().__init__(Results.load_sacrifice_list(filename))
@@ -0,0 +1,309 @@
+from typing import Union, TYPE_CHECKING
+from multiprocessing import shared_memory
+import multiprocessing
+import time
+import os
+import numpy as np
+
+from utils import ArraysTypes, Constants, Helper
+from runner import Runner
+from backends import default_backend
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from purchase_strategies import PurchaseStrategy
+    from sacrifice_strategies import SacrificeStrategy
+
+
+class ShardRunner(Runner):
+    """
+    Part of the population of ShardedRunner, lives in a worker process.
+    Ticks, buys, sacrifices and clears its own states like a Runner, but only up to the tick
+    given by the coordinator, and exchanges states and dominance results with it.
+    """
+    def __init__(self, shard_index: int, ticks_passed: int, **runner_args) -> None:
+        super().__init__(**runner_args)
+        if shard_index > 0:
+            # only the first shard starts with the start state, the others are started later
+            # at the current tick of the coordinator and get states by balancing
+            self.num_states_current = 0
+            self.num_states_alltime = 0
+            self.ticks_passed = ticks_passed
+            self.ticks_of_last_refresh = ticks_passed
+        self.time_of_last_refresh = time.perf_counter()
+
+    @classmethod
+    def attach_shared_array(cls, name: str, shape: tuple, dtype: type) -> tuple:
+        shared_block = shared_memory.SharedMemory(name=name)
+        return shared_block, np.ndarray(shape, dtype=dtype, buffer=shared_block.buf)
+
+    def advance(self, ticks_target: int) -> dict:
+        winner_lines = []
+        while (self.ticks_passed < ticks_target) and (len(winner_lines) == 0):
+            try:
+                self.cycle()
+                winner_lines = self.sorted_lines(self.winner_bools())
+            except ValueError:
+                winner_lines = self.overflow_winners()
+        self.update_used_memory()
+        status = {
+            'ticks_passed': self.ticks_passed,
+            'num_states': self.num_states_current,
+            'num_states_alltime': self.num_states_alltime,
+            'used_memory_mb': self.used_memory_mb,
+            'number_of_winners': len(winner_lines),
+            'winner_line': None,
+            'max_antimatter_line': None
+        }
+        if len(winner_lines) > 0:
+            status['winner_line'] = int(winner_lines[0])
+            status['winner_amount'] = float(self.amounts[status['winner_line']][1])
+        elif self.num_states_current > 0:
+            status['max_antimatter_line'] = int(np.argmax(self.amounts[:self.num_states_current, 0]))
+            status['max_antimatter'] = float(self.amounts[status['max_antimatter_line']][0])
+        return status
+
+    def export_states(self, amounts_name: str, bought_amounts_name: str, capacity: int, offset: int) -> None:
+        num_states = self.num_states_current
+        amounts_block, amounts = self.attach_shared_array(amounts_name, (capacity, self.amounts.shape[1]), ArraysTypes.amounts)
+        amounts[offset:offset + num_states] = self.amounts[:num_states]
+        del amounts
+        amounts_block.close()
+        bought_amounts_block, bought_amounts = self.attach_shared_array(
+            bought_amounts_name, (capacity, self.bought_amounts.shape[1]), ArraysTypes.bought_amounts)
+        bought_amounts[offset:offset + num_states] = self.bought_amounts[:num_states]
+        del bought_amounts
+        bought_amounts_block.close()
+
+    def remove_dominated(self, dominated_name: str, capacity: int, offset: int) -> int:
+        dominated_block, dominated = self.attach_shared_array(dominated_name, (capacity,), bool)
+        dominated_bools = dominated[offset:offset + self.num_states_current].copy()
+        del dominated
+        dominated_block.close()
+        self.remove_states(dominated_bools)
+        return self.num_states_current
+
+    def pop_states(self, count: int) -> dict:
+        first_line = self.num_states_current - count
+        states = {name: getattr(self, name)[first_line:self.num_states_current].copy() for name in self.state_arrays_names}
+        self.num_states_current = first_line
+        return states
+
+    def push_states(self, states: dict) -> int:
+        count = len(states['amounts'])
+        while self.num_states_current + count > self.num_states_reserved:
+            self.extend_arrays()
+        while states['actions_item_lists'].shape[1] > self.actions_item_lists.shape[1]:
+            self.extend_actions_lists()
+        first_line = self.num_states_current
+        for name in self.state_arrays_names:
+            array = states[name]
+            if array.ndim == 1:
+                getattr(self, name)[first_line:first_line + count] = array
+            else:
+                getattr(self, name)[first_line:first_line + count, :array.shape[1]] = array
+        self.num_states_current += count
+        return self.num_states_current
+
+
+def shard_worker(connection: 'Connection', shard_index: int, ticks_passed: int, runner_args: dict) -> None:
+    shard = ShardRunner(shard_index, ticks_passed, **runner_args)
+    while True:
+        command, args = connection.recv()
+        if command == 'stop':
+            break
+        connection.send(getattr(shard, command)(*args))
+    connection.close()
+
+
+class ShardedRunner():
+    """
+    Runner for a single config with the population split across worker processes (ShardRunner).
+    Shards run independently for Constants.shard_sync_ticks ticks with shard-local clears, then
+    the coordinator collects amounts through shared memory, finds states dominated across shards,
+    and moves states from big shards to small ones.
+    Dominance doesn't depend on how states are distributed, so the winner is the same as for Runner.
+    Shards are started one at a time as the population grows, so that each has at least
+    shard_min_states states, up to shards_num (one per core by default).
+    """
+    def __init__(self, platform: str, galaxies_bought: int, dimboosts_bought: int,
+                 purchase_strategy: 'PurchaseStrategy',
+                 sacrifice_strategy: 'SacrificeStrategy',
+                 shards_num: Union[int, None]=None,
+                 shard_min_states: Union[int, None]=None) -> None:
+        if shards_num is None:
+            shards_num = os.cpu_count()
+        if shard_min_states is None:
+            shard_min_states = Constants.shard_min_states
+        self.shards_max = shards_num
+        self.shard_min_states = shard_min_states
+        self.shards_num = 0
+        self.max_dims = Helper.max_dims(dimboosts_bought)
+        self.backend = default_backend()
+        self.ticks_passed = 0
+
+        self.runner_args = {
+            'platform': platform,
+            'galaxies_bought': galaxies_bought,
+            'dimboosts_bought': dimboosts_bought,
+            'purchase_strategy': purchase_strategy,
+            'sacrifice_strategy': sacrifice_strategy
+        }
+        self.context = multiprocessing.get_context('spawn')
+        self.connections = []
+        self.processes = []
+        self.start_shards(1)
+
+        self.capacity = 0
+        self.shared_blocks = {}
+
+    def start_shards(self, shards_num: int) -> None:
+        for shard_index in range(self.shards_num, shards_num):
+            connection, worker_connection = self.context.Pipe()
+            process = self.context.Process(target=shard_worker, args=(worker_connection, shard_index, self.ticks_passed, self.runner_args),
+                                           daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.shards_num = max(self.shards_num, shards_num)
+
+    def add_shards(self, counts: list) -> list:
+        # new shards start empty, balance fills them
+        shards_num = min(self.shards_max, max(1, sum(counts) // self.shard_min_states))
+        if shards_num <= self.shards_num:
+            return counts
+        counts = counts + [0] * (shards_num - self.shards_num)
+        self.start_shards(shards_num)
+        return counts
+
+    def call(self, shard_index: int, command: str, *args):
+        self.connections[shard_index].send((command, args))
+        return self.connections[shard_index].recv()
+
+    def call_all(self, command: str, args_list: list) -> list:
+        # all shards work at the same time, the results are collected afterwards
+        for connection, args in zip(self.connections, args_list):
+            connection.send((command, args))
+        return [connection.recv() for connection in self.connections]
+
+    def allocate_shared_arrays(self, num_states: int) -> None:
+        if num_states <= self.capacity:
+            return
+        self.free_shared_arrays()
+        self.capacity = max(num_states, 2 * self.capacity)
+        sizes = {
+            'amounts': self.capacity * (self.max_dims + 2) * np.dtype(ArraysTypes.amounts).itemsize,
+            'bought_amounts': self.capacity * (self.max_dims + 1) * np.dtype(ArraysTypes.bought_amounts).itemsize,
+            'dominated': self.capacity
+        }
+        for name, size in sizes.items():
+            self.shared_blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+
+    def free_shared_arrays(self) -> None:
+        for shared_block in self.shared_blocks.values():
+            shared_block.close()
+            shared_block.unlink()
+        self.shared_blocks = {}
+        self.capacity = 0
+
+    def merge(self, statuses: list) -> list:
+        # cross-shard clear: the same dominance as in Runner.clear_all, on all states of all shards
+        counts = [status['num_states'] for status in statuses]
+        num_objects = sum(counts)
+        offsets = np.cumsum([0] + counts[:-1]).tolist()
+        self.allocate_shared_arrays(num_objects)
+        amounts_name = self.shared_blocks['amounts'].name
+        bought_amounts_name = self.shared_blocks['bought_amounts'].name
+        dominated_name = self.shared_blocks['dominated'].name
+        self.call_all('export_states', [(amounts_name, bought_amounts_name, self.capacity, offset) for offset in offsets])
+
+        amounts = np.ndarray((self.capacity, self.max_dims + 2), dtype=ArraysTypes.amounts, buffer=self.shared_blocks['amounts'].buf)
+        bought_amounts = np.ndarray((self.capacity, self.max_dims + 1), dtype=ArraysTypes.bought_amounts,
+                                    buffer=self.shared_blocks['bought_amounts'].buf)
+        dominated_bools = np.ndarray((self.capacity,), dtype=bool, buffer=self.shared_blocks['dominated'].buf)
+        dominated_bools[:num_objects] = False
+        sorted_indices = np.argsort(amounts[:num_objects, 1])[::-1].astype(ArraysTypes.sorted_indices)
+        self.backend.find_dominated_states(amounts, bought_amounts, sorted_indices, num_objects, self.max_dims, dominated_bools)
+        del amounts, bought_amounts, dominated_bools
+
+        return self.call_all('remove_dominated', [(dominated_name, self.capacity, offset) for offset in offsets])
+
+    def balance(self, counts: list) -> None:
+        mean_count = sum(counts) / self.shards_num
+        if max(counts) <= max(1, mean_count * Constants.shard_balance_tolerance):
+            return
+        target_count = int(np.ceil(mean_count))
+        moved_states = []
+        for shard_index, count in enumerate(counts):
+            if count > target_count:
+                moved_states.append(self.call(shard_index, 'pop_states', count - target_count))
+        if not moved_states:
+            return
+        moved_states = self.concatenate_states(moved_states)
+        first_line = 0
+        for shard_index, count in enumerate(counts):
+            if (count < target_count) and (first_line < len(moved_states['amounts'])):
+                last_line = min(first_line + target_count - count, len(moved_states['amounts']))
+                self.call(shard_index, 'push_states', {name: array[first_line:last_line] for name, array in moved_states.items()})
+                first_line = last_line
+
+    @classmethod
+    def concatenate_states(cls, states_list: list) -> dict:
+        # actions lists of different shards can have different reserved lengths
+        states = {}
+        for name in states_list[0]:
+            arrays = [shard_states[name] for shard_states in states_list]
+            if arrays[0].ndim == 2:
+                width = max(array.shape[1] for array in arrays)
+                arrays = [np.pad(array, ((0, 0), (0, width - array.shape[1]))) for array in arrays]
+            states[name] = np.concatenate(arrays)
+        return states
+
+    def stop(self) -> None:
+        for connection in self.connections:
+            connection.send(('stop', ()))
+        for process in self.processes:
+            process.join()
+        self.free_shared_arrays()
+
+    def run(self, ticks_limit: Union[int, None]=None) -> dict:
+        start_time = time.perf_counter()
+        aborted = False
+        try:
+            while True:
+                ticks_target = self.ticks_passed + Constants.shard_sync_ticks
+                if ticks_limit is not None:
+                    ticks_target = min(ticks_target, ticks_limit)
+                statuses = self.call_all('advance', [(ticks_target,)] * self.shards_num)
+                winners = [(shard_index, status) for shard_index, status in enumerate(statuses) if status['winner_line'] is not None]
+                if winners:
+                    # the earliest winners, then the biggest amount of 1st dim as in Runner
+                    winner_ticks = min(status['ticks_passed'] for _, status in winners)
+                    winners = [(shard_index, status) for shard_index, status in winners if status['ticks_passed'] == winner_ticks]
+                    number_of_winners = sum(status['number_of_winners'] for _, status in winners)
+                    winner_shard, winner_status = max(winners, key=lambda winner: winner[1]['winner_amount'])
+                    winner_line = winner_status['winner_line']
+                    break
+                self.ticks_passed = ticks_target
+                if (ticks_limit is not None) and (self.ticks_passed >= ticks_limit):
+                    number_of_winners = 0
+                    candidates = [(shard_index, status) for shard_index, status in enumerate(statuses)
+                                  if status['max_antimatter_line'] is not None]
+                    if not candidates:
+                        raise RuntimeError(f"No states left in any shard at tick {self.ticks_passed}")
+                    winner_shard, winner_status = max(candidates, key=lambda candidate: candidate[1]['max_antimatter'])
+                    winner_line = winner_status['max_antimatter_line']
+                    aborted = True
+                    break
+                self.balance(self.add_shards(self.merge(statuses)))
+
+            elapsed_seconds = time.perf_counter() - start_time
+            winner_dict = self.call(winner_shard, 'generate_winner_dict', winner_line, number_of_winners, elapsed_seconds, aborted)
+        finally:
+            self.stop()
+
+        strategy_search_info = winner_dict['strategy_search_info']
+        strategy_search_info['used_memory_mb'] = round(sum(status['used_memory_mb'] for status in statuses), 3)
+        strategy_search_info['states_analyzed'] = sum(status['num_states_alltime'] for status in statuses)
+        strategy_search_info['shards'] = self.shards_num
+        return winner_dict
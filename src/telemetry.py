@@ -0,0 +1,162 @@
+from typing import Union, TYPE_CHECKING
+from pathlib import Path
+import json
+import sys
+import numpy as np
+
+if TYPE_CHECKING:
+    from runner import Runner
+
+
+class Telemetry:
+    """
+    Optional statistics of a Runner population, one record per clear, appended to a compact binary log:
+    magic, length of the JSON header, JSON header with the config, then fixed-size little-endian records.
+
+    Every record has the numbers of states created by buy and by sacrifice since the previous clear,
+    states before the clear and killed by it, estimated comparisons, and histograms of survivors: their age
+    (ticks since their last action, i.e. since they branched off) and bought amounts of every tier.
+    Histograms use power-of-two bins: bin 0 holds 0, bin k holds values from 2^(k-1) to 2^k - 1,
+    the last bin also holds all larger values.
+    Comparisons are not counted by the kernels, so they are not slowed down: they are estimated from the result
+    of the clear as the comparisons of the survivor scan (every state against all earlier survivors in sorted order).
+    The tiled kernel stops at the first dominating tile and the buckets kernel scans only dominating buckets,
+    so they compare fewer pairs than estimated.
+    """
+    magic = b'ADTL'
+    version = 1
+    bins_num = 16
+
+    def __init__(self, path: Union[str, Path], runner: 'Runner') -> None:
+        self.path = Path(path)
+        self.dtype = self.record_dtype(runner.max_dims)
+        self.created_by_buy = 0
+        self.created_by_sacrifice = 0
+
+        header = json.dumps({
+            'version': self.version,
+            'platform': runner.platform,
+            'galaxies_bought': runner.galaxies_bought,
+            'dimboosts_bought': runner.dimboosts_bought,
+            'max_dims': runner.max_dims,
+            'bins_num': self.bins_num
+        }).encode('utf-8')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'wb') as file:
+            file.write(self.magic)
+            file.write(np.array([len(header)], dtype='<u4').tobytes())
+            file.write(header)
+
+    @classmethod
+    def record_dtype(cls, max_dims: int) -> np.dtype:
+        return np.dtype([
+            ('tick', '<i4'),
+            ('states_before', '<i4'),
+            ('killed', '<i4'),
+            ('created_by_buy', '<i4'),
+            ('created_by_sacrifice', '<i4'),
+            ('estimated_comparisons', '<i8'),
+            ('age_hist', '<u4', (cls.bins_num,)),
+            ('bought_hist', '<u4', (max_dims + 1, cls.bins_num))
+        ])
+
+    @classmethod
+    def bins(cls, values: np.ndarray) -> np.ndarray:
+        bins = np.zeros(values.shape, dtype=np.int64)
+        positive = (values > 0)
+        bins[positive] = np.frexp(values[positive])[1]
+        return np.minimum(bins, cls.bins_num - 1)
+
+    @classmethod
+    def histogram(cls, values: np.ndarray) -> np.ndarray:
+        return np.bincount(cls.bins(values), minlength=cls.bins_num)
+
+    @classmethod
+    def bin_label(cls, bin_index: int) -> str:
+        if bin_index == 0:
+            return '0'
+        if bin_index == cls.bins_num - 1:
+            return f'{2 ** (bin_index - 1)}+'
+        return f'{2 ** (bin_index - 1)}-{2 ** bin_index - 1}'
+
+    def add_created(self, by_buy: int, by_sacrifice: int) -> None:
+        self.created_by_buy += by_buy
+        self.created_by_sacrifice += by_sacrifice
+
+    def record_clear(self, runner: 'Runner', dominated_bools: np.ndarray, num_compared: int) -> None:
+        # num_compared first lines were checked by the clear (all of them unless the clear is pipelined)
+        record = np.zeros(1, dtype=self.dtype)
+        record['tick'] = runner.ticks_passed
+        record['states_before'] = len(dominated_bools)
+        record['killed'] = np.count_nonzero(dominated_bools)
+        record['created_by_buy'] = self.created_by_buy
+        record['created_by_sacrifice'] = self.created_by_sacrifice
+
+        sorted_indices = np.argsort(runner.amounts[:num_compared, 1])[::-1]
+        sorted_survivors = ~dominated_bools[sorted_indices]
+        record['estimated_comparisons'] = np.sum(np.cumsum(sorted_survivors, dtype=np.int64) - sorted_survivors)
+
+        lines = np.flatnonzero(~dominated_bools)
+        last_action_ticks = runner.actions_tick_lists[lines, runner.actions_item_lists[lines, 0]]
+        record['age_hist'] = self.histogram(runner.ticks_passed - last_action_ticks)
+        bought_amounts = runner.bought_amounts[lines, :runner.max_dims + 1]
+        for tier in range(runner.max_dims + 1):
+            record['bought_hist'][0, tier] = self.histogram(bought_amounts[:, tier])
+
+        with open(self.path, 'ab') as file:
+            file.write(record.tobytes())
+        self.created_by_buy = 0
+        self.created_by_sacrifice = 0
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> tuple:
+        data = Path(path).read_bytes()
+        if data[:len(cls.magic)] != cls.magic:
+            raise ValueError(f"{path} is not a telemetry log")
+        header_start = len(cls.magic) + 4
+        header_length = int(np.frombuffer(data, dtype='<u4', count=1, offset=len(cls.magic))[0])
+        header = json.loads(data[header_start : header_start + header_length].decode('utf-8'))
+        records = np.frombuffer(data, dtype=cls.record_dtype(header['max_dims']), offset=header_start + header_length)
+        return header, records
+
+    @classmethod
+    def histogram_quantile(cls, histogram: np.ndarray, quantile: float) -> str:
+        position = np.searchsorted(np.cumsum(histogram), quantile * histogram.sum())
+        return cls.bin_label(int(min(position, cls.bins_num - 1)))
+
+    @classmethod
+    def summarize(cls, path: Union[str, Path]) -> str:
+        header, records = cls.load(path)
+        lines = [f"{header['platform']} galaxy {header['galaxies_bought']} dimboost {header['dimboosts_bought']}: "
+                 f"{len(records)} clears"]
+        if len(records) == 0:
+            return "\n".join(lines)
+
+        kill_rates = records['killed'] / np.maximum(records['states_before'], 1)
+        lines += [
+            f"ticks: {records['tick'][0]}-{records['tick'][-1]}",
+            f"created: {records['created_by_buy'].sum()} by buy, {records['created_by_sacrifice'].sum()} by sacrifice",
+            f"killed: {records['killed'].sum()} of {records['states_before'].sum()} "
+            f"({records['killed'].sum() / records['states_before'].sum():.1%}), per clear min {kill_rates.min():.1%}, "
+            f"median {np.median(kill_rates):.1%}, max {kill_rates.max():.1%}",
+            "kill rate by quarter of clears: " + ", ".join(f"{quarter.mean():.1%}" for quarter in np.array_split(kill_rates, 4)
+                                                           if len(quarter) > 0),
+            f"estimated comparisons: {records['estimated_comparisons'].sum()}, "
+            f"per clear mean {records['estimated_comparisons'].mean():.0f}, max {records['estimated_comparisons'].max()}"
+        ]
+
+        # survivors of the last clear
+        last_record = records[-1]
+        lines.append(f"survivors of the last clear: {last_record['states_before'] - last_record['killed']}, "
+                     f"age median {cls.histogram_quantile(last_record['age_hist'], 0.5)}, "
+                     f"max {cls.histogram_quantile(last_record['age_hist'], 1.0)} ticks")
+        for tier, histogram in enumerate(last_record['bought_hist']):
+            tier_name = 'tickspeed' if tier == 0 else f'dimension {tier}'
+            lines.append(f"  bought {tier_name:<11}: median {cls.histogram_quantile(histogram, 0.5)}, "
+                         f"max {cls.histogram_quantile(histogram, 1.0)}")
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(Telemetry.summarize(path))
@@ -1,9 +1,27 @@
-from utils import Helper
+from pathlib import Path
+import tempfile
+import numpy as np
+
+from utils import ArraysTypes, Helper
 from runner import Runner
-from purchase_strategies import OptimizedPurchaseStrategy, PurchaseStrategyFromFile
+from sharded import ShardedRunner
+from batched import BatchedRunner
+from compact import CompactRunner
+from verification import verify_purchase_strategy
+from rule_strategies import RulePurchaseStrategy
+from purchase_strategies import OptimizedPurchaseStrategy, PurchaseStrategyFromFile, PurchaseStrategyWithList
 from purchase_strategies import FixedT12345678PurchaseStrategy, Fixed12T345678PurchaseStrategy, FixedT87654321PurchaseStrategy
-from sacrifice_strategies import NeverSacrificeStrategy, IncrementalSacrificeStrategy
+from purchase_strategies import Fixed87654321TPurchaseStrategy, Fixed12345678TPurchaseStrategy
+from sacrifice_strategies import NeverSacrificeStrategy, IncrementalSacrificeStrategy, SacrificeStrategyWithList
+from backends import backend_classes, DominanceBuckets
+from replay import ReplayRunner, BatchReplayRunner, mutations
+from results import Results
+from iterator import Iterator
+from pipeline import Pipeline
+from telemetry import Telemetry
+from warm_start import warm_start_incumbent, fixed_purchase_strategies
 from live import live_display
+from array_pool import ArrayPool
 
 
 def test_1():
@@ -80,6 +98,328 @@ def test_5():
     runner.run_and_save(filename=filename)
 
 
+def random_population(num_objects: int, max_dims: int, sacrifices_length: int, seed: int=0) -> dict:
+    rng = np.random.default_rng(seed)
+    amounts = rng.integers(0, 4, size=(num_objects, max_dims + 2)).astype(ArraysTypes.amounts)
+    amounts[:, 0] = rng.choice([0, 1e3, 1e10, 1e30], size=num_objects) * rng.integers(1, 4, size=num_objects)
+    amounts[:, 1] = rng.choice([0, 1e5, 1e20, 1e40], size=num_objects) * rng.integers(1, 4, size=num_objects)
+    amounts[:, max_dims + 1] = rng.choice([0, 1e9, 1e30], size=num_objects)
+    return {
+        'amounts': amounts,
+        'bought_amounts': rng.integers(0, 3, size=(num_objects, max_dims + 1)).astype(ArraysTypes.bought_amounts),
+        'costs': (10.0 ** rng.integers(1, 32, size=(num_objects, max_dims + 1))).astype(ArraysTypes.costs),
+        'allowed_purchases': rng.integers(0, max_dims + 1, size=(num_objects, max_dims + 1)).astype(ArraysTypes.allowed_purchases),
+        'allowed_sacrifices': rng.choice([1.001, 1.5, 3.0, 50.0], size=(num_objects, sacrifices_length)).astype(ArraysTypes.allowed_sacrifices),
+        'sorted_indices': np.argsort(amounts[:, 1])[::-1].astype(ArraysTypes.sorted_indices)
+    }
+
+
+def test_backends():
+    max_dims = 8
+    sacrifices_length = 3
+    for seed, num_objects in enumerate([1, 2, 17, 500, 3000]):
+        population = random_population(num_objects, max_dims, sacrifices_length, seed)
+        results = {}
+        for name, backend_class in backend_classes.items():
+            try:
+                backend = backend_class()
+            except (OSError, ImportError):
+                print(f"backend {name} is not available, skipped")
+                continue
+            dominated_bools = np.zeros(num_objects, dtype=bool)
+            backend.find_dominated(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                   num_objects, max_dims, dominated_bools)
+            buckets = DominanceBuckets(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                       num_objects, max_dims)
+            dominated_bools_buckets = np.zeros(num_objects, dtype=bool)
+            backend.find_dominated_buckets(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                           num_objects, max_dims, buckets, dominated_bools_buckets)
+            assert np.array_equal(dominated_bools_buckets, dominated_bools), f"{name}: find_dominated_buckets differs from find_dominated"
+            dominated_bools_tiled = np.zeros(num_objects, dtype=bool)
+            backend.find_dominated_tiled(population['amounts'], population['bought_amounts'], population['sorted_indices'],
+                                         num_objects, max_dims, dominated_bools_tiled)
+            assert np.array_equal(dominated_bools_tiled, dominated_bools), f"{name}: find_dominated_tiled differs from find_dominated"
+            can_buy_bools = np.zeros(num_objects, dtype=bool)
+            found_buy = backend.can_buy_all(population['amounts'], population['costs'], population['allowed_purchases'],
+                                            num_objects, max_dims, can_buy_bools)
+            sacrifice_boosts = np.zeros(num_objects, dtype=ArraysTypes.sacrifice_boosts)
+            found_sacrifice = backend.can_sacrifice_all(population['amounts'], population['allowed_sacrifices'],
+                                                        num_objects, max_dims, sacrifices_length, sacrifice_boosts)
+            results[name] = (dominated_bools, can_buy_bools, found_buy, sacrifice_boosts, found_sacrifice)
+        
+        reference = results['numpy']
+        for name, result in results.items():
+            assert np.array_equal(result[0], reference[0]), f"{name}: find_dominated differs from numpy"
+            assert np.array_equal(result[1], reference[1]), f"{name}: can_buy_all differs from numpy"
+            assert result[2] == reference[2], f"{name}: can_buy_all result differs from numpy"
+            assert np.allclose(result[3], reference[3], rtol=1e-12), f"{name}: can_sacrifice_all differs from numpy"
+            assert result[4] == reference[4], f"{name}: can_sacrifice_all result differs from numpy"
+    print(f"backends match: {', '.join(results)}")
+
+
+def test_replay():
+    platform = 'pc'
+    galaxies_bought = 0
+    for dimboosts_bought in range(Helper.last_dimboost(galaxies_bought) + 1):
+        for has_sacrifice in [False, True]:
+            if has_sacrifice and (dimboosts_bought < 5):
+                continue
+            filename = Helper.get_filename(OptimizedPurchaseStrategy(), platform, galaxies_bought, dimboosts_bought, has_sacrifice)
+            result = Results.load(filename)
+            replay_dict = ReplayRunner.from_result(result).run()
+            if has_sacrifice:
+                sacrifice_strategy = SacrificeStrategyWithList(Results.get_sacrifice_list(result))
+            else:
+                sacrifice_strategy = NeverSacrificeStrategy()
+            runner = Runner(platform=platform,
+                            galaxies_bought=galaxies_bought,
+                            dimboosts_bought=dimboosts_bought,
+                            purchase_strategy=PurchaseStrategyWithList(Results.get_purchase_list(result)),
+                            sacrifice_strategy=sacrifice_strategy
+                            )
+            runner_dict = runner.run()
+            assert replay_dict['game_info'] == runner_dict['game_info'], f"{filename}: replay differs from runner"
+            assert (Results.get_purchase_list(replay_dict) ==
+                    Results.get_purchase_list(runner_dict)), f"{filename}: replay differs from runner"
+            # closed-form tick skipping is not bit-exact with ticking one by one
+            assert np.allclose(Results.get_sacrifice_list(replay_dict),
+                               Results.get_sacrifice_list(runner_dict),
+                               rtol=1e-9), f"{filename}: replay differs from runner"
+    print("replay matches runner")
+
+def test_batch_replay():
+    platform = 'pc'
+    galaxies_bought = 0
+    for dimboosts_bought, has_sacrifice in [(3, False), (5, True)]:
+        filename = Helper.get_filename(OptimizedPurchaseStrategy(), platform, galaxies_bought, dimboosts_bought, has_sacrifice)
+        purchase_list = Results.load_purchase_list(filename)
+        sacrifice_list = Results.load_sacrifice_list(filename) if has_sacrifice else None
+        candidates = [(purchase_list, sacrifice_list)] + mutations(purchase_list, sacrifice_list)[::10]
+        batch_ticks_passed = BatchReplayRunner(platform, galaxies_bought, dimboosts_bought,
+                                               [candidate[0] for candidate in candidates],
+                                               None if sacrifice_list is None else [candidate[1] for candidate in candidates]).run()
+        for candidate, ticks_passed in zip(candidates, batch_ticks_passed):
+            replay_dict = ReplayRunner(platform, galaxies_bought, dimboosts_bought, candidate[0], candidate[1]).run()
+            assert replay_dict['game_info']['ticks_passed'] == ticks_passed, f"{filename}: batch replay differs from replay"
+    print("batch replay matches replay")
+
+def test_results():
+    for purchase_strategy in [OptimizedPurchaseStrategy(), FixedT12345678PurchaseStrategy()]:
+        for dimboosts_bought, has_sacrifice in [(0, False), (5, False), (5, True)]:
+            filename = Helper.get_filename(purchase_strategy, 'pc', 0, dimboosts_bought, has_sacrifice)
+            result = Results.load(filename)
+            with open(filename, 'r', encoding='utf-8') as file:
+                assert Results.generate_winner_str(result) == file.read(), f"{filename}: text differs from result"
+            assert result['game_info'] == Results.get_game_info(filename), f"{filename}: manifest differs from result"
+            text_result = Results.parse_text_file(filename)
+            assert Results.get_purchase_list(result) == Results.get_purchase_list(text_result)
+            assert Results.get_sacrifice_list(result) == Results.get_sacrifice_list(text_result)
+    print("results match text files")
+
+
+def test_dominance_epsilon():
+    winner_dicts = {}
+    for dominance_epsilon in [0.0, 0.01]:
+        runner = Runner(platform='pc',
+                        galaxies_bought=0,
+                        dimboosts_bought=1,
+                        purchase_strategy=OptimizedPurchaseStrategy(),
+                        sacrifice_strategy=NeverSacrificeStrategy(),
+                        dominance_epsilon=dominance_epsilon)
+        winner_dicts[dominance_epsilon] = runner.run()
+    exact_dict, approximate_dict = winner_dicts[0.0], winner_dicts[0.01]
+    assert approximate_dict['game_info']['ticks_passed'] >= exact_dict['game_info']['ticks_passed'], "approximate search beats exact one"
+    assert approximate_dict['strategy_search_info']['states_analyzed'] <= exact_dict['strategy_search_info']['states_analyzed']
+    print(f"epsilon dominance: {approximate_dict['game_info']['ticks_passed'] - exact_dict['game_info']['ticks_passed']:+} ticks, "
+          f"{approximate_dict['strategy_search_info']['states_analyzed']} instead of {exact_dict['strategy_search_info']['states_analyzed']} states")
+
+
+def test_pipelined_clear():
+    ticks_passed = {}
+    for pipelined_clear in [False, True]:
+        runner = Runner(platform='mobile',
+                        galaxies_bought=2,
+                        dimboosts_bought=2,
+                        purchase_strategy=OptimizedPurchaseStrategy(),
+                        sacrifice_strategy=NeverSacrificeStrategy(),
+                        pipelined_clear=pipelined_clear)
+        ticks_passed[pipelined_clear] = runner.run()['game_info']['ticks_passed']
+    assert ticks_passed[True] == ticks_passed[False], "pipelined clear changes the winner"
+    print("pipelined clear matches synchronous clear")
+
+
+def test_sharded():
+    platform = 'mobile'
+    galaxies_bought = 2
+    dimboosts_bought = 2
+    runner = Runner(platform, galaxies_bought, dimboosts_bought, OptimizedPurchaseStrategy(), NeverSacrificeStrategy())
+    sharded_runner = ShardedRunner(platform, galaxies_bought, dimboosts_bought, OptimizedPurchaseStrategy(), NeverSacrificeStrategy(),
+                                   shards_num=3, shard_min_states=1)
+    assert sharded_runner.run()['game_info']['ticks_passed'] == runner.run()['game_info']['ticks_passed'], "sharded run differs"
+    print("sharded run matches runner")
+
+
+def test_batched():
+    configs = [('pc', 0, 2), ('mobile', 0, 2), ('mobile', 2, 2)]
+    winner_dicts = BatchedRunner(configs, OptimizedPurchaseStrategy(), NeverSacrificeStrategy()).run()
+    for (platform, galaxies_bought, dimboosts_bought), winner_dict in zip(configs, winner_dicts):
+        runner = Runner(platform, galaxies_bought, dimboosts_bought, OptimizedPurchaseStrategy(), NeverSacrificeStrategy())
+        assert winner_dict['game_info']['ticks_passed'] == runner.run()['game_info']['ticks_passed'], "batched run differs"
+    print("batched runs match runners")
+
+
+def test_verification():
+    report = verify_purchase_strategy(OptimizedPurchaseStrategy(), 'pc', 0, 0)
+    assert report['faster_trajectory_exists'] is False, "exhaustive search is faster than OptimizedPurchaseStrategy"
+    print(f"verified in {report['exhaustive_search_info']['strategy_search_time']}, "
+          f"states analyzed {report['exhaustive_search_info']['states_analyzed']}")
+    # a fixed strategy is slower, exhaustive search finds the optimal winner
+    fixed_report = verify_purchase_strategy(FixedT12345678PurchaseStrategy(), 'pc', 0, 0)
+    assert fixed_report['faster_trajectory_exists'] is True, "exhaustive search is not faster than FixedT12345678PurchaseStrategy"
+    assert fixed_report['faster_ticks_passed'] == report['ticks_passed'], "exhaustive search differs from OptimizedPurchaseStrategy"
+    # a search stopped by the deadline is inconclusive
+    deadline_report = verify_purchase_strategy(OptimizedPurchaseStrategy(), 'pc', 0, 0, deadline_seconds=0)
+    assert deadline_report['faster_trajectory_exists'] is None, "search stopped by the deadline is conclusive"
+
+
+def test_rule_strategies():
+    runner = Runner('pc', 0, 1, OptimizedPurchaseStrategy(), NeverSacrificeStrategy())
+    runner.time_of_last_refresh = 0
+    for _ in range(8000):
+        runner.cycle()
+    lines = np.arange(runner.num_states_current)
+    for purchase_strategy in [OptimizedPurchaseStrategy(), FixedT12345678PurchaseStrategy(), Fixed12T345678PurchaseStrategy(),
+                              FixedT87654321PurchaseStrategy(), Fixed87654321TPurchaseStrategy(), Fixed12345678TPurchaseStrategy()]:
+        expected = np.array([purchase_strategy.next_purchases(runner, line) for line in lines])
+        result = RulePurchaseStrategy.from_strategy(purchase_strategy).next_purchases_all(runner, lines)
+        assert np.array_equal(result, expected), f"rule table differs from {type(purchase_strategy).__name__}"
+    print(f"rule tables match purchase strategies on {len(lines)} states")
+
+
+def test_saved_iterator():
+    for purchase_strategy in [OptimizedPurchaseStrategy(), FixedT12345678PurchaseStrategy()]:
+        filename = Helper.get_filename(purchase_strategy, 'pc', 0, 5, False)
+        iterator = Iterator.from_saved_run(purchase_strategy, 'pc', 0, 5)
+        winner_dict = iterator.iterative_optimization_info['iterations'][iterator.winner_iteration_index]
+        assert winner_dict['game_info'] == Results.get_game_info(filename), f"{filename}: restored winner differs"
+        assert Results.get_purchase_list(winner_dict) == Results.load_purchase_list(filename), f"{filename}: restored actions differ"
+    print("iterators restored from saved runs")
+
+
+def pipeline_test_job(log_path: str, name: str, fail: bool=False) -> list:
+    if fail:
+        raise ValueError(name)
+    with open(log_path, 'a', encoding='utf-8') as file:
+        file.write(name + '\n')
+    return [name]
+
+def test_pipeline():
+    with tempfile.TemporaryDirectory() as directory:
+        journal_path = Path(directory) / 'journal.json'
+        log_path = Path(directory) / 'log.txt'
+        def create_pipeline(fail: bool) -> Pipeline:
+            pipeline = Pipeline(journal_path)
+            pipeline.add_job('a', pipeline_test_job, (log_path, 'a'))
+            pipeline.add_job('b', pipeline_test_job, (log_path, 'b', fail), dependencies=['a'])
+            pipeline.add_job('c', pipeline_test_job, (log_path, 'c'), dependencies=['b'])
+            pipeline.add_job('d', pipeline_test_job, (log_path, 'd'), dependencies=['a'])
+            return pipeline
+        
+        try:
+            create_pipeline(fail=True).run()
+            assert False, "failed pipeline job is not reported"
+        except RuntimeError:
+            pass
+        assert log_path.read_text().split() == ['a', 'd'], "jobs after a failed job were started"
+        create_pipeline(fail=False).run()
+        assert log_path.read_text().split() == ['a', 'd', 'b', 'c'], "finished jobs were run again"
+        assert not journal_path.exists(), "journal of a finished pipeline is kept"
+    print("pipeline resumes from its journal")
+
+
+def test_telemetry():
+    with tempfile.TemporaryDirectory() as directory:
+        telemetry_path = Path(directory) / 'telemetry.bin'
+        winner_dict = Runner('pc', 0, 1, OptimizedPurchaseStrategy(), NeverSacrificeStrategy(), telemetry_path=telemetry_path).run()
+        expected_dict = Runner('pc', 0, 1, OptimizedPurchaseStrategy(), NeverSacrificeStrategy()).run()
+        assert winner_dict['actions_readable_list'] == expected_dict['actions_readable_list'], "telemetry changes the run"
+        header, records = Telemetry.load(telemetry_path)
+        assert header['max_dims'] == Helper.max_dims(1)
+        assert len(records) > 0, "no clears recorded"
+        survivors_nums = records['states_before'] - records['killed']
+        assert (records['age_hist'].sum(axis=1) == survivors_nums).all(), "age histogram differs from survivors"
+        assert (records['bought_hist'].sum(axis=2) == survivors_nums[:, np.newaxis]).all(), "bought histogram differs from survivors"
+        assert records['created_by_buy'].sum() < winner_dict['strategy_search_info']['states_analyzed']
+        max_comparisons = records['states_before'].astype(np.int64) * (records['states_before'] - 1) // 2
+        assert (records['estimated_comparisons'] <= max_comparisons).all(), "more comparisons than pairs of states"
+        print(Telemetry.summarize(telemetry_path).split('\n')[0])
+
+
+def test_warm_start():
+    for has_sacrifice in [False, True]:
+        incumbent_dict = warm_start_incumbent(OptimizedPurchaseStrategy(), 'pc', 0, 5, has_sacrifice)
+        for purchase_strategy in fixed_purchase_strategies:
+            filename = Helper.get_filename(purchase_strategy, 'pc', 0, 5, has_sacrifice)
+            assert incumbent_dict['game_info']['ticks_passed'] <= Results.get_game_info(filename)['ticks_passed'], \
+                f"warm start is slower than {filename}"
+        print(f"warm start: {incumbent_dict['game_info']['ticks_passed']} ticks from {incumbent_dict['strategy_search_info']['warm_start']}")
+
+
+def test_compact():
+    # float32 logs round small additions, so winners can be a few ticks away from the exact ones
+    configs = [('pc', 0, 1, OptimizedPurchaseStrategy, NeverSacrificeStrategy()),
+               ('mobile', 2, 2, OptimizedPurchaseStrategy, NeverSacrificeStrategy()),
+               ('pc', 0, 5, FixedT12345678PurchaseStrategy, IncrementalSacrificeStrategy(0.1)),
+               ('pc', 2, 16, FixedT12345678PurchaseStrategy, NeverSacrificeStrategy())] # winners by antimatter overflow
+    for platform, galaxies_bought, dimboosts_bought, purchase_strategy_class, sacrifice_strategy in configs:
+        exact_dict = Runner(platform, galaxies_bought, dimboosts_bought, purchase_strategy_class(), sacrifice_strategy).run()
+        compact_dict = CompactRunner(platform, galaxies_bought, dimboosts_bought, purchase_strategy_class(), sacrifice_strategy).run()
+        difference = compact_dict['game_info']['ticks_passed'] - exact_dict['game_info']['ticks_passed']
+        assert abs(difference) <= 2, f"compact run of {platform} g{galaxies_bought} d{dimboosts_bought} differs by {difference} ticks"
+        print(f"compact states, {platform} g{galaxies_bought} d{dimboosts_bought}: {difference:+} ticks")
+
+
+def test_array_pool():
+    array_pool = ArrayPool()
+    configs = [('pc', 0, 5, FixedT12345678PurchaseStrategy), ('pc', 0, 1, OptimizedPurchaseStrategy),
+               ('mobile', 0, 2, OptimizedPurchaseStrategy)]
+    for platform, galaxies_bought, dimboosts_bought, purchase_strategy_class in configs:
+        expected_dict = Runner(platform, galaxies_bought, dimboosts_bought, purchase_strategy_class(), NeverSacrificeStrategy()).run()
+        buffers_before = dict(array_pool.buffers)
+        runner = Runner(platform, galaxies_bought, dimboosts_bought, purchase_strategy_class(), NeverSacrificeStrategy(),
+                        array_pool=array_pool)
+        winner_dict = runner.run()
+        assert winner_dict['game_info'] == expected_dict['game_info'], \
+            f"pooled run of {platform} g{galaxies_bought} d{dimboosts_bought} differs"
+        assert array_pool.high_water_states >= runner.num_states_reserved
+        reused = [name for name, buffer in buffers_before.items() if np.shares_memory(getattr(runner, name), buffer)]
+        assert len(reused) == len(buffers_before), "arrays of the previous run were not reused"
+        print(f"array pool, {platform} g{galaxies_bought} d{dimboosts_bought}: {len(reused)} of {len(buffers_before)} buffers reused, "
+              f"{array_pool.nbytes() / 1024 ** 2:.1f} MB")
+
+
+def test_anytime():
+    # a search closed after its first snapshots gives its arrays back, snapshot_seconds=0 yields one every tick
+    array_pool = ArrayPool()
+    runner = Runner('pc', 0, 5, OptimizedPurchaseStrategy(), NeverSacrificeStrategy(), array_pool=array_pool)
+    run_generator = runner.iter_run(snapshot_seconds=0)
+    snapshots = [next(run_generator) for _ in range(100)]
+    run_generator.close()
+    assert [snapshot['ticks_passed'] for snapshot in snapshots] == list(range(1, 101))
+    assert len(array_pool.buffers) > 0, "arrays of a closed search were not released"
+    
+    # a deadline of 0 seconds stops the search after its first tick on any machine
+    filename = Helper.get_filename(OptimizedPurchaseStrategy(), 'pc', 0, 5, False)
+    winner_dict = Runner('pc', 0, 5, OptimizedPurchaseStrategy(), NeverSacrificeStrategy()).run(deadline_seconds=0)
+    assert winner_dict['strategy_search_info']['deadline_ticks_passed'] == 1
+    assert winner_dict['game_info']['optimal'] is False
+    assert winner_dict['game_info']['ticks_passed'] >= Results.get_game_info(filename)['ticks_passed'], \
+        "trajectory completed by replay is faster than the optimal one"
+    replay_dict = ReplayRunner('pc', 0, 5, Results.get_purchase_list(winner_dict)).run()
+    assert replay_dict['game_info']['ticks_passed'] == winner_dict['game_info']['ticks_passed']
+    print(f"anytime: {len(snapshots)} snapshots, completed at tick {winner_dict['game_info']['ticks_passed']} "
+          f"(optimal {Results.get_game_info(filename)['ticks_passed']})")
+
 if __name__ == '__main__':
     live_display.start()
     
@@ -1,23 +1,31 @@
 from typing import Union, TYPE_CHECKING
-import re
 import json
 
 from utils import Constants, Helper
 from iterator import Iterator
+from array_pool import ArrayPool
+from batched import BatchedRunner
+from results import Results
+from pipeline import Pipeline
 from live import live_display
 from purchase_strategies import OptimizedPurchaseStrategy
 from purchase_strategies import FixedT12345678PurchaseStrategy, FixedT87654321PurchaseStrategy
 from purchase_strategies import Fixed12T345678PurchaseStrategy, Fixed87654321TPurchaseStrategy, Fixed12345678TPurchaseStrategy
+from sacrifice_strategies import NeverSacrificeStrategy
 
 if TYPE_CHECKING:
     from purchase_strategies import PurchaseStrategy
 
+# state arrays are reused by all runs of this process (every pipeline worker has its own pool)
+array_pool = ArrayPool()
 
-def search_and_save_several(purchase_strategy: 'PurchaseStrategy', platform_list: Union[list, None]=None, galaxies_bought_list: Union[list, None]=None, dimboosts_bought_list: Union[list, None]=None):
+
+def get_configs(platform_list: Union[list, None]=None, galaxies_bought_list: Union[list, None]=None, dimboosts_bought_list: Union[list, None]=None) -> list:
     if not platform_list:
         platform_list = Constants.platform_list
     if not galaxies_bought_list:
         galaxies_bought_list = Constants.galaxies_bought_list
+    configs = []
     for platform in platform_list:
         for galaxies_bought in galaxies_bought_list:
             if not dimboosts_bought_list:
@@ -25,8 +33,34 @@ def search_and_save_several(purchase_strategy: 'PurchaseStrategy', platform_list
             else:
                 dimboosts_bought_list_accurate = [x for x in dimboosts_bought_list if x <= Helper.last_dimboost(galaxies_bought)]
             for dimboosts_bought in dimboosts_bought_list_accurate:
-                iterator = Iterator(purchase_strategy, platform, galaxies_bought, dimboosts_bought)
-                iterator.search_and_save()
+                configs.append((platform, galaxies_bought, dimboosts_bought))
+    return configs
+
+def get_batches(configs: list) -> list:
+    # configs with the same max_dims that can be batched, at most batched_configs_max configs in one batch
+    groups = {}
+    for config in configs:
+        platform, galaxies_bought, dimboosts_bought = config
+        if BatchedRunner.can_be_batched(galaxies_bought, dimboosts_bought):
+            groups.setdefault(Helper.max_dims(dimboosts_bought), []).append(config)
+    return [group[start : start + Constants.batched_configs_max]
+            for group in groups.values() for start in range(0, len(group), Constants.batched_configs_max)]
+
+def batched_initial_runs(purchase_strategy: 'PurchaseStrategy', configs: list) -> dict:
+    # initial runs without sacrifice of configs with the same max_dims are simulated together
+    initial_winner_dicts = {}
+    for batch in get_batches(configs):
+        runner = BatchedRunner(batch, purchase_strategy, NeverSacrificeStrategy())
+        live_display.update_iteration(current=1, description=f"Initial runs without sacrifice ({len(batch)} configs)")
+        initial_winner_dicts.update(zip(batch, runner.run()))
+    return initial_winner_dicts
+
+def search_and_save_several(purchase_strategy: 'PurchaseStrategy', platform_list: Union[list, None]=None, galaxies_bought_list: Union[list, None]=None, dimboosts_bought_list: Union[list, None]=None, batched: bool=False):
+    configs = get_configs(platform_list, galaxies_bought_list, dimboosts_bought_list)
+    initial_winner_dicts = batched_initial_runs(purchase_strategy, configs) if batched else {}
+    for platform, galaxies_bought, dimboosts_bought in configs:
+        iterator = Iterator(purchase_strategy, platform, galaxies_bought, dimboosts_bought, array_pool)
+        iterator.search_and_save(initial_winner_dicts.get((platform, galaxies_bought, dimboosts_bought)))
 
 def create_strategy_summary(purchase_strategy: 'PurchaseStrategy') -> None:
     platform_list = Constants.platform_list
@@ -47,11 +81,7 @@ def create_strategy_summary(purchase_strategy: 'PurchaseStrategy') -> None:
             for dimboosts_bought in dimboosts_bought_list:
                 has_sacrifice = True if (dimboosts_bought >= 5) else False
                 filename = Helper.get_filename(purchase_strategy, platform, galaxies_bought, dimboosts_bought, has_sacrifice)
-                
-                with open(filename, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                game_info_match = re.search(r'=== GAME INFO ===\s*({.*?})\s*=== END GAME INFO ===', content, re.DOTALL)
-                game_info = json.loads(game_info_match.group(1))
+                game_info = Results.get_game_info(filename)
                 time_str = game_info['game_time']
                 galaxy_time += Helper.time_str_to_float(time_str)
             
@@ -65,6 +95,95 @@ def create_strategy_summary(purchase_strategy: 'PurchaseStrategy') -> None:
     summary_path.write_text(summary_str, encoding='utf-8')
 
 
+def initial_job(purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int) -> list:
+    Iterator(purchase_strategy, platform, galaxies_bought, dimboosts_bought, array_pool).search_without_sacrifice()
+    return [Helper.get_filename(purchase_strategy, platform, galaxies_bought, dimboosts_bought, False)]
+
+def initial_batch_job(purchase_strategy: 'PurchaseStrategy', batch: list) -> list:
+    initial_winner_dicts = batched_initial_runs(purchase_strategy, batch)
+    filenames = []
+    for platform, galaxies_bought, dimboosts_bought in batch:
+        iterator = Iterator(purchase_strategy, platform, galaxies_bought, dimboosts_bought, array_pool)
+        iterator.search_without_sacrifice(initial_winner_dicts[(platform, galaxies_bought, dimboosts_bought)])
+        filenames.append(Helper.get_filename(purchase_strategy, platform, galaxies_bought, dimboosts_bought, False))
+    return filenames
+
+def sacrifice_job(purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int) -> list:
+    Iterator.from_saved_run(purchase_strategy, platform, galaxies_bought, dimboosts_bought, array_pool).search_with_sacrifice()
+    return [Helper.get_filename(purchase_strategy, platform, galaxies_bought, dimboosts_bought, True)]
+
+def summary_job(purchase_strategy: 'PurchaseStrategy') -> list:
+    create_strategy_summary(purchase_strategy)
+    return []
+
+def disable_manifest_updates() -> None:
+    Results.manifest_updates = False
+
+def update_manifest(name: str, filenames: list) -> None:
+    # results saved by worker processes are added to the manifest by the main process only,
+    # the manifest is written once per job
+    for filename in filenames:
+        Results.update_manifest(filename, Results.load(filename))
+    Results.flush_manifest()
+
+def flush_manifest(name: str, filenames: list) -> None:
+    # results of jobs run in this process are already added to the manifest by Results.save
+    Results.flush_manifest()
+
+def get_warm_start_dependencies(config: tuple, has_sacrifice: bool, fixed_job_names: dict, job_names: dict) -> list:
+    # jobs saving the results read by warm_start_sources: fixed strategies on all platforms
+    # and the same strategy on the other platforms (only configs added before, so jobs can't form a cycle)
+    platform, galaxies_bought, dimboosts_bought = config
+    dependencies = list(fixed_job_names.get((galaxies_bought, dimboosts_bought, has_sacrifice), []))
+    dependencies += [name for (source_platform, *source_config), name in job_names.items()
+                     if (source_platform != platform) and (source_config == [galaxies_bought, dimboosts_bought])]
+    return list(dict.fromkeys(dependencies))
+
+def create_update_pipeline(purchase_strategy_list: list, configs: Union[list, None]=None, max_workers: int=1, batched: bool=False) -> Pipeline:
+    # for every strategy: runs without sacrifice -> sacrifice iterations of the same config -> summary.
+    # With warm start, runs of non-fixed strategies also wait for the runs warm start reads: runs of fixed strategies
+    # listed before them on all platforms and their own runs on the platforms listed before
+    if configs is None:
+        configs = get_configs()
+    pipeline = Pipeline(Helper.get_saved_runs_path() / 'update_journal.json', max_workers=max_workers,
+                        worker_initializer=disable_manifest_updates,
+                        on_job_done=update_manifest if max_workers > 1 else flush_manifest)
+    fixed_job_names = {}
+    for purchase_strategy in purchase_strategy_list:
+        short_name = purchase_strategy.get_short_name()
+        is_warm_started = Constants.warm_start and not purchase_strategy.is_fixed_purchase_strategy
+        initial_job_names = {}
+        for index, batch in enumerate(get_batches(configs) if batched else []):
+            name = f"{short_name}/initial_batch{index}"
+            pipeline.add_job(name, initial_batch_job, (purchase_strategy, batch))
+            initial_job_names.update({config: name for config in batch})
+        for config in configs:
+            if config not in initial_job_names:
+                name = f"{short_name}/{Helper.get_config_name(*config, False)}"
+                dependencies = get_warm_start_dependencies(config, False, fixed_job_names, initial_job_names) if is_warm_started else []
+                pipeline.add_job(name, initial_job, (purchase_strategy, *config), dependencies=dependencies)
+                initial_job_names[config] = name
+        
+        sacrifice_job_names = {}
+        for config in configs:
+            platform, galaxies_bought, dimboosts_bought = config
+            if dimboosts_bought < 5:
+                continue
+            name = f"{short_name}/{Helper.get_config_name(*config, True)}"
+            dependencies = [initial_job_names[config]]
+            if is_warm_started:
+                dependencies += get_warm_start_dependencies(config, True, fixed_job_names, sacrifice_job_names)
+            pipeline.add_job(name, sacrifice_job, (purchase_strategy, *config), dependencies=dependencies)
+            sacrifice_job_names[config] = name
+        summary_dependencies = list(dict.fromkeys(initial_job_names.values())) + list(sacrifice_job_names.values())
+        pipeline.add_job(f"{short_name}/summary", summary_job, (purchase_strategy,), dependencies=summary_dependencies, local=True)
+        
+        if purchase_strategy.is_fixed_purchase_strategy:
+            for has_sacrifice, job_names in [(False, initial_job_names), (True, sacrifice_job_names)]:
+                for (platform, galaxies_bought, dimboosts_bought), name in job_names.items():
+                    fixed_job_names.setdefault((galaxies_bought, dimboosts_bought, has_sacrifice), []).append(name)
+    return pipeline
+
 if __name__ == '__main__':
     live_display.start()
     
@@ -76,8 +195,7 @@ if __name__ == '__main__':
         Fixed12345678TPurchaseStrategy(),
         OptimizedPurchaseStrategy()
     ]
-    for purchase_strategy in purchase_strategy_list:
-        search_and_save_several(purchase_strategy=purchase_strategy)
-        create_strategy_summary(purchase_strategy)
+    # an interrupted update continues from the journal in Saved_Runs
+    create_update_pipeline(purchase_strategy_list).run()
     
     live_display.stop()
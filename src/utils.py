@@ -1,8 +1,9 @@
-from typing import Union, TYPE_CHECKING
-import re
+from typing import Union, TextIO, TYPE_CHECKING
+import io
+import os
 import json
+import socket
 from pathlib import Path
-import cpuinfo
 import numpy as np
 
 if TYPE_CHECKING:
@@ -21,7 +22,12 @@ class ArraysTypes:
     bought_amounts = np.int32
     costs = np.float64
     multipliers = np.float64
+    purchases_done = np.int32
+    sacrifices_done = np.int32
+    real_total_sacrifice_boosts = np.float64
     sorted_indices = np.int32
+    dominance_buckets = np.int32
+    config_ids = np.int32
 
 
 class Constants:
@@ -50,8 +56,21 @@ class Constants:
 
     addition_cycles_without_clear_limit = 300
     state_growth_without_clear_limit = 1.5
+    dominance_kernel = 'tiled' # 'tiled', 'buckets' or 'pairs'
+    dominance_buckets_min_states = 1000
+    dominance_max_buckets = 512
+    dominance_chunk_size = 256 # lines compared pairwise before their survivors join the tiles
+    dominance_tile_size = 64
+    shard_sync_ticks = 300 # ticks between cross-shard clears
+    shard_balance_tolerance = 1.25 # max shard size relative to mean before states are moved
+    shard_min_states = 20000 # another shard process is started only when each shard gets at least this many states
+    batched_configs_max = 4 # max configs simulated together in one BatchedRunner population
+    verification_addition_cycles_without_clear_limit = 5 # exhaustive search branches on every purchase, so it is cleared more often
+    verification_state_growth_without_clear_limit = 1.05
+    verification_deadline_seconds = 600 # exhaustive search is inconclusive after this time (pc g0 d1 takes ~20 s, d2 more than 10 min)
     numpy_reserve_step = int(1e5)
     numpy_actions_reserve_step = 30
+    snapshot_seconds = 1.0 # real time between snapshots of Runner.iter_run
 
     no_action_const = -1
     sacrifice_action_const = 9
@@ -63,6 +82,17 @@ class Constants:
 
     sacrifice_infinity = 1e10
     sacrifice_max = 50
+    sacrifice_steps = [0.1, 0.01, 0.001] # coarse-to-fine, the last one is the final accuracy
+    sacrifice_refinement_window = 2 # in steps of the previous (coarser) search
+    warm_start = True # searches of non-fixed strategies are bounded by the best saved trajectory of cheaper runs
+
+    replay_max_ticks_to_event = 2 ** 40
+    local_search_max_rounds = 10
+    local_search_batch_size = 2000
+    local_search_tickspeed_shifts = [2, 3, 5] # shift 1 is covered by adjacent swaps
+    local_search_sacrifice_shifts = [0.01, 0.001]
+
+    results_compressed = True
     
     platform_list = ['pc', 'mobile']
     galaxies_bought_list = [0, 1, 2]
@@ -95,10 +125,30 @@ class Helper:
         percent = int(float_secs / total_float_secs * 100)
         return f'{Helper.time_float_to_str(float_secs)} ({percent}%)'
     
+    @classmethod
+    def cpu_info_cache_path(cls) -> Path:
+        cache_path = os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')
+        return Path(cache_path) / 'ad_dimboost_optimizer' / 'cpu_info.json'
+    
     @classmethod
     def cpu_info(cls) -> str:
+        # cpuinfo runs subprocesses and takes about a second, so CPU names are cached on disk per host
         if not hasattr(cls, '_cpu_info'):
-            cls._cpu_info = cpuinfo.get_cpu_info()['brand_raw']
+            cache_path = cls.cpu_info_cache_path()
+            host = socket.gethostname()
+            try:
+                cpu_names = json.loads(cache_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                cpu_names = {}
+            if host not in cpu_names:
+                import cpuinfo
+                cpu_names[host] = cpuinfo.get_cpu_info()['brand_raw']
+                try:
+                    cache_path.parent.mkdir(parents=True, exist_ok=True)
+                    cache_path.write_text(json.dumps(cpu_names, indent=4), encoding='utf-8')
+                except OSError:
+                    pass
+            cls._cpu_info = cpu_names[host]
         return cls._cpu_info
     
     @classmethod
@@ -193,115 +243,118 @@ class Helper:
             return 16 # 11-16
         return 8
     
+    @classmethod
+    def get_saved_runs_path(cls) -> Path:
+        return Path('..') / 'docs' / 'Saved_Runs'
+    
     @classmethod
     def get_strategy_path(cls, purchase_strategy: 'PurchaseStrategy') -> Path:
         purchase_strategy_short_name = purchase_strategy.get_short_name()
-        return Path('..') / 'docs' / 'Saved_runs' / purchase_strategy_short_name
+        return cls.get_saved_runs_path() / purchase_strategy_short_name
     
     @classmethod
-    def get_filename(cls, purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int, has_sacrifice: bool) -> str:
+    def get_config_name(cls, platform: str, galaxies_bought: int, dimboosts_bought: int, has_sacrifice: bool) -> str:
         if (dimboosts_bought >= 5) and has_sacrifice:
             sac_str = '_sac'
         else:
             sac_str = ''
-        
+        return f'{platform}_galaxy{galaxies_bought}_dimboost{dimboosts_bought}{sac_str}'
+    
+    @classmethod
+    def get_filename(cls, purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int, has_sacrifice: bool) -> str:
         strategy_path = cls.get_strategy_path(purchase_strategy)
         directory = strategy_path / platform / f'galaxy{galaxies_bought}'
-        filename = f'{platform}_galaxy{galaxies_bought}_dimboost{dimboosts_bought}{sac_str}.txt'
+        filename = cls.get_config_name(platform, galaxies_bought, dimboosts_bought, has_sacrifice) + '.txt'
         return str(directory / filename)
     
+    @classmethod
+    def times_float_to_str(cls, float_secs: np.ndarray) -> np.ndarray:
+        # vectorized time_float_to_str
+        seconds_int_full = np.trunc(float_secs).astype(np.int64)
+        minutes = seconds_int_full // 60
+        seconds = seconds_int_full % 60
+        milseconds = ((float_secs - seconds_int_full) * 1000).astype(np.int64)
+        return np.char.add(np.char.add(np.char.mod('%02d:', minutes), np.char.mod('%02d.', seconds)), np.char.mod('%03d', milseconds))
+    
+    @classmethod
+    def get_actions_readable_lines(cls, actions_item_list: np.ndarray, actions_amount_list: np.ndarray,
+                                   actions_info_list: np.ndarray, actions_tick_list: np.ndarray, tick_duration: float) -> np.ndarray:
+        actions_item_list = np.asarray(actions_item_list)
+        actions_amount_list = np.asarray(actions_amount_list)
+        actions_info_list = np.asarray(actions_info_list)
+        times = cls.times_float_to_str(np.asarray(actions_tick_list) * tick_duration)
+        lines = np.empty(len(actions_item_list), dtype=object)
+        
+        is_sacrifice = (actions_item_list == Constants.sacrifice_action_const)
+        for pos in np.flatnonzero(is_sacrifice):
+            lines[pos] = f"sacrifice: {actions_info_list[pos]}, time: {times[pos]}"
+        
+        is_purchase = ~is_sacrifice
+        items = actions_item_list[is_purchase]
+        amounts = actions_amount_list[is_purchase]
+        costs = actions_info_list[is_purchase]
+        total_amounts = np.zeros(len(items), dtype=np.int64)
+        for item_int in np.unique(items):
+            total_amounts[items == item_int] = np.cumsum(amounts[items == item_int])
+        item_strs = np.where(items == 0, '  tickspeed', np.char.mod('dimension %d', items))
+        costs_for_stack = np.where(items == 0, costs, costs * 10)
+        columns = [
+            np.char.mod('item: %s, ', item_strs),
+            np.char.mod('amount: %2d, ', amounts),
+            np.char.mod('total: %3d, ', total_amounts),
+            np.char.mod('cost_one: %.0e, ', costs),
+            np.char.mod('cost_amount: %.0e, ', amounts * costs),
+            np.char.mod('cost_stack: %.0e, ', costs_for_stack),
+            np.char.mod('time: %s', times[is_purchase])
+        ]
+        purchase_lines = columns[0]
+        for column in columns[1:]:
+            purchase_lines = np.char.add(purchase_lines, column)
+        lines[is_purchase] = purchase_lines
+        return lines
+    
     @classmethod
     def get_actions_readable_list(cls, actions_item_list: np.ndarray, actions_amount_list: np.ndarray,
                                   actions_info_list: np.ndarray, actions_tick_list: np.ndarray, tick_duration: float) -> str:
-        lines = []
-        for i, (item_int, amount, cost, tick) in enumerate(zip(actions_item_list, actions_amount_list, actions_info_list, actions_tick_list)):
-            if item_int == Constants.sacrifice_action_const:
-                lines.append(
-                        f"sacrifice: {cost}, "
-                        f"time: {Helper.time_float_to_str(tick * tick_duration)}"
-                )
-            else:
-                total_amount = sum(actions_amount_list[j] for j in range(i+1) if actions_item_list[j] == item_int)
-                if item_int == 0:
-                    item_str = '  tickspeed'
-                    cost_for_stack = cost
-                else:
-                    item_str = f"dimension {item_int}"
-                    cost_for_stack = cost * 10
-                lines.append(
-                    f"item: {item_str}, amount: {amount:2d}, "
-                    f"total: {total_amount:3d}, cost_one: {cost:.0e}, "
-                    f"cost_amount: {amount * cost:.0e}, cost_stack: {cost_for_stack:.0e}, "
-                    f"time: {Helper.time_float_to_str(tick * tick_duration)}"
-                )
-        return "\n".join(lines)
+        return "\n".join(cls.get_actions_readable_lines(actions_item_list, actions_amount_list,
+                                                        actions_info_list, actions_tick_list, tick_duration))
     
     @classmethod
-    def generate_winner_str(cls, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None) -> str:
-        sections = [
-            f"=== GAME INFO ===\n{json.dumps(winner_dict['game_info'], indent=4)}\n=== END GAME INFO ===",
-            f"=== ACTIONS ===\n{winner_dict['actions_readable_list']}\n=== END ACTIONS ==="
-            ]
+    def write_winner_report(cls, file: TextIO, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None) -> None:
+        # writes the same text as generate_winner_str section by section;
+        # actions are formatted from winner_dict['actions'] arrays when they are present
+        file.write("=== GAME INFO ===\n")
+        json.dump(winner_dict['game_info'], file, indent=4)
+        file.write("\n=== END GAME INFO ===\n\n=== ACTIONS ===\n")
+        if 'actions' in winner_dict:
+            actions = winner_dict['actions']
+            actions_lines = cls.get_actions_readable_lines(actions['item'], actions['amount'], actions['info'], actions['tick'],
+                                                           winner_dict['game_info']['tick_duration'])
+            file.write("\n".join(actions_lines))
+        else:
+            file.write(winner_dict['actions_readable_list'])
+        file.write("\n=== END ACTIONS ===\n\n")
         if iterative_optimization_info is None:
-            sections.append(f"=== STRATEGY SEARCH INFO ===\n{json.dumps(winner_dict['strategy_search_info'], indent=4)}\n=== END STRATEGY SEARCH INFO ===")
+            file.write("=== STRATEGY SEARCH INFO ===\n")
+            json.dump(winner_dict['strategy_search_info'], file, indent=4)
+            file.write("\n=== END STRATEGY SEARCH INFO ===\n")
         else:
-            sections.append(f"=== ITERATIVE OPTIMIZATION INFO ===\n{json.dumps(iterative_optimization_info, indent=4)}\n=== END ITERATIVE OPTIMIZATION INFO ===")
-        return "\n\n".join(sections) + "\n"
+            file.write("=== ITERATIVE OPTIMIZATION INFO ===\n")
+            json.dump(iterative_optimization_info, file, indent=4)
+            file.write("\n=== END ITERATIVE OPTIMIZATION INFO ===\n")
+    
+    @classmethod
+    def generate_winner_str(cls, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None) -> str:
+        file = io.StringIO()
+        cls.write_winner_report(file, winner_dict, iterative_optimization_info)
+        return file.getvalue()
 
     @classmethod
     def save_winner_dict(cls, winner_dict: dict, iterative_optimization_info: Union[dict, None]=None, filename: str=''):
-        winner_str = cls.generate_winner_str(winner_dict, iterative_optimization_info)
         if filename:
             file_path = Path(filename)
             file_path.parent.mkdir(parents=True, exist_ok=True)
-            file_path.write_text(winner_str, encoding='utf-8')
+            with open(file_path, 'w', encoding='utf-8') as file:
+                cls.write_winner_report(file, winner_dict, iterative_optimization_info)
         else:
-            print(winner_str)
-
-    @classmethod
-    def parse_file_for_action_list(cls, filename: str) -> str:
-        with open(filename, 'r') as file:
-            content = file.read()
-        
-        actions_match = re.search(
-            r'=== ACTIONS ===\n(.*?)\n=== END ACTIONS ===', 
-            content, 
-            re.DOTALL
-        )
-        
-        if actions_match:
-            return actions_match.group(1).strip()
-        return ""
-
-    @classmethod
-    def parse_action_list_for_purchases(cls, actions_readable_list: str) -> list:
-        bought_items = []
-        for line in actions_readable_list.split('\n'):
-            line = line.strip()
-            if line.startswith('item:'):
-                if 'tickspeed' in line:
-                    item_int = 0
-                else:
-                    dim_match = re.search(r'dimension\s+(\d+)', line)
-                    if dim_match:
-                        item_int = int(dim_match.group(1))
-                    else:
-                        continue
-                    
-                amount_match = re.search(r'amount:\s*(\d+)', line)
-                if amount_match:
-                    amount = int(amount_match.group(1))
-                    bought_items.extend([item_int] * amount)
-        return bought_items
-
-    @classmethod
-    def parse_action_list_for_sacrifices(cls, actions_readable_list: str) -> list:
-        sacrifices = []
-        for line in actions_readable_list.split('\n'):
-            line = line.strip()
-            sacrifice_match = re.search(r'sacrifice:\s*([\d.]+)', line)
-            if sacrifice_match:
-                boost_str = sacrifice_match.group(1)
-                boost_value = float(boost_str)
-                sacrifices.append(boost_value)
-        return sacrifices
+            print(cls.generate_winner_str(winner_dict, iterative_optimization_info), end='')
@@ -0,0 +1,85 @@
+from typing import Union, TYPE_CHECKING
+import json
+import time
+
+from utils import Constants, Helper
+from runner import Runner
+from purchase_strategies import OptimizedPurchaseStrategy, FullPurchaseStrategy
+from sacrifice_strategies import NeverSacrificeStrategy
+
+if TYPE_CHECKING:
+    from purchase_strategies import PurchaseStrategy
+    from sacrifice_strategies import SacrificeStrategy
+
+
+def verify_purchase_strategy(purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int,
+                             sacrifice_strategy: Union['SacrificeStrategy', None]=None,
+                             deadline_seconds: Union[float, None]=None) -> dict:
+    # exhaustive search (FullPurchaseStrategy) bounded by the winner of purchase_strategy: it is aborted one tick
+    # before that winner, so it either finds a strictly faster trajectory or shows that there is none.
+    # Dominated states (and exact duplicates) are removed by clears, which run much more often than in a regular search;
+    # nothing else is pruned, so the population grows exponentially with dimboosts and only the first ones finish.
+    # An exhaustive search stopped by deadline_seconds proves nothing: faster_trajectory_exists is None then.
+    # Both searches use the same sacrifice_strategy (no sacrifices with None), so only purchases are verified
+    if sacrifice_strategy is None:
+        sacrifice_strategy = NeverSacrificeStrategy()
+    runner = Runner(platform=platform,
+                    galaxies_bought=galaxies_bought,
+                    dimboosts_bought=dimboosts_bought,
+                    purchase_strategy=purchase_strategy,
+                    sacrifice_strategy=sacrifice_strategy)
+    incumbent_dict = runner.run()
+    incumbent_ticks_passed = incumbent_dict['game_info']['ticks_passed']
+
+    start_time = time.perf_counter()
+    runner = Runner(platform=platform,
+                    galaxies_bought=galaxies_bought,
+                    dimboosts_bought=dimboosts_bought,
+                    purchase_strategy=FullPurchaseStrategy(),
+                    sacrifice_strategy=sacrifice_strategy)
+    runner.addition_cycles_without_clear_limit = Constants.verification_addition_cycles_without_clear_limit
+    runner.state_growth_without_clear_limit = Constants.verification_state_growth_without_clear_limit
+    exhaustive_dict = runner.run(ticks_limit=incumbent_ticks_passed - 1, deadline_seconds=deadline_seconds)
+    end_time = time.perf_counter()
+    if 'deadline_seconds' in exhaustive_dict['strategy_search_info']:
+        faster_trajectory_exists = None
+    else:
+        faster_trajectory_exists = not exhaustive_dict['strategy_search_info']['aborted']
+
+    report = {
+        'platform': platform,
+        'galaxies_bought': galaxies_bought,
+        'dimboosts_bought': dimboosts_bought,
+        'purchase_strategy': type(purchase_strategy).__name__,
+        'sacrifice_strategy': type(sacrifice_strategy).__name__,
+        'ticks_passed': incumbent_ticks_passed,
+        'faster_trajectory_exists': faster_trajectory_exists,
+        'strategy_search_info': {
+            'strategy_search_time': incumbent_dict['strategy_search_info']['strategy_search_time'],
+            'states_analyzed': incumbent_dict['strategy_search_info']['states_analyzed']
+        },
+        'exhaustive_search_info': {
+            'strategy_search_time': Helper.time_float_to_str(end_time - start_time),
+            'CPU': Helper.cpu_info(),
+            'used_memory_mb': exhaustive_dict['strategy_search_info']['used_memory_mb'],
+            'states_analyzed': exhaustive_dict['strategy_search_info']['states_analyzed'],
+            'ticks_searched': runner.ticks_passed
+        }
+    }
+    if faster_trajectory_exists is None:
+        report['exhaustive_search_info']['deadline_seconds'] = deadline_seconds
+    elif faster_trajectory_exists:
+        report['faster_ticks_passed'] = exhaustive_dict['game_info']['ticks_passed']
+        report['faster_actions_readable_list'] = exhaustive_dict['actions_readable_list']
+    return report
+
+
+if __name__ == '__main__':
+    # configs without sacrifice, in order of size, until the first one the exhaustive search can't finish in time:
+    # bigger configs can't finish either
+    for dimboosts_bought in range(Helper.last_dimboost(0) + 1):
+        report = verify_purchase_strategy(OptimizedPurchaseStrategy(), 'pc', 0, dimboosts_bought,
+                                          deadline_seconds=Constants.verification_deadline_seconds)
+        print(json.dumps(report, indent=4), flush=True)
+        if report['faster_trajectory_exists'] is None:
+            break
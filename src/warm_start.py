@@ -0,0 +1,61 @@
+from typing import Union, TYPE_CHECKING
+from pathlib import Path
+import time
+import numpy as np
+
+from utils import Constants, Helper
+from results import Results
+from replay import ReplayRunner, BatchReplayRunner
+from purchase_strategies import FixedT12345678PurchaseStrategy, FixedT87654321PurchaseStrategy
+from purchase_strategies import Fixed12T345678PurchaseStrategy, Fixed87654321TPurchaseStrategy, Fixed12345678TPurchaseStrategy
+
+if TYPE_CHECKING:
+    from purchase_strategies import PurchaseStrategy
+
+
+fixed_purchase_strategies = [
+    FixedT12345678PurchaseStrategy(),
+    FixedT87654321PurchaseStrategy(),
+    Fixed12T345678PurchaseStrategy(),
+    Fixed87654321TPurchaseStrategy(),
+    Fixed12345678TPurchaseStrategy()
+]
+
+
+def warm_start_sources(purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int,
+                       has_sacrifice: bool) -> list:
+    # saved results of the config from cheaper runs: fixed strategies on all platforms
+    # and purchase_strategy itself on the other platforms, as (source name, result)
+    sources = []
+    for source_platform in Constants.platform_list:
+        for source_strategy in [purchase_strategy] + fixed_purchase_strategies:
+            if (source_platform == platform) and (source_strategy.get_short_name() == purchase_strategy.get_short_name()):
+                continue
+            filename = Helper.get_filename(source_strategy, source_platform, galaxies_bought, dimboosts_bought, has_sacrifice)
+            if Path(filename).exists():
+                sources.append((f"{source_strategy.get_short_name()} {source_platform}", Results.load(filename)))
+    return sources
+
+def warm_start_incumbent(purchase_strategy: 'PurchaseStrategy', platform: str, galaxies_bought: int, dimboosts_bought: int,
+                         has_sacrifice: bool) -> Union[dict, None]:
+    # the fastest trajectory of warm_start_sources replayed with the constants of platform, as a winner dict;
+    # all sources are replayed together by BatchReplayRunner, only the best one by ReplayRunner
+    start_time = time.perf_counter()
+    sources = warm_start_sources(purchase_strategy, platform, galaxies_bought, dimboosts_bought, has_sacrifice)
+    if len(sources) == 0:
+        return None
+    purchase_lists = [Results.get_purchase_list(result) for _, result in sources]
+    sacrifice_lists = [Results.get_sacrifice_list(result) for _, result in sources] if has_sacrifice else None
+    ticks_passed = BatchReplayRunner(platform, galaxies_bought, dimboosts_bought, purchase_lists, sacrifice_lists).run()
+    if (ticks_passed < 0).all():
+        return None
+    best = int(np.argmin(np.where(ticks_passed < 0, np.iinfo(ticks_passed.dtype).max, ticks_passed)))
+
+    incumbent_dict = ReplayRunner(platform, galaxies_bought, dimboosts_bought, purchase_lists[best],
+                                  None if sacrifice_lists is None else sacrifice_lists[best]).run()
+    del incumbent_dict['antimatter_curve']
+    end_time = time.perf_counter()
+    incumbent_dict['strategy_search_info']['strategy_search_time'] = Helper.time_float_to_str(end_time - start_time)
+    incumbent_dict['strategy_search_info']['states_analyzed'] = len(sources)
+    incumbent_dict['strategy_search_info']['warm_start'] = sources[best][0]
+    return incumbent_dict